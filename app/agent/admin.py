@@ -1,11 +1,24 @@
 import logging
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
-from .models import Collection, Product, Variant, Image, OptionCategory, OptionValue, WixProduct
+from .models import Collection, Product, Variant, Image, MirroredImage, OptionCategory, OptionValue, WixProduct, PageCache, ArchivedPage, CrawlRun
 
 logger = logging.getLogger(__name__)
 
+
+def image_thumbnail(image, width):
+    """
+    <img> of an Image's local thumbnail at `width` pixels, linking to the mirrored original. Images not
+    mirrored yet are only linked, so the page never downloads full-resolution store images.
+    """
+    if image.mirror is None:
+        return format_html('<a href="{}" target="_blank">Not mirrored</a>', image.url)
+    return format_html(
+        '<a href="{}" target="_blank"><img src="{}" style="width: {}px; height: auto;" loading="lazy"></a>',
+        image.mirror.url(), image.mirror.thumbnail_url(width * 2), width,
+    )
+
 class VariantInline(admin.TabularInline):
     model = Variant
     extra = 1
@@ -19,10 +32,9 @@ class VariantInline(admin.TabularInline):
     get_options.short_description = 'Options'
 
     def get_variant_images(self, obj):
-        if obj.images.exists():
-            images = obj.images.all()
-            image_links = [format_html('<img src="{}" style="width: 50px; height: auto;">', image.url) for image in images]
-            return format_html(" ".join(image_links))
+        images = obj.images.select_related('mirror')
+        if images:
+            return format_html_join(" ", "{}", ((image_thumbnail(image, 50),) for image in images))
         return "No images"
     
     get_variant_images.short_description = 'Images'
@@ -30,11 +42,14 @@ class VariantInline(admin.TabularInline):
 class ImageInline(admin.TabularInline):
     model = Image
     extra = 1
-    fields = ['url', 'alt_text', 'get_image']
-    readonly_fields = ['get_image']
+    fields = ['url', 'alt_text', 'get_image', 'mirror_error']
+    readonly_fields = ['get_image', 'mirror_error']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('mirror')
 
     def get_image(self, obj):
-        return format_html('<img src="{}" width="100" height="100" />', obj.url)
+        return image_thumbnail(obj, 100)
 
     get_image.short_description = 'Image Preview'
 
@@ -109,8 +124,8 @@ class CollectionAdmin(admin.ModelAdmin):
     download_csv.short_description = 'CSV Export'
 
 class VariantAdmin(admin.ModelAdmin):
-    list_display = ['pk', 'product', 'price', 'get_options']
-    search_fields = ['product__title', 'pk', 'price']
+    list_display = ['pk', 'product', 'price', 'get_options', 'external_id']
+    search_fields = ['product__title', 'pk', 'price', 'external_id']
 
     def get_options(self, obj):
         logger.debug(f"VariantAdmin: get_options for variant {obj.id}")
@@ -181,9 +196,67 @@ class WixProductAdmin(admin.ModelAdmin):
     get_collections.short_description = 'Collections'
 
 class ImageAdmin(admin.ModelAdmin):
-    list_display = ['pk', 'product', 'url', 'alt_text']
+    list_display = ['pk', 'product', 'get_image', 'url', 'alt_text', 'mirror_error']
     search_fields = ['product__title', 'pk', 'url', 'alt_text']
     list_filter = ['product']
+    list_select_related = ['product', 'mirror']
+    raw_id_fields = ['mirror']
+
+    def get_image(self, obj):
+        return image_thumbnail(obj, 50)
+
+    get_image.short_description = 'Image'
+
+class MirroredImageAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'get_thumbnail', 'content_hash', 'format', 'width', 'height', 'size', 'created_at']
+    search_fields = ['content_hash', 'path']
+    list_filter = ['format', 'created_at']
+
+    def get_thumbnail(self, obj):
+        return format_html('<img src="{}" style="width: 50px; height: auto;" loading="lazy">', obj.thumbnail_url(100))
+
+    get_thumbnail.short_description = 'Thumbnail'
+
+class PageCacheAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'url', 'etag', 'last_modified', 'content_hash', 'fetched_at', 'changed_at', 'sitemap_lastmod']
+    search_fields = ['url', 'etag']
+    list_filter = ['fetched_at', 'changed_at']
+
+class ArchivedPageAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'url', 'fetched_at', 'status_code', 'size', 'compression', 'content_hash']
+    search_fields = ['url', 'content_hash']
+    list_filter = ['fetched_at', 'compression']
+
+class CrawlRunAdmin(admin.ModelAdmin):
+    list_display = ['run_id', 'kind', 'status', 'total', 'started_at', 'finished_at', 'get_duration', 'get_slowest_stage']
+    search_fields = ['run_id']
+    list_filter = ['kind', 'status', 'started_at']
+    readonly_fields = ['get_stage_table']
+
+    def get_duration(self, obj):
+        if obj.finished_at:
+            return obj.finished_at - obj.started_at
+        return None
+
+    get_duration.short_description = 'Duration'
+
+    def get_slowest_stage(self, obj):
+        stages = (obj.metrics or {}).get('stages') or {}
+        if not any(stages.values()):
+            return None
+        name = max(stages, key=stages.get)
+        return f"{name} ({stages[name]:.1f}s)"
+
+    get_slowest_stage.short_description = 'Slowest stage'
+
+    def get_stage_table(self, obj):
+        stages = (obj.metrics or {}).get('stages') or {}
+        counters = (obj.metrics or {}).get('counters') or {}
+        rows = format_html_join('', '<tr><td>{}</td><td>{}s</td></tr>', ((name, f"{seconds:.2f}") for name, seconds in stages.items()))
+        rows += format_html_join('', '<tr><td>{}</td><td>{}</td></tr>', counters.items())
+        return format_html('<table>{}</table>', rows)
+
+    get_stage_table.short_description = 'Stages and counters'
 
 # Register models in the Django admin
 admin.site.register(Collection, CollectionAdmin)
@@ -191,4 +264,8 @@ admin.site.register(Product, ProductAdmin)
 admin.site.register(Variant, VariantAdmin)
 admin.site.register(OptionCategory, OptionCategoryAdmin)
 admin.site.register(WixProduct, WixProductAdmin)
-admin.site.register(Image, ImageAdmin)
\ No newline at end of file
+admin.site.register(Image, ImageAdmin)
+admin.site.register(MirroredImage, MirroredImageAdmin)
+admin.site.register(PageCache, PageCacheAdmin)
+admin.site.register(ArchivedPage, ArchivedPageAdmin)
+admin.site.register(CrawlRun, CrawlRunAdmin)
\ No newline at end of file
@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import logging
+import os
+from django.conf import settings
+from django.utils import timezone
+from .models import ArchivedPage
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def archive_compression():
+    """
+    Return the configured compression, falling back to gzip when the zstandard package is not installed.
+    """
+    if settings.PAGE_ARCHIVE_COMPRESSION == 'zstd' and zstandard is not None:
+        return 'zstd'
+    return 'gzip'
+
+
+def compress(content, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(content)
+    return gzip.compress(content, compresslevel=6)
+
+
+def decompress(data, compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read zstd archive entries")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def archive_path(content_hash, compression):
+    """
+    Path of an archive blob relative to PAGE_ARCHIVE_ROOT, fanned out over two directory levels.
+    """
+    return os.path.join(content_hash[:2], content_hash[2:4], content_hash + EXTENSIONS[compression])
+
+
+def archive_page(url, content, status_code=200, fetched_at=None):
+    """
+    Store a fetched page body in the archive and index it by URL and fetch time.
+
+    Blobs are named by the sha256 of the raw body, so an unchanged page is written only once.
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    compression = archive_compression()
+    path = archive_path(content_hash, compression)
+    full_path = os.path.join(settings.PAGE_ARCHIVE_ROOT, path)
+
+    if not os.path.exists(full_path):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write to a temporary name first so a concurrent reader never sees a partial blob
+        tmp_path = f"{full_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress(content, compression))
+        os.replace(tmp_path, full_path)
+
+    return ArchivedPage.objects.create(
+        url=url,
+        fetched_at=fetched_at or timezone.now(),
+        status_code=status_code,
+        content_hash=content_hash,
+        path=path,
+        compression=compression,
+        size=len(content),
+    )
+
+
+def read_archived_page(path, compression):
+    """
+    Return the raw body of an archived page. Only touches the filesystem, so it is safe in worker processes.
+    """
+    with open(os.path.join(settings.PAGE_ARCHIVE_ROOT, path), 'rb') as f:
+        return decompress(f.read(), compression)
+
+
+def iter_latest_archived_pages(url_contains=None):
+    """
+    Yield (url, path, compression) of the most recent archived fetch of every URL.
+    """
+    pages = ArchivedPage.objects.filter(status_code=200)
+    if url_contains:
+        pages = pages.filter(url__contains=url_contains)
+
+    last_url = None
+    for url, path, compression in pages.order_by('url', '-fetched_at').values_list('url', 'path', 'compression').iterator(chunk_size=2000):
+        if url != last_url:
+            last_url = url
+            yield url, path, compression
@@ -0,0 +1,160 @@
+import json
+import logging
+import math
+import os
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+from .parsers import get_parser
+from .shopify import absolute_url, build_product_data, load_product_json, parse_collection_links, parse_collection_product_links
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Synthetic product and collection pages modelled on the store theme (the nodes the extraction reads, padded
+# with inline script and markup to a realistic size); manifest.json lists each file with its kind, URL and
+# expected result
+BENCHMARK_PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_pages')
+
+# Results key of the collection pages, which are timed once rather than per parser backend
+COLLECTION_RESULTS = 'collection'
+
+
+def load_benchmark_pages(pages_dir=BENCHMARK_PAGES_DIR):
+    """
+    Return the fixture pages as dicts with file, kind ('product' or 'collection'), url, expect and content (bytes).
+    """
+    with open(os.path.join(pages_dir, 'manifest.json')) as f:
+        pages = json.load(f)
+
+    for page in pages:
+        with open(os.path.join(pages_dir, page['file']), 'rb') as f:
+            page['content'] = f.read()
+    return pages
+
+
+def extract_page(backend, page):
+    """
+    Run the extraction for one fixture page the way the crawl does and return the fields it produced.
+
+    Product pages go through the parser backend and build_product_data; pages without product JSON
+    return the parsed nodes the Selenium path reads instead. Collection pages go through the link
+    parsing used by discovery, which does not depend on the parser backend.
+    """
+    if page['kind'] == 'collection':
+        parts = urlsplit(page['url'])
+        origin = f"{parts.scheme}://{parts.netloc}"
+        product_links = parse_collection_product_links(page['content'], origin)
+        return {
+            'collection_links': len(parse_collection_links(page['content'], origin)),
+            'product_links': len(product_links),
+            'first_product_link': product_links[0] if product_links else None,
+        }
+
+    parsed = get_parser(backend).parse(page['content'])
+    product_json = load_product_json(parsed['product_json'])
+    if product_json is None:
+        return {
+            'title': None,
+            'variants': None,
+            'description': parsed['description'],
+            'main_image_url': absolute_url(parsed['main_image_src']),
+            'price_text': parsed['price_text'],
+        }
+
+    product_data = build_product_data(page['url'], product_json)
+    return {
+        'title': product_data['title'],
+        'variants': len(product_data['variants']),
+        'description': product_data['description'],
+        'main_image_url': product_data['main_image_url'],
+        'price': str(product_data['price']),
+        'variant_prices': [str(variant['price']) for variant in product_data['variants']],
+    }
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers, q in 0..100.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def check_expectations(backend, pages):
+    """
+    Return a list of error messages for pages whose extraction result differs from the manifest's `expect`.
+    """
+    errors = []
+    for page in pages:
+        expect = page.get('expect')
+        if expect is None:
+            continue
+        result = extract_page(backend, page)
+        wrong = {key: result.get(key) for key, value in expect.items() if result.get(key) != value}
+        if wrong:
+            errors.append(f"{backend or page['kind']}: {page['file']} extracted {wrong}, expected { {key: expect[key] for key in wrong} }")
+    return errors
+
+
+def benchmark_backend(backend, pages, iterations=20, warmup=2):
+    """
+    Time the extraction of every page with a parser backend (None for collection pages, which do not use one).
+
+    Latencies are measured without tracing; peak memory comes from a separate pass under tracemalloc,
+    so it counts Python allocations only (libxml2's own buffers are not included for lxml).
+    Returns {'pages', 'p50_ms', 'p95_ms', 'p99_ms', 'pages_per_sec', 'peak_kb'}.
+    """
+    for _ in range(warmup):
+        for page in pages:
+            extract_page(backend, page)
+
+    latencies = []
+    for _ in range(iterations):
+        for page in pages:
+            started = time.perf_counter()
+            extract_page(backend, page)
+            latencies.append(time.perf_counter() - started)
+
+    peak_bytes = 0
+    tracemalloc.start()
+    try:
+        for page in pages:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            extract_page(backend, page)
+            _, peak = tracemalloc.get_traced_memory()
+            peak_bytes = max(peak_bytes, peak - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'pages': len(pages),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'pages_per_sec': round(len(latencies) / sum(latencies), 1),
+        'peak_kb': round(peak_bytes / 1024, 1),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Return a list of regressions of `results` ({backend or COLLECTION_RESULTS: metrics}) against a saved baseline
+    with the same layout.
+
+    p50/p95 latency and peak memory may not grow, and pages/sec may not drop, by more than `tolerance` (a fraction).
+    Entries missing from the baseline are skipped.
+    """
+    regressions = []
+    for backend, metrics in results.items():
+        reference = baseline.get(backend)
+        if not reference:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'peak_kb'):
+            if reference.get(metric) and metrics[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{backend} {metric}: {metrics[metric]} vs baseline {reference[metric]}")
+        if reference.get('pages_per_sec') and metrics['pages_per_sec'] < reference['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"{backend} pages_per_sec: {metrics['pages_per_sec']} vs baseline {reference['pages_per_sec']}")
+    return regressions
@@ -0,0 +1,394 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import psutil
+from celery.signals import task_postrun, worker_process_init, worker_process_shutdown
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service
+from .chrome_supervisor import get_chrome_supervisor
+from .metrics import stage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+RENDER_PROFILES = ('full', 'light')
+
+# File extensions the light profile never downloads
+BLOCKED_RESOURCE_EXTENSIONS = [
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico',  # Images
+    'woff', 'woff2', 'ttf', 'otf', 'eot',  # Fonts
+    'mp4', 'webm', 'm3u8',  # Media
+    'css',  # Stylesheets; the option selects and price block work unstyled
+]
+
+# Network.setBlockedURLs wildcard patterns, anchored at the end of the path or the start of the query
+# string so e.g. `.ico` does not also block `icons.js` and `.webm` does not block `site.webmanifest`
+BLOCKED_RESOURCE_PATTERNS = [
+    pattern for extension in BLOCKED_RESOURCE_EXTENSIONS for pattern in (f'*.{extension}', f'*.{extension}?*')
+]
+
+# Third-party tags and widgets on the storefront: analytics, pixels, chat, reviews, payment badges and web fonts
+BLOCKED_THIRD_PARTY_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googleadservices.com*',
+    '*connect.facebook.net*', '*facebook.com/tr*', '*analytics.tiktok.com*', '*ct.pinterest.com*',
+    '*bat.bing.com*', '*clarity.ms*', '*hotjar.com*', '*klaviyo.com*', '*tidio.co*', '*gorgias.chat*',
+    '*zendesk.com*', '*judge.me*', '*static.afterpay.com*', '*zip.co*', '*youtube.com*', '*vimeo.com*',
+    '*fonts.googleapis.com*', '*fonts.gstatic.com*', '*use.typekit.net*',
+    '*monorail-edge.shopifysvc.com*',
+]
+
+
+def render_allowed_hosts():
+    """
+    Hosts whose scripts the light profile must never block: the crawled store and CHROME_ALLOWED_HOSTS.
+    """
+    hosts = {urlsplit(settings.SCRAPE_BASE_URL).hostname}
+    hosts.update(settings.CHROME_ALLOWED_HOSTS)
+    return {host for host in hosts if host}
+
+
+def blocked_url_patterns():
+    """
+    URL patterns blocked by the light profile.
+
+    CDP can only deny by pattern, so the allowlist is applied by dropping every third-party
+    pattern that would match an allowed host; theme and variant-switching scripts stay loadable.
+    """
+    allowed = render_allowed_hosts()
+    third_party = []
+    for pattern in BLOCKED_THIRD_PARTY_PATTERNS + list(settings.CHROME_BLOCKED_URLS):
+        domain = pattern.strip('*').split('/')[0]
+        if any(host.endswith(domain) or domain.endswith(host) for host in allowed):
+            logger.debug(f"Not blocking {pattern}: matches an allowed host")
+            continue
+        third_party.append(pattern)
+    return BLOCKED_RESOURCE_PATTERNS + third_party
+
+
+def build_chrome_options(profile=None):
+    """
+    Build the ChromeOptions shared by every pooled browser.
+
+    The 'light' profile (settings.CHROME_RENDER_PROFILE) also stops Chrome from loading images,
+    and returns from driver.get() at DOMContentLoaded instead of waiting for every subresource.
+    """
+    profile = profile or settings.CHROME_RENDER_PROFILE
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-dev-shm-usage')  # Overcome limited resource problems
+    options.add_argument('--no-sandbox')  # Bypass OS security model
+    options.add_argument('--disable-gpu')  # Applicable to windows OS only
+    options.add_argument('--disable-software-rasterizer')
+    options.add_argument('--disable-extensions')  # Disable extensions that could interfere
+    options.add_argument('--disable-application-cache')  # Avoid caching issues
+    options.add_argument('--start-maximized')  # Start with a maximized window
+
+    if profile == 'light':
+        options.page_load_strategy = 'eager'  # The product JSON and selects are in the initial HTML
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+            'profile.default_content_setting_values.geolocation': 2,
+        })
+    return options
+
+
+def apply_render_profile(driver, profile=None):
+    """
+    Install the light profile's URL blocklist on a driver through CDP. It holds for every later navigation.
+    """
+    profile = profile or settings.CHROME_RENDER_PROFILE
+    if profile != 'light':
+        return
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_url_patterns()})
+
+
+def page_transfer_bytes(driver):
+    """
+    Bytes transferred for the current page and its subresources, from the Resource Timing API.
+
+    Cross-origin resources without Timing-Allow-Origin report 0, so this is a lower bound.
+    """
+    try:
+        return int(driver.execute_script(
+            "return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))"
+            ".reduce(function (total, entry) { return total + (entry.transferSize || 0); }, 0);"
+        ) or 0)
+    except WebDriverException:
+        return 0
+
+
+class PooledDriver:
+    """
+    A Chrome WebDriver owned by the pool, with the bookkeeping used to decide when to recycle it.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pid = driver.service.process.pid
+        self.uses = 0
+        self.created_at = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    def rss_mb(self):
+        """
+        Resident memory of chromedriver plus every Chrome process it spawned, in MB.
+        """
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except (psutil.Error, AttributeError):
+            return 0.0
+
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+
+class WebDriverPool:
+    """
+    Per-process pool of reusable Chrome WebDrivers.
+
+    Drivers are leased to a task, reset (cookies and storage cleared) when returned, and recycled
+    after `max_uses` leases, `max_age` seconds, or once their memory grows above `max_rss_mb`.
+    Every browser's processes are tracked by the ChromeSupervisor, which kills what quit() leaves behind.
+    """
+
+    def __init__(self, size=1, max_uses=50, max_rss_mb=1024, max_age=None, driver_path=None, profile=None):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.max_age = max_age
+        self.driver_path = driver_path or settings.CHROME_DRIVER_PATH
+        self.profile = profile or settings.CHROME_RENDER_PROFILE
+        if self.profile not in RENDER_PROFILES:
+            raise ImproperlyConfigured(f"Unknown CHROME_RENDER_PROFILE {self.profile!r}; choose one of {', '.join(RENDER_PROFILES)}")
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._stats = {
+            'created': 0,
+            'recycled': 0,
+            'leases': 0,
+            'resets': 0,
+            'failures': 0,
+        }
+
+    def _create(self):
+        service = Service(self.driver_path)
+        with stage('chrome_start'):
+            driver = webdriver.Chrome(service=service, options=build_chrome_options(self.profile))
+            try:
+                apply_render_profile(driver, self.profile)
+            except Exception:
+                driver.quit()
+                raise
+        get_chrome_supervisor().track(driver.service.process.pid)
+        with self._lock:
+            self._stats['created'] += 1
+        logger.info(f"Started pooled Chrome WebDriver (pid={driver.service.process.pid}, profile={self.profile})")
+        return PooledDriver(driver)
+
+    def _destroy(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logger.error(f"Error quitting pooled WebDriver: {str(e)}")
+        get_chrome_supervisor().release(entry.pid)
+        with self._lock:
+            self._total -= 1
+            self._stats['recycled'] += 1
+
+    def _reset(self, entry):
+        """
+        Clear cookies and web storage so the next lease starts from a clean session.
+        """
+        driver = entry.driver
+        try:
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+        except WebDriverException:
+            # about:blank and error pages have no storage to clear
+            pass
+        driver.delete_all_cookies()
+        driver.get('about:blank')
+        with self._lock:
+            self._stats['resets'] += 1
+
+    def warm(self):
+        """
+        Start browsers until the pool holds `size` drivers.
+        """
+        while True:
+            with self._lock:
+                if self._total >= self.size:
+                    break
+                self._total += 1
+            try:
+                self._idle.put(self._create())
+            except Exception as e:
+                with self._lock:
+                    self._total -= 1
+                    self._stats['failures'] += 1
+                logger.error(f"Could not warm WebDriver pool: {str(e)}")
+                break
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._total < self.size
+            if can_create:
+                self._total += 1
+
+        if can_create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._total -= 1
+                    self._stats['failures'] += 1
+                raise
+
+        return self._idle.get(timeout=timeout)
+
+    def _release(self, entry, broken):
+        entry.uses += 1
+
+        if broken:
+            logger.warning(f"Recycling WebDriver after a WebDriver error (uses={entry.uses})")
+            self._destroy(entry)
+            return
+
+        if entry.uses >= self.max_uses:
+            logger.info(f"Recycling WebDriver after {entry.uses} uses")
+            self._destroy(entry)
+            return
+
+        if self.max_age and entry.age() > self.max_age:
+            logger.info(f"Recycling WebDriver after {entry.age():.0f}s (limit {self.max_age}s)")
+            self._destroy(entry)
+            return
+
+        rss_mb = entry.rss_mb()
+        if self.max_rss_mb and rss_mb > self.max_rss_mb:
+            logger.info(f"Recycling WebDriver using {rss_mb:.0f} MB (limit {self.max_rss_mb} MB)")
+            self._destroy(entry)
+            return
+
+        try:
+            self._reset(entry)
+        except Exception as e:
+            logger.warning(f"Could not reset WebDriver, recycling it: {str(e)}")
+            self._destroy(entry)
+            return
+
+        # Chrome starts renderer processes as it browses; record them while the driver is known good
+        get_chrome_supervisor().track(entry.pid)
+        self._idle.put(entry)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Lease a driver for the duration of the `with` block.
+        """
+        with stage('lease_wait'):
+            entry = self._acquire(timeout if timeout is not None else settings.WEBDRIVER_LEASE_TIMEOUT)
+        with self._lock:
+            self._stats['leases'] += 1
+
+        broken = False
+        try:
+            yield entry.driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self._release(entry, broken)
+
+    def stats(self):
+        """
+        Return a snapshot of the pool counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['total'] = self._total
+        stats['idle'] = self._idle.qsize()
+        stats['in_use'] = stats['total'] - stats['idle']
+        stats['supervisor'] = get_chrome_supervisor().stats()
+        return stats
+
+    def close(self):
+        """
+        Quit every idle driver. Leased drivers are quit when they are returned.
+        """
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(entry)
+        logger.info(f"WebDriver pool closed: {self.stats()}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """
+    Return this process's WebDriver pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WebDriverPool(
+                size=settings.WEBDRIVER_POOL_SIZE,
+                max_uses=settings.WEBDRIVER_MAX_USES,
+                max_rss_mb=settings.WEBDRIVER_MAX_RSS_MB,
+                max_age=settings.WEBDRIVER_MAX_AGE,
+            )
+        return _pool
+
+
+@worker_process_init.connect
+def warm_driver_pool(**kwargs):
+    # A worker process that was killed (hard time limit, max memory, OOM) could not quit its browsers
+    get_chrome_supervisor().reap_dead_workers()
+    if settings.WEBDRIVER_POOL_WARM:
+        get_driver_pool().warm()
+
+
+@task_postrun.connect
+def reap_chrome_orphans(**kwargs):
+    # Runs after failed and timed-out (soft limit) tasks too
+    if _pool is not None:
+        get_chrome_supervisor().reap()
+
+
+@worker_process_shutdown.connect
+def close_driver_pool(**kwargs):
+    if _pool is not None:
+        _pool.close()
+    # Leased browsers are not returned at shutdown; kill them with anything else still tracked
+    get_chrome_supervisor().shutdown()
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import psutil
+from django.conf import settings
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a process gets to exit after SIGTERM before it is sent SIGKILL
+TERMINATE_GRACE = 3
+
+# Untracked Chrome processes younger than this may belong to a browser that is still starting
+ORPHAN_MIN_AGE = 60
+
+
+def is_chrome_process(process):
+    try:
+        name = process.name().lower()
+    except psutil.Error:
+        return False
+    return 'chrome' in name or 'headless_shell' in name
+
+
+def _snapshot(pid):
+    """
+    Return {pid: create_time} for a process and all its descendants. The create time guards against PID reuse.
+    """
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return {}
+    snapshot = {}
+    for process in processes:
+        try:
+            snapshot[process.pid] = process.create_time()
+        except psutil.Error:
+            continue
+    return snapshot
+
+
+def _alive(pids):
+    """
+    Return the psutil.Process objects for the {pid: create_time} entries that are still the same running process.
+    """
+    processes = []
+    for pid, create_time in pids.items():
+        try:
+            process = psutil.Process(int(pid))
+            if abs(process.create_time() - create_time) < 0.01 and process.status() != psutil.STATUS_ZOMBIE:
+                processes.append(process)
+        except psutil.Error:
+            continue
+    return processes
+
+
+def terminate(processes):
+    """
+    SIGTERM the processes, SIGKILL those still running after TERMINATE_GRACE seconds. Returns how many there were.
+    """
+    for process in processes:
+        try:
+            process.terminate()
+        except psutil.Error:
+            pass
+    _, still_running = psutil.wait_procs(processes, timeout=TERMINATE_GRACE)
+    for process in still_running:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(still_running, timeout=TERMINATE_GRACE)
+    return len(processes)
+
+
+class ChromeSupervisor:
+    """
+    Tracks the chromedriver and Chrome processes this worker process started, and kills the ones it leaks.
+
+    Every browser tree is recorded by PID (and create time) in memory and in a per-worker file under
+    `pid_dir`. Leftovers are reaped when a browser is quit, after every task, and, for a worker that
+    died without cleaning up (hard time limit, OOM kill), by the next worker process started on the host.
+    Nothing outside these recorded trees is ever signalled, so browsers of other workers are safe.
+    """
+
+    def __init__(self, pid_dir=None):
+        self.pid_dir = pid_dir or settings.CHROME_PID_DIR
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._browsers = {}  # chromedriver pid -> {pid: create_time} of its tree, as far as seen
+        self._stats = {'tracked': 0, 'reaped': 0}
+
+    def _path(self, worker_pid):
+        return os.path.join(self.pid_dir, f"{worker_pid}.json")
+
+    def _save(self):
+        # Called with the lock held
+        try:
+            os.makedirs(self.pid_dir, exist_ok=True)
+            try:
+                worker_create_time = psutil.Process(self.pid).create_time()
+            except psutil.Error:
+                worker_create_time = None
+            data = {
+                'create_time': worker_create_time,
+                'browsers': {str(pid): tree for pid, tree in self._browsers.items()},
+            }
+            path = self._path(self.pid)
+            with open(f"{path}.tmp", 'w') as f:
+                json.dump(data, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Could not record Chrome PIDs in {self.pid_dir}: {str(e)}")
+
+    def track(self, driver_pid):
+        """
+        Record (or refresh) the process tree of a chromedriver. Chrome starts renderers as it goes,
+        so this is called again whenever a browser is returned to the pool.
+        """
+        tree = _snapshot(driver_pid)
+        with self._lock:
+            known = self._browsers.setdefault(driver_pid, {})
+            if not known:
+                self._stats['tracked'] += 1
+            known.update(tree)
+            self._save()
+
+    def release(self, driver_pid):
+        """
+        Forget a browser that has been quit, killing whatever is left of its tree.
+        """
+        with self._lock:
+            tree = self._browsers.pop(driver_pid, {})
+            self._save()
+        tree.update(_snapshot(driver_pid))
+        leftovers = _alive(tree)
+        if leftovers:
+            logger.warning(f"Killing {len(leftovers)} Chrome processes left behind by chromedriver {driver_pid}")
+            self._count_reaped(terminate(leftovers))
+
+    def _count_reaped(self, count):
+        with self._lock:
+            self._stats['reaped'] += count
+
+    def reap(self):
+        """
+        Kill processes of browsers whose chromedriver has died, and Chrome processes under this worker
+        that belong to no tracked browser (a driver that was never quit).
+        """
+        with self._lock:
+            browsers = {pid: dict(tree) for pid, tree in self._browsers.items()}
+
+        owned = set()
+        orphans = []
+        for driver_pid, tree in browsers.items():
+            driver = {driver_pid: tree[driver_pid]} if driver_pid in tree else {}
+            if _alive(driver):
+                owned.update(_snapshot(driver_pid))
+                continue
+            # chromedriver is gone; its Chrome children were reparented away from this worker
+            logger.warning(f"chromedriver {driver_pid} died, reaping its browser")
+            orphans += _alive(tree)
+            with self._lock:
+                self._browsers.pop(driver_pid, None)
+                self._save()
+
+        try:
+            descendants = psutil.Process(self.pid).children(recursive=True)
+        except psutil.Error:
+            descendants = []
+        started_before = time.time() - ORPHAN_MIN_AGE
+        for process in descendants:
+            try:
+                if process.pid not in owned and is_chrome_process(process) and process.create_time() < started_before:
+                    orphans.append(process)
+            except psutil.Error:
+                continue
+
+        if orphans:
+            logger.warning(f"Reaping {len(orphans)} orphaned Chrome processes")
+            self._count_reaped(terminate(orphans))
+        return len(orphans)
+
+    def reap_dead_workers(self):
+        """
+        Kill the recorded browsers of worker processes on this host that are no longer running.
+        """
+        try:
+            names = os.listdir(self.pid_dir)
+        except OSError:
+            return 0
+
+        reaped = 0
+        for name in names:
+            if not name.endswith('.json') or not name[:-5].isdigit():
+                continue
+            worker_pid = int(name[:-5])
+            path = self._path(worker_pid)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if worker_pid == self.pid or (data.get('create_time') and _alive({worker_pid: data['create_time']})):
+                continue
+
+            processes = []
+            for tree in data.get('browsers', {}).values():
+                processes += _alive(tree)
+            if processes:
+                logger.warning(f"Reaping {len(processes)} Chrome processes left by dead worker {worker_pid}")
+                reaped += terminate(processes)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        self._count_reaped(reaped)
+        return reaped
+
+    def shutdown(self):
+        """
+        Kill every tracked browser (used when the worker process exits) and drop this worker's PID file.
+        """
+        with self._lock:
+            browsers, self._browsers = self._browsers, {}
+        processes = []
+        for driver_pid, tree in browsers.items():
+            tree.update(_snapshot(driver_pid))
+            processes += _alive(tree)
+        if processes:
+            logger.info(f"Killing {len(processes)} Chrome processes at worker shutdown")
+            self._count_reaped(terminate(processes))
+        try:
+            os.remove(self._path(self.pid))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, browsers=len(self._browsers))
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_chrome_supervisor():
+    """
+    Return this process's ChromeSupervisor, creating it on first use (and again after a fork).
+    """
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None or _supervisor.pid != os.getpid():
+            _supervisor = ChromeSupervisor()
+        return _supervisor
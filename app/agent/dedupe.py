@@ -0,0 +1,64 @@
+import hashlib
+import logging
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _key(kind, url):
+    # URLs can exceed memcached-style key limits and contain characters some backends reject
+    return f"dedupe:{kind}:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+
+
+def mark_queued(url):
+    """
+    Mark a URL as waiting in the queue. Returns False when it already is, so the caller must not enqueue it again.
+
+    The marker is cleared by the task when it finishes; a message lost with its worker blocks
+    re-queueing the URL for at most PRODUCT_QUEUED_TTL seconds.
+    """
+    return cache.add(_key('queued', url), 1, settings.PRODUCT_QUEUED_TTL)
+
+
+def clear_queued(url):
+    cache.delete(_key('queued', url))
+
+
+def recently_refreshed(url):
+    """
+    Return True when the URL was refreshed within the last PRODUCT_REFRESH_WINDOW seconds.
+    """
+    return settings.PRODUCT_REFRESH_WINDOW > 0 and cache.get(_key('fresh', url)) is not None
+
+
+def mark_refreshed(url):
+    if settings.PRODUCT_REFRESH_WINDOW > 0:
+        cache.set(_key('fresh', url), 1, settings.PRODUCT_REFRESH_WINDOW)
+
+
+@contextmanager
+def url_lease(url, ttl=None):
+    """
+    Hold a cross-worker lease on a URL for the `with` block; yields False when another worker holds it.
+
+    The lease expires after `ttl` seconds (PRODUCT_LOCK_TTL) so a crashed worker cannot hold it
+    forever; keep it above the longest a product refresh takes. Release only deletes the lease
+    if it is still ours.
+    """
+    key = _key('lock', url)
+    token = uuid.uuid4().hex
+    if not cache.add(key, token, ttl or settings.PRODUCT_LOCK_TTL):
+        logger.info(f"Another worker is already processing {url}")
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        # Not atomic, but the lease outlives a normal refresh by a wide margin, so it cannot
+        # expire and be taken by another worker between the get and the delete in practice
+        if cache.get(key) == token:
+            cache.delete(key)
@@ -0,0 +1,150 @@
+import logging
+import time
+import uuid
+from celery import states
+from django.conf import settings
+from .stats import finish_run, get_run_counters, start_run
+from .tasks import PRODUCT_RUN_COUNTERS, enqueue_product_refresh
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How often the dispatcher logs throughput and ETA
+PROGRESS_INTERVAL = 30
+
+
+class RefreshDispatcher:
+    """
+    Keep up to `max_in_flight` product refreshes queued or running, topping the window up as results come in.
+
+    URLs are enqueued through `enqueue_product_refresh` (so duplicates are dropped) at no more than
+    `rate` tasks per second, which together with the window bounds how hard the store is hit.
+    Completion is tracked through the Celery result backend; a task not finished after
+    `task_timeout` seconds is given up on (it may still finish on its worker). A task being retried
+    because the store's circuit breaker was open is not done: it stays in the window, and its
+    timeout counts from the last time it was seen waiting for its retry.
+    """
+
+    def __init__(self, max_in_flight=None, rate=None, task_timeout=None, poll_interval=None):
+        self.max_in_flight = max_in_flight or settings.DISPATCH_MAX_IN_FLIGHT
+        self.rate = rate if rate is not None else settings.DISPATCH_RATE
+        self.task_timeout = task_timeout or settings.DISPATCH_TASK_TIMEOUT
+        self.poll_interval = poll_interval or settings.DISPATCH_POLL_INTERVAL
+        self.in_flight = {}
+        self.statuses = {}
+        self.completed = 0
+        self.not_queued = 0
+        self._next_enqueue = 0.0
+
+    def _throttle(self):
+        if self.rate <= 0:
+            return
+        delay = self._next_enqueue - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_enqueue = max(self._next_enqueue, time.monotonic()) + 1 / self.rate
+
+    def _count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.completed += 1
+
+    def _collect(self):
+        """
+        Remove finished or timed-out tasks from the window. Returns how many were removed.
+        """
+        now = time.monotonic()
+        removed = 0
+        for task_id, (url, result, queued_at) in list(self.in_flight.items()):
+            state = result.state
+            if state == states.RETRY:
+                self.in_flight[task_id] = (url, result, now)
+                continue
+            if state in states.READY_STATES:
+                if result.successful():
+                    status = result.result
+                else:
+                    logger.error(f"Refresh task for {url} raised: {result.result!r}")
+                    status = 'error'
+                result.forget()
+            elif now - queued_at > self.task_timeout:
+                logger.error(f"Refresh task for {url} not finished after {self.task_timeout}s, no longer waiting for it")
+                status = 'timeout'
+            else:
+                continue
+            del self.in_flight[task_id]
+            self._count(status)
+            removed += 1
+        return removed
+
+    def _report(self, total, started):
+        elapsed = time.monotonic() - started
+        rate = self.completed / elapsed if elapsed else 0.0
+        remaining = max(total - self.completed - self.not_queued, 0) if total is not None else None
+        eta = f"{remaining / rate / 60:.1f} min" if rate and remaining is not None else 'unknown'
+        progress = f"{self.completed}/{total}" if total is not None else str(self.completed)
+        logger.info(
+            f"Refreshed {progress} products ({self.not_queued} not queued, {len(self.in_flight)} in flight) "
+            f"at {rate:.2f}/s, ETA {eta}; {dict(sorted(self.statuses.items()))}"
+        )
+
+    def run(self, urls, total=None, **task_kwargs):
+        """
+        Refresh every URL from the `urls` iterable and return {status: count} once all have finished.
+
+        `task_kwargs` are passed to get_or_update_product_info (run_id, mode, force).
+        """
+        started = time.monotonic()
+        last_report = started
+        urls = iter(urls)
+        exhausted = False
+
+        while not exhausted or self.in_flight:
+            # Top the window up
+            while not exhausted and len(self.in_flight) < self.max_in_flight:
+                url = next(urls, None)
+                if url is None:
+                    exhausted = True
+                    break
+                self._throttle()
+                result = enqueue_product_refresh(url, **task_kwargs)
+                if result is None:
+                    self.not_queued += 1
+                    continue
+                self.in_flight[result.id] = (url, result, time.monotonic())
+
+            if not self._collect() and self.in_flight:
+                time.sleep(self.poll_interval)
+
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                self._report(total, started)
+                last_report = time.monotonic()
+
+        self._report(total, started)
+        return dict(self.statuses, not_queued=self.not_queued)
+
+
+def refresh_products(products, kind='products', dispatcher=None, **task_kwargs):
+    """
+    Refresh the products of a queryset as one crawl run through a RefreshDispatcher.
+
+    Product URLs are streamed with .iterator() rather than loading the queryset. Returns (run_id, summary).
+    """
+    dispatcher = dispatcher or RefreshDispatcher()
+    total = products.count()
+
+    # Tag every task with this run so page cache hits/misses can be reported at the end
+    run_id = uuid.uuid4().hex
+    logger.info(f"Run id: {run_id}; refreshing {total} products with up to {dispatcher.max_in_flight} in flight at {dispatcher.rate}/s")
+    start_run(run_id, kind, total, PRODUCT_RUN_COUNTERS)
+
+    status = 'failed'
+    statuses = {}
+    try:
+        urls = products.values_list('source_url', flat=True).iterator(chunk_size=2000)
+        statuses = dispatcher.run(urls, total=total, run_id=run_id, **task_kwargs)
+        status = 'finished'
+    finally:
+        summary = dict(get_run_counters(run_id, PRODUCT_RUN_COUNTERS), dispatch=statuses)
+        finish_run(run_id, summary, status=status)
+
+    return run_id, summary
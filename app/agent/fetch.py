@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+from .metrics import incr, stage
+from .throttle import get_origin_controller
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limited or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: allows `rate` requests per second on average with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncFetcher:
+    """
+    Asyncio HTTP client with a pooled keep-alive connection pool, bounded concurrency,
+    a token bucket per host, timeouts and jittered exponential backoff on 429/5xx.
+
+    With a `controller` (agent.throttle.OriginController) every request also waits for the origin's
+    cluster-wide AIMD rate, reports its outcome, and fails with CircuitOpenError while the origin's
+    circuit breaker is open.
+    """
+
+    def __init__(self, concurrency=20, max_connections=20, rate_per_host=5.0, burst=10,
+                 timeout=30.0, retries=3, backoff_base=0.5, backoff_max=30.0, headers=None, controller=None,
+                 transport=None):
+        self.concurrency = concurrency
+        self.max_connections = max_connections
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headers = headers or {}
+        self.controller = controller
+        self.transport = transport  # httpx transport override, e.g. httpx.MockTransport
+
+        self._client = None
+        self._semaphore = None
+        self._buckets = {}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                follow_redirects=True,
+                transport=self.transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._client
+
+    def _bucket(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate_per_host, self.burst)
+        return self._buckets[host]
+
+    def _backoff(self, attempt, response=None):
+        """
+        Seconds to wait before the next attempt: Retry-After when the server sends one, else full jitter.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _acquire_origin(self, url):
+        # The controller's state is in the cache, so its calls run off the event loop thread.
+        # Returns the half-open probe token, if this request is the probe.
+        while True:
+            wait, probe = await asyncio.to_thread(self.controller.acquire, url)
+            if not wait:
+                return probe
+            await asyncio.sleep(wait)
+
+    async def fetch(self, url, method='GET', **kwargs):
+        """
+        Send a request and return the httpx.Response.
+
+        429/5xx responses and transport errors are retried up to `retries` times; after that the
+        last response is returned (or the last transport error raised) for the caller to handle.
+        """
+        client = self._get_client()
+        bucket = self._bucket(url)
+
+        attempt = 0
+        while True:
+            probe = None
+            if self.controller is not None:
+                probe = await self._acquire_origin(url)
+            await bucket.acquire()
+            try:
+                async with self._semaphore:
+                    started = time.monotonic()
+                    response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if self.controller is not None:
+                    await asyncio.to_thread(self.controller.record, url, None, probe=probe)
+                if attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"{method} {url} failed ({e.__class__.__name__}: {e}), retrying in {delay:.1f}s")
+            else:
+                if self.controller is not None:
+                    await asyncio.to_thread(self.controller.record, url, response.status_code, time.monotonic() - started, probe=probe)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def fetch_many(self, urls, **kwargs):
+        """
+        Fetch many URLs concurrently. Results are in input order; failures are returned as exceptions.
+        """
+        return await asyncio.gather(*(self.fetch(url, **kwargs) for url in urls), return_exceptions=True)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SyncFetcher:
+    """
+    Blocking facade over AsyncFetcher for Celery tasks.
+
+    The event loop runs in a daemon thread so the connection pool and rate limiters
+    live for the whole worker process instead of one task.
+    """
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='agent-fetch', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    def get(self, url, **kwargs):
+        return self.run(self.fetcher.fetch(url, **kwargs))
+
+    def get_many(self, urls, **kwargs):
+        return self.run(self.fetcher.fetch_many(urls, **kwargs))
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self.fetcher.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+            self._thread = None
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """
+    Return this process's shared SyncFetcher, creating it from settings on first use.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = SyncFetcher(AsyncFetcher(
+                concurrency=settings.HTTP_CONCURRENCY,
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                rate_per_host=settings.HTTP_RATE_PER_HOST,
+                burst=settings.HTTP_BURST,
+                timeout=settings.HTTP_TIMEOUT,
+                retries=settings.HTTP_RETRIES,
+                backoff_base=settings.HTTP_BACKOFF_BASE,
+                backoff_max=settings.HTTP_BACKOFF_MAX,
+                headers={'User-Agent': settings.HTTP_USER_AGENT},
+                controller=get_origin_controller(),
+            ))
+        return _fetcher
+
+
+def _reset_after_fork():
+    # The loop thread does not survive fork(); prefork children start their own fetcher
+    global _fetcher, _fetcher_lock
+    _fetcher = None
+    _fetcher_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def fetch(url, **kwargs):
+    """
+    Fetch a URL through the shared fetcher and return the httpx.Response.
+    """
+    with stage('http_fetch'):
+        response = get_fetcher().get(url, **kwargs)
+    incr('pages_fetched')
+    incr('bytes_fetched', len(response.content))
+    return response
+
+
+def fetch_many(urls, **kwargs):
+    """
+    Fetch URLs concurrently through the shared fetcher; failures are returned as exceptions.
+    """
+    with stage('http_fetch'):
+        responses = get_fetcher().get_many(urls, **kwargs)
+    for response in responses:
+        if not isinstance(response, Exception):
+            incr('pages_fetched')
+            incr('bytes_fetched', len(response.content))
+    return responses
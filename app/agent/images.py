@@ -0,0 +1,175 @@
+import hashlib
+import io
+import logging
+import os
+from django.conf import settings
+from django.db import IntegrityError
+from PIL import Image as PILImage, ImageOps
+from .fetch import fetch_many
+from .metrics import incr, stage
+from .models import Image, MirroredImage
+from .throttle import CircuitOpenError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+
+
+def mirror_path(content_hash, suffix):
+    """
+    Path of a mirrored file relative to MEDIA_ROOT, fanned out over two directory levels like the page archive.
+    """
+    return os.path.join(settings.IMAGE_MIRROR_DIR, content_hash[:2], content_hash[2:4], content_hash + suffix)
+
+
+def _write(path, data):
+    full_path = os.path.join(settings.MEDIA_ROOT, path)
+    if os.path.exists(full_path):
+        return
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    # Write to a temporary name first so nginx never serves a partial file
+    tmp_path = f"{full_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, full_path)
+
+
+def make_thumbnail(image, size):
+    """
+    Return the bytes of a WebP copy of a Pillow image scaled down to at most `size` pixels on its longest side.
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((size, size))
+    if thumbnail.mode not in ('RGB', 'RGBA'):
+        transparent = 'A' in thumbnail.mode or 'transparency' in thumbnail.info
+        thumbnail = thumbnail.convert('RGBA' if transparent else 'RGB')
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def store_image(content):
+    """
+    Store downloaded image bytes and their thumbnails, returning (MirroredImage, created).
+
+    Files are named by the sha256 of the bytes, so an image already mirrored from another URL is
+    neither decoded nor written again. Raises ValueError when the bytes are not an image Pillow can read.
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    mirrored = MirroredImage.objects.filter(content_hash=content_hash).first()
+    if mirrored is not None:
+        return mirrored, False
+
+    try:
+        image = PILImage.open(io.BytesIO(content))
+        image.load()
+    except (OSError, PILImage.DecompressionBombError) as e:
+        raise ValueError(f"Not a readable image ({type(e).__name__})") from e
+    image_format = image.format or 'JPEG'
+    # Phone photos often carry their rotation in EXIF only
+    image = ImageOps.exif_transpose(image)
+
+    path = mirror_path(content_hash, EXTENSIONS.get(image_format, f".{image_format.lower()}"))
+    _write(path, content)
+    thumbnails = {}
+    for size in settings.IMAGE_THUMBNAIL_SIZES:
+        thumbnail_path = mirror_path(content_hash, f"_{size}.webp")
+        _write(thumbnail_path, make_thumbnail(image, size))
+        thumbnails[str(size)] = thumbnail_path
+
+    try:
+        mirrored = MirroredImage.objects.create(
+            content_hash=content_hash,
+            path=path,
+            format=image_format,
+            width=image.width,
+            height=image.height,
+            size=len(content),
+            thumbnails=thumbnails,
+        )
+    except IntegrityError:
+        # Another worker stored the same bytes meanwhile; the files are identical
+        return MirroredImage.objects.get(content_hash=content_hash), False
+    return mirrored, True
+
+
+def public_image_url(image):
+    """
+    Absolute URL of an Image's local copy (IMAGE_MIRROR_BASE_URL + MEDIA_URL path), or None when not mirrored.
+    """
+    if image.mirror is None:
+        return None
+    return settings.IMAGE_MIRROR_BASE_URL.rstrip('/') + image.mirror.url()
+
+
+def mirror_images(limit=None, product_ids=None, retry_failed=False):
+    """
+    Download every product image that has no local copy yet, IMAGE_MIRROR_BATCH URLs at a time.
+
+    Each distinct URL is downloaded once and its local copy attached to every Image row with that URL.
+    A URL that cannot be downloaded or decoded gets its error recorded and is skipped on later runs
+    unless `retry_failed` is set; one refused by an open circuit breaker stays pending.
+    Returns {'mirrored', 'deduplicated', 'reused', 'failed', 'deferred'} counts of URLs.
+    """
+    pending = Image.objects.filter(mirror__isnull=True)
+    if not retry_failed:
+        pending = pending.filter(mirror_error='')
+    if product_ids:
+        pending = pending.filter(product_id__in=product_ids)
+
+    summary = {'mirrored': 0, 'deduplicated': 0, 'reused': 0, 'failed': 0, 'deferred': 0}
+    processed = 0
+    last_url = ''
+    while limit is None or processed < limit:
+        batch_size = settings.IMAGE_MIRROR_BATCH if limit is None else min(settings.IMAGE_MIRROR_BATCH, limit - processed)
+        # Keyset pagination by URL, so deferred and failed URLs are not picked up again in this run
+        urls = list(
+            pending.filter(url__gt=last_url).order_by('url').values_list('url', flat=True).distinct()[:batch_size]
+        )
+        if not urls:
+            break
+        last_url = urls[-1]
+        processed += len(urls)
+
+        # URLs already mirrored for another product need no download
+        known = dict(Image.objects.filter(url__in=urls, mirror__isnull=False).values_list('url', 'mirror_id'))
+        for url, mirror_id in known.items():
+            pending.filter(url=url).update(mirror_id=mirror_id, mirror_error='')
+            summary['reused'] += 1
+        urls = [url for url in urls if url not in known]
+
+        responses = fetch_many(urls)
+        for url, response in zip(urls, responses):
+            if isinstance(response, CircuitOpenError):
+                # Left pending for the next run
+                logger.warning(f"Not mirroring {url}: {str(response)}")
+                summary['deferred'] += 1
+                continue
+            if isinstance(response, Exception):
+                error = f"{type(response).__name__}: {str(response)}"
+            elif response.status_code != 200:
+                error = f"HTTP {response.status_code}"
+            else:
+                try:
+                    with stage('image_store'):
+                        mirrored, created = store_image(response.content)
+                except ValueError as e:
+                    error = str(e)
+                else:
+                    pending.filter(url=url).update(mirror=mirrored, mirror_error='')
+                    summary['mirrored' if created else 'deduplicated'] += 1
+                    incr('images_mirrored' if created else 'images_deduplicated')
+                    continue
+
+            logger.error(f"Could not mirror image {url}: {error}")
+            pending.filter(url=url).update(mirror_error=error[:255])
+            summary['failed'] += 1
+            incr('images_failed')
+
+        logger.info(f"Processed {processed} image URLs: {summary}")
+
+    return summary
@@ -0,0 +1,94 @@
+import json
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from agent.benchmark import COLLECTION_RESULTS, benchmark_backend, check_expectations, compare_to_baseline, load_benchmark_pages
+from agent.parsers import PARSER_BACKENDS
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark product page extraction per parser backend and collection link parsing over the synthetic '
+        'fixture pages, and compare against a saved baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            default=list(PARSER_BACKENDS),
+            choices=list(PARSER_BACKENDS),
+            help='Parser backends to benchmark',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Timed passes over the fixture pages per backend',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            type=str,
+            default=None,
+            help='Write the results to this JSON file',
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            default=None,
+            help='Compare the results against a baseline JSON file and fail on regressions',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed regression against the baseline as a fraction (default: 0.2)',
+        )
+
+    def handle(self, *args, **options):
+        pages = load_benchmark_pages()
+        product_pages = [page for page in pages if page['kind'] == 'product']
+        collection_pages = [page for page in pages if page['kind'] == 'collection']
+        logger.info(
+            f"Benchmarking {len(product_pages)} product pages with {', '.join(options['backends'])} "
+            f"and {len(collection_pages)} collection pages..."
+        )
+
+        errors = check_expectations(None, collection_pages)
+        for backend in options['backends']:
+            errors.extend(check_expectations(backend, product_pages))
+        if errors:
+            raise CommandError("Extraction results differ from the fixture manifest:\n" + "\n".join(errors))
+
+        # Collection link parsing always uses html.parser, so it is timed once
+        runs = [(backend, backend, product_pages) for backend in options['backends']]
+        if collection_pages:
+            runs.append((COLLECTION_RESULTS, None, collection_pages))
+
+        results = {}
+        for name, backend, run_pages in runs:
+            metrics = results[name] = benchmark_backend(backend, run_pages, iterations=options['iterations'])
+            self.stdout.write(
+                f"{name:<14} pages={metrics['pages']:<3} p50={metrics['p50_ms']:.2f}ms "
+                f"p95={metrics['p95_ms']:.2f}ms p99={metrics['p99_ms']:.2f}ms "
+                f"{metrics['pages_per_sec']:.1f} pages/s peak={metrics['peak_kb']:.0f}KB"
+            )
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['compare']}: {str(e)}")
+
+            regressions = compare_to_baseline(results, baseline, tolerance=options['tolerance'])
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']} (tolerance {options['tolerance']:.0%})"))
@@ -0,0 +1,89 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from agent.archive import iter_latest_archived_pages, read_archived_page
+from agent.parsers import PARSER_BACKENDS, get_parser
+from agent.shopify import build_product_data, load_product_json
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Check that HTML parser backends return identical extraction results on archived product pages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            default=['soup', 'soup_strainer', 'lxml'],
+            choices=list(PARSER_BACKENDS),
+            help='Backends to compare; the first one is the reference',
+        )
+        parser.add_argument(
+            '--url-contains',
+            type=str,
+            default=None,
+            help='Only check archived URLs containing this string',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of pages to check',
+        )
+
+    def extract(self, backend, url, content):
+        """
+        Run a backend over a page and return its parsed nodes plus the product data built from them.
+        """
+        page = get_parser(backend).parse(content)
+        product_json = load_product_json(page['product_json'])
+        return page, build_product_data(url, product_json) if product_json else None
+
+    def handle(self, *args, **options):
+        backends = options['backends']
+        reference = backends[0]
+
+        items = list(iter_latest_archived_pages(options['url_contains']))
+        if options['limit']:
+            items = items[:options['limit']]
+        if not items:
+            raise CommandError("No archived pages found.")
+
+        timings = {backend: 0.0 for backend in backends}
+        mismatches = 0
+        for url, path, compression in items:
+            content = read_archived_page(path, compression)
+
+            results = {}
+            errors = {}
+            for backend in backends:
+                started = time.perf_counter()
+                try:
+                    results[backend] = self.extract(backend, url, content)
+                except Exception as e:
+                    # e.g. MissingPriceError from build_product_data; one bad page must not end the run
+                    errors[backend] = f"{type(e).__name__}: {str(e)}"
+                timings[backend] += time.perf_counter() - started
+
+            if errors:
+                mismatches += 1
+                for backend, error in errors.items():
+                    logger.error(f"{backend} could not extract {url}: {error}")
+                continue
+
+            for backend in backends[1:]:
+                if results[backend] != results[reference]:
+                    mismatches += 1
+                    page, product_data = results[backend]
+                    reference_page, reference_data = results[reference]
+                    fields = [key for key in reference_page if page.get(key) != reference_page.get(key)]
+                    logger.error(f"{backend} differs from {reference} on {url} (parsed fields: {', '.join(fields) or 'none'}, product data equal: {product_data == reference_data})")
+
+        for backend in backends:
+            self.stdout.write(f"{backend}: {timings[backend] / len(items) * 1000:.2f} ms/page")
+
+        if mismatches:
+            raise CommandError(f"{mismatches} mismatches over {len(items)} pages")
+        self.stdout.write(self.style.SUCCESS(f"All backends agree on {len(items)} pages"))
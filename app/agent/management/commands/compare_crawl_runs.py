@@ -0,0 +1,73 @@
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from agent.metrics import COUNTERS, STAGES
+from agent.models import CrawlRun
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-stage time and counters of finished crawl runs side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'run_ids',
+            nargs='*',
+            help='Run ids to compare (default: the last --last finished runs)',
+        )
+        parser.add_argument(
+            '--kind',
+            type=str,
+            default=None,
+            help="Only consider runs of this kind ('collections', 'products')",
+        )
+        parser.add_argument(
+            '--last',
+            type=int,
+            default=2,
+            help='Number of most recent finished runs to compare when no run ids are given',
+        )
+
+    def handle(self, *args, **options):
+        if options['run_ids']:
+            runs = {run.run_id: run for run in CrawlRun.objects.filter(run_id__in=options['run_ids'])}
+            missing = [run_id for run_id in options['run_ids'] if run_id not in runs]
+            if missing:
+                raise CommandError(f"Unknown runs: {', '.join(missing)}")
+            runs = [runs[run_id] for run_id in options['run_ids']]
+        else:
+            queryset = CrawlRun.objects.filter(finished_at__isnull=False)
+            if options['kind']:
+                queryset = queryset.filter(kind=options['kind'])
+            runs = list(queryset.order_by('-finished_at')[:options['last']])[::-1]
+
+        if not runs:
+            raise CommandError("No finished crawl runs found.")
+
+        width = 14
+        self.stdout.write(f"{'':<20}" + ''.join(f"{run.run_id[:12]:>{width}}" for run in runs))
+        self.stdout.write(f"{'kind':<20}" + ''.join(f"{run.kind:>{width}}" for run in runs))
+        self.stdout.write(f"{'duration (s)':<20}" + ''.join(
+            f"{(run.finished_at - run.started_at).total_seconds() if run.finished_at else float('nan'):>{width}.1f}" for run in runs
+        ))
+
+        for name in STAGES:
+            values = [(run.metrics.get('stages') or {}).get(name, 0) for run in runs]
+            if any(values):
+                self.stdout.write(f"{name + ' (s)':<20}" + ''.join(f"{value:>{width}.1f}" for value in values))
+
+        for name in COUNTERS:
+            values = [(run.metrics.get('counters') or {}).get(name, 0) for run in runs]
+            if any(values):
+                self.stdout.write(f"{name:<20}" + ''.join(f"{value:>{width}}" for value in values))
+
+        # Downloaded per product processed, over HTTP and by Chrome
+        values = []
+        for run in runs:
+            counters = run.metrics.get('counters') or {}
+            products = sum(counters.get(name, 0) for name in ('products_updated', 'products_unchanged', 'products_failed'))
+            downloaded = counters.get('bytes_fetched', 0) + counters.get('render_bytes', 0)
+            values.append(downloaded / products / 1024 if products else float('nan'))
+        if any(value == value for value in values):
+            self.stdout.write(f"{'KiB/product':<20}" + ''.join(f"{value:>{width}.1f}" for value in values))
@@ -0,0 +1,33 @@
+import logging
+import uuid
+from django.core.management.base import BaseCommand
+from agent.tasks import discover_sitemap_changes_task
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the Celery task that queues only new or changed products from the store sitemaps'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product-limit',
+            type=int,
+            default=None,
+            help='Maximum number of products to queue',
+        )
+
+    def handle(self, *args, **options):
+        product_limit = options['product_limit']
+
+        logger.info(f"Starting sitemap discovery task with product_limit={product_limit}")
+
+        try:
+            run_id = uuid.uuid4().hex
+            discover_sitemap_changes_task.delay(product_limit=product_limit, run_id=run_id)
+            logger.info("Task triggered to queue new or changed products from the sitemaps")
+            logger.info(f"Poll progress at /agent/runs/{run_id}/")
+
+        except Exception as e:
+            # Log any errors
+            logger.error(f"Error while triggering the task: {str(e)}")
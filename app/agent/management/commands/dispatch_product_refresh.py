@@ -0,0 +1,41 @@
+import logging
+from django.core.management.base import BaseCommand
+from agent.dispatch import RefreshDispatcher, refresh_products
+from agent.models import Product
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Refresh products through a bounded window of concurrent get_or_update_product_info tasks, '
+        'reporting throughput and ETA as results come in.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Include products with allow_update=False')
+        parser.add_argument('--limit', type=int, default=None, help='Refresh at most this many products')
+        parser.add_argument('--max-in-flight', type=int, default=None, help='Tasks queued or running at once (default: DISPATCH_MAX_IN_FLIGHT)')
+        parser.add_argument('--rate', type=float, default=None, help='Tasks enqueued per second, 0 for no limit (default: DISPATCH_RATE)')
+        parser.add_argument('--task-timeout', type=int, default=None, help='Seconds to wait for one task (default: DISPATCH_TASK_TIMEOUT)')
+        parser.add_argument('--mode', type=str, default=None, help="Extraction mode, 'json' or 'selenium' (default: PRODUCT_EXTRACTION_MODE)")
+        parser.add_argument('--force', action='store_true', help='Process products even if unchanged or refreshed recently')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all() if options['all'] else Product.objects.filter(allow_update=True)
+        products = products.order_by('pk')
+        if options['limit']:
+            products = products.filter(pk__in=products.values('pk')[:options['limit']])
+
+        if not products.exists():
+            logger.error("No products to refresh.")
+            return
+
+        dispatcher = RefreshDispatcher(
+            max_in_flight=options['max_in_flight'],
+            rate=options['rate'],
+            task_timeout=options['task_timeout'],
+        )
+        run_id, summary = refresh_products(products, dispatcher=dispatcher, mode=options['mode'], force=options['force'])
+        logger.info(f"Run {run_id} finished: {summary}")
@@ -1,4 +1,5 @@
 import logging
+import uuid
 from django.core.management.base import BaseCommand
 from agent.tasks import get_collection_links_task  # Import the Celery task from the agent app
 
@@ -13,8 +14,10 @@ class Command(BaseCommand):
 
         try:
             # Run the Celery task without any limits
-            get_collection_links_task.delay()
+            run_id = uuid.uuid4().hex
+            get_collection_links_task.delay(run_id=run_id)
             logger.info("Task triggered to fetch all collections and products")
+            logger.info(f"Poll progress at /agent/runs/{run_id}/")
 
         except Exception as e:
             # Log any errors
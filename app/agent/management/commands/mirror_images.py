@@ -0,0 +1,22 @@
+import logging
+from django.core.management.base import BaseCommand
+from agent.images import mirror_images
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Download product images that have no local copy yet into the media volume, '
+        'deduplicated by content hash, with their thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Mirror at most this many image URLs')
+        parser.add_argument('--product', type=int, action='append', dest='product_ids', help='Only images of this product id (repeatable)')
+        parser.add_argument('--retry-failed', action='store_true', help='Also retry URLs whose last mirror attempt failed')
+
+    def handle(self, *args, **options):
+        summary = mirror_images(limit=options['limit'], product_ids=options['product_ids'], retry_failed=options['retry_failed'])
+        logger.info(f"Image mirror finished: {summary}")
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from agent.archive import iter_latest_archived_pages, read_archived_page
+from agent.persistence import save_product_data
+from agent.shopify import extract_product_from_html
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def extract_archived_page(item):
+    """
+    Pool worker: read one archived page and run the extraction on it. No network and no database access.
+    """
+    url, path, compression = item
+    try:
+        content = read_archived_page(path, compression)
+        return url, extract_product_from_html(url, content), None
+    except Exception as e:
+        return url, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Re-run product extraction and persistence over the latest archived page of every URL, without network or Chrome.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of extraction processes (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--url-contains',
+            type=str,
+            default=None,
+            help='Only re-parse archived URLs containing this string',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of pages to re-parse',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Run the extraction only; do not write to the database',
+        )
+
+    def handle(self, *args, **options):
+        items = list(iter_latest_archived_pages(options['url_contains']))
+        if options['limit']:
+            items = items[:options['limit']]
+
+        if not items:
+            logger.error("No archived pages found.")
+            return
+
+        logger.info(f"Re-parsing {len(items)} archived pages with {options['workers']} workers...")
+
+        # Workers are forked; they must not inherit open database connections
+        connections.close_all()
+
+        started = time.monotonic()
+        saved = missing_json = failed = 0
+        with multiprocessing.Pool(options['workers']) as pool:
+            for index, (url, product_data, error) in enumerate(pool.imap_unordered(extract_archived_page, items, chunksize=16), start=1):
+                if error:
+                    failed += 1
+                    logger.error(f"Could not extract {url}: {error}")
+                elif product_data is None:
+                    missing_json += 1
+                    logger.warning(f"No product JSON in archived page: {url}")
+                elif not options['dry_run']:
+                    try:
+                        save_product_data(product_data)
+                        saved += 1
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Could not save {url}: {str(e)}")
+
+                if index % 500 == 0:
+                    logger.info(f"Re-parsed {index}/{len(items)} pages ({index / (time.monotonic() - started):.1f} pages/s)")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-parsed {len(items)} pages in {elapsed:.1f}s: {saved} saved, {missing_json} without product JSON, {failed} failed"
+        ))
@@ -0,0 +1,55 @@
+import logging
+from django.core.management.base import BaseCommand
+from agent.standin import StandinStore, SyntheticCatalog, make_standin_server
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a synthetic Shopify-like store for end-to-end crawl testing. '
+        'Point SCRAPE_BASE_URL at it (and raise HTTP_RATE_PER_HOST) to load-test the crawler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to bind')
+        parser.add_argument('--port', type=int, default=8001, help='Port to bind')
+        parser.add_argument('--products', type=int, default=1000, help='Number of products in the catalog')
+        parser.add_argument('--collections', type=int, default=None, help='Number of collections (default: products / 50, at most 500)')
+        parser.add_argument('--seed', type=int, default=0, help='Catalog seed; the same seed always serves the same catalog')
+        parser.add_argument('--revision', type=int, default=0, help='Simulated store edits; each revision changes a fraction of the products')
+        parser.add_argument('--change-rate', type=float, default=0.05, help='Fraction of products changed per revision')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Added latency per request in milliseconds')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra latency per request, up to this many milliseconds')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with 429, 500 or 503')
+        parser.add_argument('--access-log', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        catalog = SyntheticCatalog(
+            products=options['products'],
+            collections=options['collections'],
+            seed=options['seed'],
+            revision=options['revision'],
+            change_rate=options['change_rate'],
+        )
+        store = StandinStore(
+            catalog,
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            error_rate=options['error_rate'],
+        )
+        server = make_standin_server(store, options['host'], options['port'], access_log=options['access_log'])
+
+        logger.info(
+            f"Stand-in store with {catalog.size} products in {catalog.collection_count} collections "
+            f"on http://{options['host']}:{options['port']}/ (latency {options['latency_ms']}ms "
+            f"+ up to {options['jitter_ms']}ms, error rate {options['error_rate']:.1%})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            logger.info(f"Responses by status: {dict(sorted(store.counts.items()))}")
@@ -1,4 +1,5 @@
 import logging
+import uuid
 from django.core.management.base import BaseCommand
 from agent.tasks import get_collection_links_task  # Import the Celery task from the agent app
 
@@ -30,8 +31,10 @@ class Command(BaseCommand):
 
         try:
             # Run the Celery task with the specified limits
-            get_collection_links_task.delay(collection_limit=collection_limit, product_limit=product_limit)
+            run_id = uuid.uuid4().hex
+            get_collection_links_task.delay(collection_limit=collection_limit, product_limit=product_limit, run_id=run_id)
             logger.info(f"Task triggered: Fetch {collection_limit} collections and {product_limit} products per collection")
+            logger.info(f"Poll progress at /agent/runs/{run_id}/")
 
         except Exception as e:
             # Log any errors
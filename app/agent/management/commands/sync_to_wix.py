@@ -1,6 +1,8 @@
 import logging
 from tqdm import tqdm
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from agent.images import public_image_url
 from agent.models import Product, WixProduct, Variant
 
 # Set up logging
@@ -9,7 +11,18 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Sync all Product instances to WixProduct'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mirrored-images', action='store_true',
+            help='Use the local copies of product images (see mirror_images) in product_image_url; '
+                 'images not mirrored yet keep their store URL',
+        )
+
     def handle(self, *args, **options):
+        mirrored_images = options['mirrored_images']
+        if mirrored_images and not settings.IMAGE_MIRROR_BASE_URL:
+            raise CommandError("--mirrored-images needs IMAGE_MIRROR_BASE_URL, the public origin serving the media volume")
+
         logger.info("Starting the synchronization process for all products to WixProduct...")
 
         # Fetch all products from the database
@@ -39,7 +52,7 @@ class Command(BaseCommand):
                                 'name': product.title,
                                 'description': product.description,
                                 'price': first_variant.price,  # Using the first variant's price
-                                'product_image_url': ';'.join(set(image.url for image in product.images.all())),
+                                'product_image_url': ';'.join(set(self.image_url(image, mirrored_images) for image in product.images.select_related('mirror'))),
                                 'ribbon': 'New',  # Set ribbon to 'New'
                                 'inventory': 'InStock',  # Inventory status
                                 'visible': True,
@@ -107,3 +120,8 @@ class Command(BaseCommand):
                 pbar.update(1)
 
         logger.info("Synchronization process completed for all products.")
+
+    def image_url(self, image, mirrored_images):
+        if mirrored_images:
+            return public_image_url(image) or image.url
+        return image.url
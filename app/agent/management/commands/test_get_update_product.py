@@ -1,7 +1,7 @@
 import logging
 from django.core.management.base import BaseCommand
 from agent.models import Product
-from agent.tasks import get_or_update_product_info
+from agent.tasks import enqueue_product_refresh
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -12,6 +12,7 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         # Add an argument to accept the product pk
         parser.add_argument('pk', type=int, help='The primary key of the product to fetch.')
+        parser.add_argument('--force', action='store_true', help='Process the product even if its page is unchanged since the last run.')
 
     def handle(self, *args, **options):
         product_pk = options['pk']
@@ -28,8 +29,10 @@ class Command(BaseCommand):
 
         try:
             # Trigger the Celery task to get or update product info
-            get_or_update_product_info.delay(product.source_url)
-            logger.info(f"Task triggered for product: {product.pk} (URL: {product.source_url})")
+            if enqueue_product_refresh(product.source_url, force=options['force']) is None:
+                logger.info(f"Product {product.pk} is already queued or was refreshed recently (use --force to refresh it anyway)")
+            else:
+                logger.info(f"Task triggered for product: {product.pk} (URL: {product.source_url})")
 
         except Exception as e:
             logger.error(f"Error while triggering the task for product {product.pk} (URL: {product.source_url}): {e}")
@@ -0,0 +1,257 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from celery.signals import task_postrun, worker_process_shutdown
+from django.core.cache import cache
+from django.db import connection
+from .stats import get_run_counters, incr_run_counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Timed crawl stages
+STAGES = [
+    'chrome_start',   # Starting a pooled Chrome
+    'lease_wait',     # Waiting for a pooled Chrome, including starting one
+    'driver_get',     # driver.get() of a product or collection page
+    'wait_page_ready',    # Waiting for a loaded page's product form or grid
+    'wait_network_idle',  # Waiting for a loaded page's scripts to finish loading
+    'wait_option',        # Waiting for the price/variant to update after selecting an option
+    'wait_scroll',        # Waiting for more collection items after a scroll
+    'option_select',  # Selecting a variant option in Chrome
+    'http_fetch',     # Plain HTTP requests through agent.fetch
+    'parse',          # HTML parsing and product data building
+    'archive',        # Writing the raw page to the archive
+    'image_store',    # Decoding a mirrored image and writing it with its thumbnails
+    'db_write',       # Persisting products and collection membership
+]
+
+# Counted events
+COUNTERS = [
+    'pages_fetched',
+    'bytes_fetched',
+    'pages_rendered', # Pages loaded in Chrome
+    'render_bytes',   # Transferred by Chrome for rendered pages
+    'option_clicks',
+    'variant_matrix_fallbacks',  # Variant matrices read option by option: too many combinations or a script timeout
+    'wait_timeouts',
+    'db_queries',
+    'rows_written',
+    'products_updated',
+    'products_unchanged',
+    'products_failed',
+    'products_skipped',  # Already being processed elsewhere, or refreshed within PRODUCT_REFRESH_WINDOW
+    'products_deferred', # Not fetched because the store's circuit breaker was open
+    'rate_backoffs',     # AIMD rate decreases after a 429, 5xx or timeout
+    'breaker_opened',
+    'breaker_rejected',  # Requests refused while a circuit breaker was open
+    'images_mirrored',
+    'images_deduplicated',  # Downloaded images whose bytes were already mirrored from another URL
+    'images_failed',
+]
+
+# Run counters holding a run's stage times (integer milliseconds, as the cache only increments integers)
+RUN_METRIC_NAMES = [f"stage_ms:{stage}" for stage in STAGES] + COUNTERS
+
+# Worker snapshots are pushed to the cache at most this often, and expire when a worker goes away
+WORKER_FLUSH_INTERVAL = 10
+WORKER_METRICS_TTL = 10 * 60
+WORKERS_KEY = 'metrics:workers'
+
+_lock = threading.Lock()
+_totals = {'stage_seconds': {}, 'stage_calls': {}, 'counters': {}}
+_local = threading.local()
+_last_flush = 0.0
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _current_run():
+    return getattr(_local, 'run', None)
+
+
+def record_stage(name, seconds):
+    """
+    Add a stage duration to this process's totals and to the crawl run being tracked in this thread.
+    """
+    with _lock:
+        _totals['stage_seconds'][name] = _totals['stage_seconds'].get(name, 0.0) + seconds
+        _totals['stage_calls'][name] = _totals['stage_calls'].get(name, 0) + 1
+    run = _current_run()
+    if run is not None:
+        run['stage_seconds'][name] = run['stage_seconds'].get(name, 0.0) + seconds
+
+
+def incr(name, amount=1):
+    """
+    Increment an event counter for this process and for the crawl run being tracked in this thread.
+    """
+    with _lock:
+        _totals['counters'][name] = _totals['counters'].get(name, 0) + amount
+    run = _current_run()
+    if run is not None:
+        run['counters'][name] = run['counters'].get(name, 0) + amount
+
+
+@contextmanager
+def stage(name):
+    """
+    Time the `with` block as one call of a crawl stage.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the SQL statements run in the `with` block, and the rows they inserted, updated or deleted.
+    """
+    def wrapper(execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        incr('db_queries')
+        if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            rowcount = getattr(context['cursor'], 'rowcount', -1)
+            if rowcount and rowcount > 0:
+                incr('rows_written', rowcount)
+        return result
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+@contextmanager
+def track_run(run_id):
+    """
+    Attribute the stages and counters recorded in this thread during the `with` block to a crawl run.
+
+    The run's totals are added to its run counters in the cache when the block exits. Without a run id
+    only the process totals are kept.
+    """
+    if not run_id:
+        yield
+        return
+
+    previous = _current_run()
+    _local.run = {'stage_seconds': {}, 'counters': {}}
+    try:
+        yield
+    finally:
+        run = _local.run
+        _local.run = previous
+        try:
+            for name, seconds in run['stage_seconds'].items():
+                incr_run_counter(run_id, f"stage_ms:{name}", int(round(seconds * 1000)))
+            for name, amount in run['counters'].items():
+                if amount:
+                    incr_run_counter(run_id, name, amount)
+        except Exception as e:
+            logger.error(f"Could not record metrics for run {run_id}: {str(e)}")
+
+
+def get_run_metrics(run_id):
+    """
+    Return {'stages': {stage: seconds}, 'counters': {name: value}} recorded for a crawl run.
+    """
+    values = get_run_counters(run_id, RUN_METRIC_NAMES)
+    return {
+        'stages': {stage: values[f"stage_ms:{stage}"] / 1000 for stage in STAGES},
+        'counters': {name: values[name] for name in COUNTERS},
+    }
+
+
+def snapshot():
+    """
+    Return a copy of this process's cumulative stage times, stage calls and counters.
+    """
+    with _lock:
+        return {key: dict(values) for key, values in _totals.items()}
+
+
+def flush_worker_metrics(force=False):
+    """
+    Publish this process's totals to the cache for the /metrics view, at most every WORKER_FLUSH_INTERVAL seconds.
+    """
+    global _last_flush
+    now = time.time()
+    if not force and now - _last_flush < WORKER_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+
+    worker = worker_id()
+    try:
+        cache.set(f"metrics:worker:{worker}", dict(snapshot(), updated_at=now), WORKER_METRICS_TTL)
+        # The registry is read-modify-write; a worker lost to a race re-registers on its next flush
+        workers = cache.get(WORKERS_KEY) or {}
+        if worker not in workers or now - workers[worker] > WORKER_METRICS_TTL / 2:
+            workers = {name: seen for name, seen in workers.items() if now - seen < WORKER_METRICS_TTL}
+            workers[worker] = now
+            cache.set(WORKERS_KEY, workers, None)
+    except Exception as e:
+        logger.error(f"Could not publish worker metrics: {str(e)}")
+
+
+@task_postrun.connect
+def flush_after_task(**kwargs):
+    flush_worker_metrics()
+
+
+@worker_process_shutdown.connect
+def flush_at_shutdown(**kwargs):
+    flush_worker_metrics(force=True)
+
+
+def get_worker_metrics():
+    """
+    Return {worker: snapshot} for every worker that published metrics recently.
+    """
+    workers = cache.get(WORKERS_KEY) or {}
+    snapshots = cache.get_many([f"metrics:worker:{worker}" for worker in workers])
+    return {worker: snapshots[f"metrics:worker:{worker}"] for worker in workers if f"metrics:worker:{worker}" in snapshots}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(workers):
+    """
+    Render worker snapshots in the Prometheus text exposition format.
+    """
+    lines = [
+        '# HELP crawler_stage_seconds_total Time spent in each crawl stage.',
+        '# TYPE crawler_stage_seconds_total counter',
+    ]
+    for worker, data in sorted(workers.items()):
+        for name, seconds in sorted(data['stage_seconds'].items()):
+            lines.append(f'crawler_stage_seconds_total{{worker="{_escape(worker)}",stage="{_escape(name)}"}} {seconds:.6f}')
+
+    lines += [
+        '# HELP crawler_stage_calls_total Number of timed calls of each crawl stage.',
+        '# TYPE crawler_stage_calls_total counter',
+    ]
+    for worker, data in sorted(workers.items()):
+        for name, calls in sorted(data['stage_calls'].items()):
+            lines.append(f'crawler_stage_calls_total{{worker="{_escape(worker)}",stage="{_escape(name)}"}} {calls}')
+
+    for name in COUNTERS:
+        lines += [f'# TYPE crawler_{name}_total counter']
+        for worker, data in sorted(workers.items()):
+            lines.append(f'crawler_{name}_total{{worker="{_escape(worker)}"}} {data["counters"].get(name, 0)}')
+
+    lines += [
+        '# HELP crawler_worker_last_flush_timestamp_seconds When each worker last published its metrics.',
+        '# TYPE crawler_worker_last_flush_timestamp_seconds gauge',
+    ]
+    for worker, data in sorted(workers.items()):
+        lines.append(f'crawler_worker_last_flush_timestamp_seconds{{worker="{_escape(worker)}"}} {data["updated_at"]:.3f}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0009_collection_csv_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1024, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=1024, null=True)),
+                ('last_modified', models.CharField(blank=True, max_length=255, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64, null=True)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0010_pagecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagecache',
+            name='sitemap_lastmod',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
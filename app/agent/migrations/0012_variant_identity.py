@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:56
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_signatures(apps, schema_editor):
+    """
+    Compute the option signature of existing variants (same format as agent.persistence.variant_signature).
+    """
+    Variant = apps.get_model('agent', 'Variant')
+    for variant in Variant.objects.prefetch_related('options__category').iterator(chunk_size=1000):
+        pairs = sorted(f"{option.category.name}\x1f{option.value}" for option in variant.options.all())
+        signature = hashlib.sha1("\x1e".join(pairs).encode('utf-8')).hexdigest()
+        Variant.objects.filter(pk=variant.pk).update(signature=signature)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0011_pagecache_sitemap_lastmod'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variant',
+            name='external_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='variant',
+            name='signature',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='variant',
+            index=models.Index(fields=['product', 'signature'], name='variant_product_signature_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='variant',
+            constraint=models.UniqueConstraint(fields=('product', 'external_id'), name='unique_variant_external_id'),
+        ),
+        migrations.RunPython(backfill_signatures, migrations.RunPython.noop),
+    ]
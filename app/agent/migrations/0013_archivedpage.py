@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0012_variant_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=1024)),
+                ('fetched_at', models.DateTimeField()),
+                ('status_code', models.IntegerField(default=200)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('path', models.CharField(max_length=255)),
+                ('compression', models.CharField(default='gzip', max_length=10)),
+                ('size', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url', 'fetched_at'], name='archivedpage_url_fetched_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0015_image_mirror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagecache',
+            name='product_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+
+# Directory under MEDIA_ROOT the archive used to live in; its contents move to PAGE_ARCHIVE_ROOT as they are
+OLD_ARCHIVE_DIR = 'page_archive/'
+
+
+def strip_media_prefix(apps, schema_editor):
+    """
+    Make archive paths relative to PAGE_ARCHIVE_ROOT instead of MEDIA_ROOT.
+    """
+    ArchivedPage = apps.get_model('agent', 'ArchivedPage')
+    ArchivedPage.objects.filter(path__startswith=OLD_ARCHIVE_DIR).update(path=Substr('path', len(OLD_ARCHIVE_DIR) + 1))
+
+
+def add_media_prefix(apps, schema_editor):
+    ArchivedPage = apps.get_model('agent', 'ArchivedPage')
+    ArchivedPage.objects.exclude(path__startswith=OLD_ARCHIVE_DIR).update(path=Concat(Value(OLD_ARCHIVE_DIR), 'path'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent', '0016_pagecache_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(strip_media_prefix, add_media_prefix),
+    ]
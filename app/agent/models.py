@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -48,10 +49,40 @@ class OptionValue(models.Model):
     def __str__(self):
         return self.value
 
+class MirroredImage(models.Model):
+    """
+    A downloaded product image, stored once per content hash on the media volume along with its thumbnails.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)  # sha256 of the downloaded bytes, also the file name
+    path = models.CharField(max_length=255)  # Original, relative to MEDIA_ROOT
+    format = models.CharField(max_length=10)  # Pillow format name: 'JPEG', 'PNG', 'WEBP', ...
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    size = models.IntegerField(default=0)  # Original size in bytes
+    thumbnails = models.JSONField(default=dict, blank=True)  # {longest side in pixels: path relative to MEDIA_ROOT}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def url(self):
+        return settings.MEDIA_URL + self.path
+
+    def thumbnail_url(self, size):
+        """
+        URL of the smallest thumbnail at least `size` pixels on its longest side, or of the original.
+        """
+        sizes = sorted(int(key) for key in self.thumbnails if int(key) >= size)
+        if sizes:
+            return settings.MEDIA_URL + self.thumbnails[str(sizes[0])]
+        return self.url()
+
+    def __str__(self):
+        return self.content_hash
+
 class Image(models.Model):
     product = models.ForeignKey(Product, related_name="images", on_delete=models.CASCADE)
     url = models.URLField(max_length=1024)  # Increased length for the URL
     alt_text = models.CharField(max_length=1024, blank=True, null=True)  # Increased length for alt_text
+    mirror = models.ForeignKey(MirroredImage, related_name="images", blank=True, null=True, on_delete=models.SET_NULL)  # Local copy, once mirrored
+    mirror_error = models.CharField(max_length=255, blank=True, default='')  # Why the last mirror attempt failed
 
     def __str__(self):
         return f"Image for {self.product.title}"
@@ -61,10 +92,72 @@ class Variant(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     options = models.ManyToManyField(OptionValue, related_name="variants")  # Many-to-many to represent combinations of Size, Color, etc.
     images = models.ManyToManyField('Image', related_name="variant_images", blank=True)
+    external_id = models.BigIntegerField(blank=True, null=True)  # Upstream (Shopify) variant id, when known
+    signature = models.CharField(max_length=64, blank=True, default='')  # sha1 of the sorted option category/value pairs
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'external_id'], name='unique_variant_external_id'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'signature'], name='variant_product_signature_idx'),
+        ]
 
     def __str__(self):
         return f"Variant of {self.product.title}"
 
+class PageCache(models.Model):
+    """
+    Conditional-request validators and normalized content hash of the last processed fetch of a page.
+    """
+    url = models.URLField(max_length=1024, unique=True)
+    etag = models.CharField(max_length=1024, blank=True, null=True)
+    last_modified = models.CharField(max_length=255, blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)  # sha256 of the normalized body
+    fetched_at = models.DateTimeField(blank=True, null=True)  # Last time the page was checked
+    changed_at = models.DateTimeField(blank=True, null=True)  # Last time the content hash changed
+    sitemap_lastmod = models.DateTimeField(blank=True, null=True)  # <lastmod> watermark of the last processed sitemap entry
+    product_updated_at = models.DateTimeField(blank=True, null=True)  # Product.updated_at as saved from this page; any other write invalidates the entry
+
+    def __str__(self):
+        return self.url
+
+class ArchivedPage(models.Model):
+    """
+    One fetch of a page whose raw body is stored in the content-addressed archive under PAGE_ARCHIVE_ROOT.
+    """
+    url = models.URLField(max_length=1024)
+    fetched_at = models.DateTimeField()
+    status_code = models.IntegerField(default=200)
+    content_hash = models.CharField(max_length=64)  # sha256 of the raw body, also the archive file name
+    path = models.CharField(max_length=255)  # Relative to PAGE_ARCHIVE_ROOT
+    compression = models.CharField(max_length=10, default='gzip')  # 'gzip' or 'zstd'
+    size = models.IntegerField(default=0)  # Uncompressed body size in bytes
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url', 'fetched_at'], name='archivedpage_url_fetched_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.url} @ {self.fetched_at}"
+
+class CrawlRun(models.Model):
+    """
+    Summary of a finished crawl run: its result counts and the time spent per stage, kept for comparing runs.
+    """
+    run_id = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=32)  # 'collections', 'products', ...
+    status = models.CharField(max_length=16, default='running')
+    total = models.IntegerField(blank=True, null=True)  # Collections or products the run set out to process
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(blank=True, null=True)
+    summary = models.JSONField(default=dict, blank=True)
+    metrics = models.JSONField(default=dict, blank=True)  # {'stages': {stage: seconds}, 'counters': {name: value}}
+
+    def __str__(self):
+        return f"{self.kind} run {self.run_id}"
+
 class WixProduct(models.Model):
     # Basic product fields
     handle_id = models.CharField(max_length=521)  # handleId
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import re
+from django.utils import timezone
+from .fetch import fetch
+from .models import PageCache, Product
+from .stats import incr_run_counter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Executable scripts carry per-request nonces, session ids and analytics payloads; JSON data scripts are kept
+_SCRIPT_RE = re.compile(r'<script(?![^>]*type="application/(?:ld\+)?json")[^>]*>.*?</script>', re.IGNORECASE | re.DOTALL)
+_VOLATILE_ATTR_RE = re.compile(r'\s(?:nonce|data-request-id)="[^"]*"', re.IGNORECASE)
+_TOKEN_INPUT_RE = re.compile(r'<input[^>]*name="(?:authenticity_token|form_key|csrfmiddlewaretoken)"[^>]*>', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_content(content):
+    """
+    Strip the parts of a storefront page that change on every request, so the hash only moves when the product does.
+    """
+    text = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+    text = _SCRIPT_RE.sub('', text)
+    text = _VOLATILE_ATTR_RE.sub('', text)
+    text = _TOKEN_INPUT_RE.sub('', text)
+    text = _WHITESPACE_RE.sub(' ', text)
+    return text.strip()
+
+
+def content_hash(content):
+    return hashlib.sha256(normalize_content(content).encode('utf-8')).hexdigest()
+
+
+def conditional_fetch(url, run_id=None, method='GET'):
+    """
+    Fetch a page with If-None-Match / If-Modified-Since from its last processed fetch.
+
+    Returns (response, changed). `changed` is False when the server answers 304 or the
+    normalized body hashes to the stored value; the caller can then skip parsing and writes.
+    The entry only counts while the Product row is still exactly what was saved from it: once
+    anything else has written the product (its updated_at moved), the page is fetched
+    unconditionally and reported as changed, so it is parsed again.
+    With method='HEAD' only the validators are checked and no body is downloaded, for callers
+    that retrieve the page some other way (Chrome) once they know it changed.
+    Call `remember_page` once the page has been processed so a failed run is retried.
+    """
+    entry = PageCache.objects.filter(url=url).first()
+    if entry and not is_product_current(entry):
+        logger.info(f"Product was written since its page was cached, parsing it again: {url}")
+        entry = None
+
+    headers = {}
+    if entry and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+
+    response = fetch(url, method=method, headers=headers)
+
+    changed = True
+    if entry and response.status_code == 304:
+        changed = False
+    elif entry and method == 'GET' and response.status_code == 200 and entry.content_hash == content_hash(response.content):
+        changed = False
+
+    if changed:
+        incr_run_counter(run_id, 'page_cache_miss')
+    else:
+        incr_run_counter(run_id, 'page_cache_hit')
+        # Only the cache row is touched; the product and its updated_at are left alone
+        PageCache.objects.filter(pk=entry.pk).update(
+            etag=response.headers.get('ETag', entry.etag),
+            last_modified=response.headers.get('Last-Modified', entry.last_modified),
+            fetched_at=timezone.now(),
+        )
+        logger.info(f"Page unchanged since last fetch ({response.status_code}): {url}")
+
+    return response, changed
+
+
+def is_product_current(entry):
+    """
+    Return True when the entry's product still has the updated_at it was saved with from this page.
+    """
+    if entry.product_updated_at is None:
+        return False
+    updated_at = Product.objects.filter(source_url=entry.url).values_list('updated_at', flat=True).first()
+    return updated_at == entry.product_updated_at
+
+
+def page_fingerprint(response=None, content=None):
+    """
+    Return the validators and content hash of a fetched page, as a JSON-serializable dict that can be
+    handed to another task to `remember_page` once that task has processed the page.
+
+    `content` is the document to hash when it did not come from `response`.
+    """
+    headers = response.headers if response is not None else {}
+    return {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'content_hash': content_hash(content if content is not None else response.content),
+    }
+
+
+def remember_page(url, response=None, content=None, product=None, fingerprint=None):
+    """
+    Store the validators and content hash of a successfully processed page.
+
+    `content` is the document that was processed when it did not come from `response` (a page
+    rendered in Chrome after a HEAD check); without a response no validators are stored.
+    `fingerprint` (from `page_fingerprint`) replaces both for a page fetched by another task.
+    `product` is the Product just saved from the page; its updated_at stamps the entry.
+    """
+    fingerprint = fingerprint or page_fingerprint(response, content)
+    now = timezone.now()
+    PageCache.objects.update_or_create(
+        url=url,
+        defaults={
+            **fingerprint,
+            'fetched_at': now,
+            'changed_at': now,
+            'product_updated_at': product.updated_at if product is not None else None,
+        }
+    )
@@ -0,0 +1,186 @@
+import logging
+from abc import ABC, abstractmethod
+from bs4 import BeautifulSoup, SoupStrainer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Exact class attribute of the product description block in the store theme
+DESCRIPTION_CLASS = 'description content bottom has-padding-top'
+
+
+class ProductPageParser(ABC):
+    """
+    Reads the handful of nodes the extraction uses from a product page.
+
+    `parse` returns a dict with:
+      product_json   -- raw `data-product` attribute of div.product_form, or None
+      description    -- text of the description block (one line per text node), or None
+      main_image_src -- `data-zoom-src` of the first image in div.image__container, or None
+      price_text     -- text of p.modal_price .current_price .money, or None
+      variant_images -- {data-index: data-zoom-src or None} for img[data-index], first image per index
+    """
+    name = None
+
+    @abstractmethod
+    def parse(self, content):
+        """
+        Parse a product page (bytes or str) into the dict described above.
+        """
+
+
+def _wanted_tag(name, attrs):
+    """
+    True for the top-level nodes the extraction reads; their descendants are always kept.
+    """
+    attrs = attrs or {}
+    classes = attrs.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    if name == 'div':
+        return 'product_form' in classes or 'image__container' in classes or ' '.join(classes) == DESCRIPTION_CLASS
+    if name == 'p':
+        return 'modal_price' in classes
+    if name == 'img':
+        return 'data-index' in attrs
+    return False
+
+
+class ProductPageStrainer(SoupStrainer):
+    """
+    SoupStrainer that only builds the product page nodes we read.
+
+    beautifulsoup4 >= 4.13 asks the strainer through allow_tag_creation(); older
+    releases call a function passed as `name` with (name, attrs) instead.
+    """
+
+    def __init__(self, wanted):
+        super().__init__(wanted)
+        self.wanted = wanted
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.wanted(name, attrs)
+
+    def allow_string_creation(self, string):
+        return False
+
+
+class SoupParser(ProductPageParser):
+    """
+    BeautifulSoup backend. With `strainer=True` only the nodes the extraction reads are built into the tree.
+    """
+
+    def __init__(self, strainer=True, builder='html.parser'):
+        self.strainer = strainer
+        self.builder = builder
+        self.name = 'soup_strainer' if strainer else 'soup'
+
+    def parse(self, content):
+        parse_only = ProductPageStrainer(_wanted_tag) if self.strainer else None
+        soup = BeautifulSoup(content, self.builder, parse_only=parse_only)
+
+        product_form = soup.find('div', class_='product_form')
+
+        description_tag = soup.find('div', class_=DESCRIPTION_CLASS)
+
+        image_container = soup.find('div', class_='image__container')
+        image_tag = image_container.find('img') if image_container else None
+
+        price_text = None
+        modal_price = soup.find('p', class_='modal_price subtitle')
+        current_price = modal_price.find('span', class_='current_price') if modal_price else None
+        money = current_price.find('span', class_='money') if current_price else None
+        if money:
+            price_text = money.text.strip()
+
+        variant_images = {}
+        for img in soup.find_all('img', attrs={'data-index': True}):
+            variant_images.setdefault(img['data-index'], img.get('data-zoom-src'))
+
+        return {
+            'product_json': product_form.get('data-product') if product_form else None,
+            'description': description_tag.get_text(separator='\n', strip=True) if description_tag else None,
+            'main_image_src': image_tag.get('data-zoom-src') if image_tag else None,
+            'price_text': price_text,
+            'variant_images': variant_images,
+        }
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser(ProductPageParser):
+    """
+    lxml backend: parses with libxml2's HTML parser and reads the nodes with XPath.
+    """
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree, html
+        self._etree = etree
+        self._html = html
+
+    def _strings(self, element):
+        """
+        Text nodes in document order, stripped and without empty ones, like BeautifulSoup's get_text(strip=True).
+        """
+        strings = []
+
+        def walk(node):
+            if isinstance(node.tag, str) and node.tag not in ('script', 'style', 'template') and node.text:
+                strings.append(node.text)
+            for child in node:
+                walk(child)
+                if child.tail:
+                    strings.append(child.tail)
+
+        walk(element)
+        return [string.strip() for string in strings if string.strip()]
+
+    def parse(self, content):
+        tree = self._html.fromstring(content)
+
+        product_form = tree.xpath(f"//div[{_has_class('product_form')}]")
+        description_tag = tree.xpath(f"//div[@class='{DESCRIPTION_CLASS}']")
+        image_tag = tree.xpath(f"(//div[{_has_class('image__container')}])[1]//img")
+        money = tree.xpath(
+            f"(//p[@class='modal_price subtitle'])[1]"
+            f"/descendant::span[{_has_class('current_price')}][1]"
+            f"/descendant::span[{_has_class('money')}][1]"
+        )
+
+        variant_images = {}
+        for img in tree.xpath("//img[@data-index]"):
+            variant_images.setdefault(img.get('data-index'), img.get('data-zoom-src'))
+
+        return {
+            'product_json': product_form[0].get('data-product') if product_form else None,
+            'description': '\n'.join(self._strings(description_tag[0])) if description_tag else None,
+            'main_image_src': image_tag[0].get('data-zoom-src') if image_tag else None,
+            'price_text': money[0].text_content().strip() if money else None,
+            'variant_images': variant_images,
+        }
+
+
+PARSER_BACKENDS = {
+    'soup': lambda: SoupParser(strainer=False),
+    'soup_strainer': lambda: SoupParser(strainer=True),
+    'lxml': LxmlParser,
+}
+
+_parsers = {}
+
+
+def get_parser(backend=None):
+    """
+    Return the product page parser for a backend name (default: settings.HTML_PARSER_BACKEND).
+    """
+    backend = backend or settings.HTML_PARSER_BACKEND
+    if backend not in PARSER_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown HTML_PARSER_BACKEND {backend!r}; choose one of {', '.join(PARSER_BACKENDS)}")
+    if backend not in _parsers:
+        _parsers[backend] = PARSER_BACKENDS[backend]()
+    return _parsers[backend]
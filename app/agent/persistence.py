@@ -0,0 +1,264 @@
+import hashlib
+import logging
+from django.db import transaction
+from .models import Collection, Product, OptionCategory, OptionValue, Variant, Image
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def variant_signature(options):
+    """
+    Stable identity of a variant from its (category, value) option pairs, independent of their order.
+    """
+    pairs = sorted(f"{category}\x1f{value}" for category, value in options)
+    return hashlib.sha1("\x1e".join(pairs).encode('utf-8')).hexdigest()
+
+
+def save_product_data(product_data):
+    """
+    Create or update a Product with its images, options and variants from extracted product data.
+
+    `product_data` is the dict built by `agent.shopify.build_product_data` or the Selenium extractor:
+    source_url, title, description, price, main_image_url, an optional `images` gallery (URLs) and a
+    list of variants, each with `options` as (category, value) pairs, a `price` and an optional `image_url`.
+
+    Everything is written in one transaction with set-based statements: option categories,
+    option values and images are each resolved with one query and the missing rows bulk-created.
+    Variants are identified by upstream id or option signature and reconciled against the
+    existing rows, and the variant<->option and variant<->image through rows are diffed the same way.
+    """
+    product_url = product_data['source_url']
+    title = product_data['title']
+    variants = product_data['variants']
+
+    with transaction.atomic():
+        product_obj, created = Product.objects.update_or_create(
+            source_url=product_url,
+            defaults={
+                'title': title,
+                'description': product_data['description'],
+                'price': product_data['price'],  # Always store the extracted price
+                'allow_update': False
+            }
+        )
+        if created:
+            logger.info(f"Product created: {product_obj.title} (ID: {product_obj.id})")
+        else:
+            logger.info(f"Product updated: {product_obj.title} (ID: {product_obj.id})")
+
+        # Images: the main image, every variant image and the rest of the gallery, one row per URL
+        image_alt_texts = {}
+        main_image_url = product_data.get('main_image_url')
+        if main_image_url:
+            image_alt_texts[main_image_url] = title
+        else:
+            logger.info(f"No valid main image URL found for product: {product_obj.title}")
+        for variant in variants:
+            if variant.get('image_url'):
+                label = " / ".join(value for _, value in variant['options'])
+                image_alt_texts.setdefault(variant['image_url'], f"{title} - {label}")
+        for image_url in product_data.get('images') or []:
+            if image_url:
+                image_alt_texts.setdefault(image_url, title)
+        image_ids = _resolve_images(product_obj, image_alt_texts)
+
+        # Option categories and values
+        option_value_ids = _resolve_option_values({option for variant in variants for option in variant['options']})
+
+        # Variants: reconcile against the existing rows and apply only the diff
+        variant_ids = _reconcile_variants(product_obj, variants)
+
+        desired_options = {
+            (variant_ids[index], option_value_ids[option])
+            for index, variant in enumerate(variants)
+            for option in variant['options']
+        }
+        desired_images = {
+            (variant_ids[index], image_ids[variant['image_url']])
+            for index, variant in enumerate(variants)
+            if variant.get('image_url')
+        }
+        _sync_through(Variant.options.through, 'optionvalue_id', product_obj, desired_options)
+        _sync_through(Variant.images.through, 'image_id', product_obj, desired_images)
+
+    logger.info(f"Product processing completed: {product_url} ({len(variants)} variants, {len(image_ids)} images)")
+    return product_obj
+
+
+def _resolve_images(product_obj, image_alt_texts):
+    """
+    Return {url: image id} for the product's images, bulk-creating the missing ones.
+    """
+    if not image_alt_texts:
+        return {}
+
+    image_ids = dict(Image.objects.filter(product=product_obj, url__in=image_alt_texts).values_list('url', 'id'))
+    missing = [url for url in image_alt_texts if url not in image_ids]
+    if missing:
+        Image.objects.bulk_create([Image(product=product_obj, url=url, alt_text=image_alt_texts[url]) for url in missing])
+        image_ids.update(Image.objects.filter(product=product_obj, url__in=missing).values_list('url', 'id'))
+    return image_ids
+
+
+def _resolve_option_values(options):
+    """
+    Return {(category, value): option value id}, bulk-creating missing categories and values.
+    """
+    if not options:
+        return {}
+
+    names = {category for category, _ in options}
+    category_ids = dict(OptionCategory.objects.filter(name__in=names).values_list('name', 'id'))
+    missing_names = names - set(category_ids)
+    if missing_names:
+        OptionCategory.objects.bulk_create([OptionCategory(name=name) for name in missing_names], ignore_conflicts=True)
+        category_ids.update(OptionCategory.objects.filter(name__in=missing_names).values_list('name', 'id'))
+
+    def lookup():
+        rows = OptionValue.objects.filter(
+            category_id__in=[category_ids[name] for name in names],
+            value__in={value for _, value in options}
+        ).values_list('category__name', 'value', 'id')
+        return {(name, value): option_id for name, value, option_id in rows if (name, value) in options}
+
+    option_value_ids = lookup()
+    missing = options - set(option_value_ids)
+    if missing:
+        OptionValue.objects.bulk_create(
+            [OptionValue(category_id=category_ids[name], value=value) for name, value in missing],
+            ignore_conflicts=True
+        )
+        option_value_ids = lookup()
+    return option_value_ids
+
+
+def _reconcile_variants(product_obj, variants):
+    """
+    Match incoming variants to the product's existing rows and apply inserts, updates and deletes.
+
+    A variant is matched by its upstream id when there is one, otherwise by its option signature.
+    Existing rows that match nothing (including duplicates left by older refreshes) are deleted.
+    Incoming variants with the same signature each get their own row.
+    Returns the variant id of each incoming variant, by position.
+    """
+    existing = list(Variant.objects.filter(product=product_obj).order_by('id'))
+    by_external_id = {variant.external_id: variant for variant in existing if variant.external_id is not None}
+    by_signature = {}
+    for variant in existing:
+        by_signature.setdefault(variant.signature, []).append(variant)
+
+    matched = {}
+    used = set()
+    claimed_external_ids = set()
+    to_update = []
+    to_create = []
+    for index, incoming in enumerate(variants):
+        signature = variant_signature(incoming['options'])
+        external_id = incoming.get('id')
+        if external_id in claimed_external_ids:
+            # A repeated upstream id would break the (product, external_id) constraint
+            external_id = None
+        elif external_id is not None:
+            claimed_external_ids.add(external_id)
+
+        row = by_external_id.get(external_id) if external_id is not None else None
+        if row is None or row.id in used:
+            row = next((variant for variant in by_signature.get(signature, []) if variant.id not in used), None)
+
+        if row is None:
+            to_create.append((index, Variant(product=product_obj, price=incoming['price'], external_id=external_id, signature=signature)))
+            continue
+
+        used.add(row.id)
+        matched[index] = row.id
+        if (row.price, row.signature) != (incoming['price'], signature) or (external_id is not None and row.external_id != external_id):
+            row.price = incoming['price']
+            row.signature = signature
+            if external_id is not None:
+                row.external_id = external_id
+            to_update.append(row)
+
+    to_delete = [variant.id for variant in existing if variant.id not in used]
+    if to_delete:
+        Variant.objects.filter(id__in=to_delete).delete()
+    if to_update:
+        Variant.objects.bulk_update(to_update, ['price', 'signature', 'external_id'])
+    if to_create:
+        # PostgreSQL returns the new primary keys, so each row maps back to its incoming position
+        Variant.objects.bulk_create([variant for _, variant in to_create])
+        for index, variant in to_create:
+            matched[index] = variant.id
+
+    logger.info(f"Variants reconciled for {product_obj.title}: {len(to_create)} inserted, {len(to_update)} updated, {len(to_delete)} deleted")
+    return matched
+
+
+def _sync_through(through, target_field, product_obj, desired):
+    """
+    Make the (variant_id, target_id) rows of a Variant M2M through table for this product equal `desired`.
+    """
+    existing = {
+        (variant_id, target_id): row_id
+        for row_id, variant_id, target_id in through.objects.filter(variant__product=product_obj).values_list('id', 'variant_id', target_field)
+    }
+    stale = [row_id for pair, row_id in existing.items() if pair not in desired]
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    missing = desired - set(existing)
+    if missing:
+        through.objects.bulk_create(
+            [through(**{'variant_id': variant_id, target_field: target_id}) for variant_id, target_id in missing],
+            ignore_conflicts=True
+        )
+
+
+def ingest_collection_links(collection_url, product_urls, batch_size=1000):
+    """
+    Store the products discovered in a collection and their membership with a few set-based statements.
+
+    In one transaction: the collection is upserted, new products are inserted with a single
+    INSERT ... ON CONFLICT DO NOTHING per batch, and the Product.collections through rows are
+    bulk-inserted with conflicts ignored. Existing products are left untouched: their scraped
+    title and description must not be replaced by the placeholders.
+
+    Returns {'products': <number of unique product URLs>, 'created': <number of new products>}.
+    """
+    product_urls = list(dict.fromkeys(product_urls))  # Deduplicate, keeping discovery order
+
+    with transaction.atomic():
+        collection_obj, _ = Collection.objects.update_or_create(
+            source_url=collection_url,
+            defaults={'title': collection_url.split('/')[-1].replace('-', ' ').title()}
+        )
+
+        if not product_urls:
+            return {'products': 0, 'created': 0}
+
+        existing = set(Product.objects.filter(source_url__in=product_urls).values_list('source_url', flat=True))
+
+        Product.objects.bulk_create(
+            [
+                Product(
+                    source_url=product_url,
+                    title=product_url.split('/')[-1].replace('-', ' ').title(),
+                    description='Auto-generated description'
+                )
+                for product_url in product_urls
+                if product_url not in existing
+            ],
+            ignore_conflicts=True,  # Created by a concurrent ingest meanwhile
+            batch_size=batch_size
+        )
+
+        product_ids = Product.objects.filter(source_url__in=product_urls).values_list('id', flat=True)
+        Membership = Product.collections.through
+        Membership.objects.bulk_create(
+            [Membership(product_id=product_id, collection_id=collection_obj.id) for product_id in product_ids],
+            ignore_conflicts=True,
+            batch_size=batch_size
+        )
+
+    created = len(product_urls) - len(existing)
+    logger.info(f"Ingested {len(product_urls)} products ({created} new) into collection: {collection_obj.title}")
+    return {'products': len(product_urls), 'created': created}
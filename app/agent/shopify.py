@@ -0,0 +1,314 @@
+import json
+import logging
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+
+from .fetch import fetch
+from .metrics import stage
+from .parsers import get_parser
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Shopify exposes a single "Title" option with a "Default Title" value for products without options
+DEFAULT_VARIANT_TITLE = 'Default Title'
+
+# Largest page size the products.json endpoint accepts
+PRODUCTS_JSON_PAGE_LIMIT = 250
+
+
+class MissingPriceError(ValueError):
+    """
+    Raised when a product or variant price cannot be read. The product is then not saved at all,
+    rather than with a placeholder price that would overwrite the real one.
+    """
+
+
+def absolute_url(url):
+    """
+    Shopify serves protocol-relative CDN URLs (//cdn.shopify.com/...); make them absolute.
+    """
+    if not url:
+        return None
+    if url.startswith('//'):
+        return 'https:' + url
+    return url
+
+
+def parse_price(value):
+    """
+    Convert a Shopify price to a Decimal.
+
+    Product JSON (`data-product`, `/products/<handle>.js`) uses integer cents,
+    while `products.json` uses decimal strings such as "12.95".
+    """
+    if value is None:
+        return None
+    if isinstance(value, str) and '.' in value:
+        return Decimal(value).quantize(Decimal('0.01'))
+    return (Decimal(value) / 100).quantize(Decimal('0.01'))
+
+
+def product_json_url(product_url):
+    """
+    Return the `/products/<handle>.js` endpoint for a product page URL.
+    """
+    return product_url.split('?')[0].split('#')[0].rstrip('/') + '.js'
+
+
+def load_product_json(raw):
+    """
+    Decode the product JSON the theme embeds in the `data-product` attribute of `div.product_form`.
+    """
+    if not raw:
+        return None
+
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.warning(f"Could not decode data-product JSON: {str(e)}")
+        return None
+
+
+def fetch_product_json(product_url):
+    """
+    Fetch the product JSON from the store's `/products/<handle>.js` endpoint.
+    """
+    url = product_json_url(product_url)
+    response = fetch(url)
+    if response.status_code != 200:
+        logger.warning(f"Failed to fetch {url} with status code: {response.status_code}")
+        return None
+
+    try:
+        return response.json()
+    except ValueError as e:
+        logger.warning(f"Could not decode product JSON from {url}: {str(e)}")
+        return None
+
+
+def _option_names(product_json):
+    names = []
+    for option in product_json.get('options') or []:
+        names.append(option.get('name') if isinstance(option, dict) else option)
+    return names
+
+
+def _variant_image_url(variant):
+    featured_image = variant.get('featured_image')
+    if isinstance(featured_image, dict):
+        return absolute_url(featured_image.get('src'))
+    return absolute_url(featured_image)
+
+
+def build_product_data(product_url, product_json):
+    """
+    Turn Shopify product JSON into the product data consumed by `save_product_data`.
+    """
+    title = product_json.get('title') or 'Title not found'
+
+    description_html = product_json.get('description') or product_json.get('body_html') or ''
+    description = BeautifulSoup(description_html, 'html.parser').get_text(separator='\n', strip=True)
+
+    images = [absolute_url(image.get('src') if isinstance(image, dict) else image) for image in product_json.get('images') or []]
+    featured_image = product_json.get('featured_image')
+    if isinstance(featured_image, dict):
+        featured_image = featured_image.get('src')
+    main_image_url = absolute_url(featured_image) or (images[0] if images else None)
+
+    option_names = _option_names(product_json)
+    variants = []
+    for variant in product_json.get('variants') or []:
+        values = variant.get('options') or [variant.get(f'option{i}') for i in range(1, len(option_names) + 1)]
+        options = [(name, value) for name, value in zip(option_names, values) if value]
+
+        # Products without options only have Shopify's placeholder variant
+        if [value for _, value in options] == [DEFAULT_VARIANT_TITLE]:
+            continue
+
+        variant_price = parse_price(variant.get('price'))
+        if variant_price is None:
+            raise MissingPriceError(f"No price for variant {options} of {product_url}")
+
+        variants.append({
+            'id': variant.get('id'),
+            'options': options,
+            'price': variant_price,
+            'image_url': _variant_image_url(variant),
+        })
+
+    price = parse_price(product_json.get('price'))
+    if price is None and product_json.get('variants'):
+        price = parse_price(product_json['variants'][0].get('price'))
+    if price is None:
+        raise MissingPriceError(f"No price for {product_url}")
+
+    return {
+        'source_url': product_url,
+        'title': title,
+        'description': description or 'Description not found',
+        'price': price,
+        'main_image_url': main_image_url,
+        'images': images,
+        'variants': variants,
+    }
+
+
+def extract_product_from_html(product_url, content):
+    """
+    Extract a product from an already fetched page body using only its embedded product JSON.
+
+    Makes no network requests, so it can re-parse archived pages. Returns None when the page has no product JSON.
+    """
+    with stage('parse'):
+        product_json = load_product_json(get_parser().parse(content)['product_json'])
+        if product_json is None:
+            return None
+        return build_product_data(product_url, product_json)
+
+
+def extract_product_from_json(product_url, response=None):
+    """
+    Extract a product over plain HTTP from the embedded product JSON,
+    falling back to the `/products/<handle>.js` endpoint.
+
+    `response` may be an already fetched response for `product_url`.
+    Returns None when neither source has product JSON.
+    """
+    if response is None:
+        response = fetch(product_url)
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch {product_url} with status code: {response.status_code}")
+        return None
+
+    product_data = extract_product_from_html(product_url, response.content)
+    if product_data is not None:
+        return product_data
+
+    logger.info(f"No data-product JSON on {product_url}, trying {product_json_url(product_url)}")
+    product_json = fetch_product_json(product_url)
+    if product_json is None:
+        return None
+
+    return build_product_data(product_url, product_json)
+
+
+def collection_handle(collection_url):
+    """
+    Return the collection handle from a URL such as https://store/collections/<handle>/...
+    """
+    parts = [part for part in urlsplit(collection_url).path.split('/') if part]
+    if 'collections' not in parts or parts.index('collections') + 1 >= len(parts):
+        return None
+    return parts[parts.index('collections') + 1]
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_collection_product_links_json(collection_url, limit=PRODUCTS_JSON_PAGE_LIMIT):
+    """
+    Page through `/collections/<handle>/products.json` and return the product URLs in collection order.
+
+    Stops on the first page that returns fewer than `limit` products, so the last page is
+    detected without relying on lazy loading. Raises on a failed page instead of returning
+    a truncated list.
+    """
+    handle = collection_handle(collection_url)
+    if handle is None:
+        raise ValueError(f"Not a collection URL: {collection_url}")
+
+    origin = _origin(collection_url)
+    endpoint = f"{origin}/collections/{handle}/products.json"
+
+    product_links = []
+    seen = set()
+    page = 1
+    while True:
+        response = fetch(endpoint, params={'page': page, 'limit': limit})
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch {endpoint}?page={page} with status code: {response.status_code}")
+
+        products = response.json().get('products', [])
+        for product in products:
+            link = f"{origin}/products/{product['handle']}"
+            if link not in seen:
+                seen.add(link)
+                product_links.append(link)
+
+        logger.info(f"Page {page} of {endpoint}: {len(products)} products")
+        if len(products) < limit:
+            break
+        page += 1
+
+    logger.info(f"Found {len(product_links)} product links in {collection_url} over {page} page(s)")
+    return product_links
+
+
+def parse_collection_links(content, origin):
+    """
+    Return the set of collection links (`/collections/...`) on a page, made absolute against `origin`.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    links = {a['href'] for a in soup.find_all('a', href=True) if '/collections/' in a['href']}
+    return {link if link.startswith("http") else origin + link for link in links}
+
+
+def parse_collection_product_links(content, origin):
+    """
+    Return the product URLs linked from a collection grid page, in page order and without duplicates.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    product_links = []
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        if '/products/' not in href:
+            continue
+        # Collection-scoped product links (/collections/<handle>/products/<x>) point to the same product
+        product_links.append(origin + '/products/' + href.split('/products/')[1].split('?')[0].split('#')[0])
+    return list(dict.fromkeys(product_links))
+
+
+def get_collection_product_links_html(collection_url, max_pages=500):
+    """
+    Page through the collection grid (`?page=N`) and return the product URLs in collection order.
+
+    Used for stores that disable products.json; stops on the first page that adds no new products.
+    """
+    origin = _origin(collection_url)
+    base = collection_url.split('?')[0].split('#')[0]
+
+    product_links = []
+    seen = set()
+    for page in range(1, max_pages + 1):
+        response = fetch(base, params={'page': page})
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch {base}?page={page} with status code: {response.status_code}")
+
+        new_links = 0
+        for link in parse_collection_product_links(response.content, origin):
+            if link not in seen:
+                seen.add(link)
+                product_links.append(link)
+                new_links += 1
+
+        if new_links == 0:
+            break
+
+    logger.info(f"Found {len(product_links)} product links in {collection_url} over {page} page(s)")
+    return product_links
+
+
+def get_collection_product_links(collection_url):
+    """
+    Discover a collection's products over plain HTTP: products.json first, the paginated grid if it is unavailable.
+    """
+    try:
+        return get_collection_product_links_json(collection_url)
+    except (RuntimeError, ValueError) as e:
+        logger.warning(f"products.json discovery failed for {collection_url} ({str(e)}), paging the HTML grid instead")
+        return get_collection_product_links_html(collection_url)
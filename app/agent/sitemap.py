@@ -0,0 +1,103 @@
+import io
+import logging
+import xml.etree.ElementTree as ET
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .fetch import fetch
+from .models import PageCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def parse_lastmod(value):
+    """
+    Parse a sitemap <lastmod> (W3C datetime or plain date) into an aware datetime.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def iter_sitemap_entries(content):
+    """
+    Yield (loc, lastmod) for every <url> or <sitemap> entry, clearing parsed elements as it goes
+    so large sitemaps are walked in constant memory.
+    """
+    loc = None
+    lastmod = None
+    for event, element in ET.iterparse(io.BytesIO(content), events=('end',)):
+        if element.tag == f'{SITEMAP_NS}loc':
+            loc = (element.text or '').strip()
+        elif element.tag == f'{SITEMAP_NS}lastmod':
+            lastmod = parse_lastmod(element.text)
+        elif element.tag in (f'{SITEMAP_NS}url', f'{SITEMAP_NS}sitemap'):
+            if loc:
+                yield loc, lastmod
+            loc = None
+            lastmod = None
+            element.clear()
+
+
+def fetch_sitemap_entries(url):
+    """
+    Fetch a sitemap (or sitemap index) and yield its (loc, lastmod) entries.
+    """
+    response = fetch(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch {url} with status code: {response.status_code}")
+    yield from iter_sitemap_entries(response.content)
+
+
+def child_sitemaps(base_url, kind):
+    """
+    Return the child sitemap URLs of a given kind ('products', 'collections', ...) from the store's sitemap index.
+    """
+    return [loc for loc, _ in fetch_sitemap_entries(f"{base_url}/sitemap.xml") if f'sitemap_{kind}_' in loc]
+
+
+def iter_changed_entries(sitemap_urls, batch_size=1000):
+    """
+    Stream the entries of the given sitemaps and yield (loc, lastmod) for those that are new
+    or whose lastmod is later than the stored watermark.
+
+    Watermarks are looked up in batches of `batch_size` URLs.
+    """
+    def changed(batch):
+        watermarks = dict(PageCache.objects.filter(url__in=[loc for loc, _ in batch]).values_list('url', 'sitemap_lastmod'))
+        for loc, lastmod in batch:
+            watermark = watermarks.get(loc)
+            if watermark is None or lastmod is None or lastmod > watermark:
+                yield loc, lastmod
+
+    for sitemap_url in sitemap_urls:
+        logger.info(f"Reading sitemap: {sitemap_url}")
+        batch = []
+        for entry in fetch_sitemap_entries(sitemap_url):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield from changed(batch)
+                batch = []
+        if batch:
+            yield from changed(batch)
+
+
+def record_sitemap_lastmod(url, lastmod):
+    """
+    Advance the lastmod watermark of a URL once its page has been processed.
+    """
+    if lastmod is None:
+        return
+    PageCache.objects.update_or_create(url=url, defaults={'sitemap_lastmod': lastmod})
@@ -0,0 +1,446 @@
+import base64
+import hashlib
+import html
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import format_datetime
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BRANDS = ['Schwarzkopf', 'De Lorenzo', 'Wella', 'Pure', 'Juuce', 'Kevin Murphy', 'Redken', 'Matrix', 'Affinage', 'Goldwell', 'Olaplex', 'Moroccanoil']
+LINES = ['Repair Shampoo', 'Hydrate Conditioner', 'Colour Care Mask', 'Blonde Toner', 'Styling Cream', 'Heat Protect Spray', 'Permanent Colour', 'Developer', 'Dry Shampoo', 'Hair Oil']
+SIZES = ['100ml', '250ml', '1L', '4L']
+COLOURS = ['Clear', 'Ice', 'Rose', 'Copper']
+SHADES = [f'{level}.{tone}' for level in range(4, 10) for tone in (0, 1)]
+
+# Shopify theme defaults: grid page size, products.json page size limit and URLs per child sitemap
+GRID_PAGE_SIZE = 24
+PRODUCTS_JSON_MAX_LIMIT = 250
+SITEMAP_PAGE_SIZE = 5000
+
+CATALOG_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# 1x1 transparent GIF served for every CDN image URL
+PIXEL_GIF = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+# Makes the product page behave like the theme in Chrome: changing a select updates the price
+VARIANT_SCRIPT = """<script>
+(function () {
+  var form = document.querySelector('.product_form');
+  var product = JSON.parse(form.getAttribute('data-product'));
+  var selects = document.querySelectorAll('select.single-option-selector');
+  function update() {
+    var values = Array.prototype.map.call(selects, function (s) { return s.value; });
+    var variant = product.variants.find(function (v) { return v.options.join('/') === values.join('/'); });
+    if (!variant) return;
+    document.querySelector('p.modal_price .current_price .money').textContent = '$' + (variant.price / 100).toFixed(2);
+  }
+  Array.prototype.forEach.call(selects, function (s) { s.addEventListener('change', update); });
+})();
+</script>"""
+
+
+def _unit(*parts):
+    """
+    Deterministic pseudo-random number in [0, 1) from the given parts.
+    """
+    digest = hashlib.sha1('/'.join(str(part) for part in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class SyntheticCatalog:
+    """
+    A deterministic Shopify-like catalog of `products` products spread over `collections` collections.
+
+    Nothing is stored: every product is derived from its index and the seed, so 100k products cost no memory.
+    `revision` simulates store edits: at each revision 1..revision a `change_rate` fraction of the products
+    gets a new price and updated_at, which moves their sitemap lastmod and ETag.
+    """
+
+    def __init__(self, products=1000, collections=None, seed=0, revision=0, change_rate=0.05):
+        self.size = products
+        self.collection_count = collections or max(1, min(500, products // 50))
+        self.seed = seed
+        self.revision = revision
+        self.change_rate = change_rate
+
+    # Collections
+
+    def collection_handle(self, index):
+        return f"{BRANDS[index % len(BRANDS)].lower().replace(' ', '-')}-collection-{index}"
+
+    def collection_index(self, handle):
+        try:
+            index = int(handle.rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            return None
+        if 0 <= index < self.collection_count and self.collection_handle(index) == handle:
+            return index
+        return None
+
+    def collection_products(self, index):
+        """
+        Product indexes of a collection: every product whose index is congruent to the collection index.
+        """
+        return range(index, self.size, self.collection_count)
+
+    # Products
+
+    def product_handle(self, index):
+        brand = BRANDS[index % len(BRANDS)]
+        line = LINES[(index // len(BRANDS)) % len(LINES)]
+        return f"{brand} {line} {index}".lower().replace(' ', '-')
+
+    def product_index(self, handle):
+        try:
+            index = int(handle.rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            return None
+        if 0 <= index < self.size and self.product_handle(index) == handle:
+            return index
+        return None
+
+    def product_version(self, index):
+        """
+        The last revision at which the product changed (0 if it never did).
+        """
+        for revision in range(self.revision, 0, -1):
+            if _unit(self.seed, 'change', index, revision) < self.change_rate:
+                return revision
+        return 0
+
+    def product_updated_at(self, index):
+        version = self.product_version(index)
+        return CATALOG_EPOCH + timedelta(minutes=index % 10000, days=version)
+
+    def product(self, index):
+        """
+        Product JSON in the shape of the theme's `data-product` attribute and `/products/<handle>.js`.
+        """
+        handle = self.product_handle(index)
+        brand = BRANDS[index % len(BRANDS)]
+        title = f"{brand} {LINES[(index // len(BRANDS)) % len(LINES)]} #{index}"
+        version = self.product_version(index)
+        base_price = 995 + int(_unit(self.seed, 'price', index, version) * 80) * 100
+
+        kind = int(_unit(self.seed, 'kind', index) * 4)
+        if kind == 0:
+            options = []
+        elif kind == 1:
+            options = [('Size', SIZES)]
+        elif kind == 2:
+            options = [('Colour', COLOURS), ('Size', SIZES[:3])]
+        else:
+            options = [('Shade', SHADES)]
+
+        combos = [[]]
+        for _, values in options:
+            combos = [combo + [value] for combo in combos for value in values]
+
+        image_base = f"{{origin}}/cdn/shop/files/{handle}"
+        images = [f"{image_base}-{n}.jpg" for n in (1, 2)]
+        colour_images = {}
+        if kind == 2:
+            colour_images = {colour: f"{image_base}-{colour.lower()}.jpg" for colour in COLOURS}
+            images += list(colour_images.values())
+
+        product_id = 7000000000000 + index * 100
+        variants = []
+        for position, combo in enumerate(combos):
+            values = combo or ['Default Title']
+            image = colour_images.get(values[0])
+            variants.append({
+                'id': product_id * 1000 + position,
+                'title': ' / '.join(values),
+                'option1': values[0],
+                'option2': values[1] if len(values) > 1 else None,
+                'option3': None,
+                'sku': f"SKU-{index}-{position}",
+                'available': True,
+                'options': values,
+                'price': base_price + 200 * (position % 3),
+                'featured_image': {'src': image, 'position': position + 1} if image else None,
+            })
+
+        words = ('nourishing lightweight formula restores shine strength softness protects colour '
+                 'salon professional results everyday use').split()
+        paragraphs = ''.join(
+            '<p>' + ' '.join(words[int(_unit(self.seed, 'word', index, p, w) * len(words))] for w in range(30)) + '.</p>'
+            for p in range(3)
+        )
+
+        return {
+            'id': product_id,
+            'title': title,
+            'handle': handle,
+            'description': f"{paragraphs}<h4>Directions</h4><ul><li>Apply to damp hair.</li><li>Rinse thoroughly.</li></ul>",
+            'vendor': brand,
+            'type': 'Hair Care',
+            'tags': [brand, 'Salon'],
+            'published_at': CATALOG_EPOCH.isoformat(),
+            'updated_at': self.product_updated_at(index).isoformat(),
+            'price': variants[0]['price'],
+            'price_min': min(variant['price'] for variant in variants),
+            'price_max': max(variant['price'] for variant in variants),
+            'available': True,
+            'variants': variants,
+            'images': images,
+            'featured_image': images[0],
+            'options': [name for name, _ in options] or ['Title'],
+            'url': f"/products/{handle}",
+        }
+
+
+def _with_origin(value, origin):
+    """
+    Fill the `{origin}` placeholder of the image URLs in a product JSON document.
+    """
+    return json.loads(json.dumps(value).replace('{origin}', origin))
+
+
+class StandinStore:
+    """
+    WSGI app serving a SyntheticCatalog with the URL layout and markup of the live store.
+
+    Serves /, /collections, /collections/<handle> (?page=N grid), /collections/<handle>/products.json,
+    /products/<handle> (with ETag/Last-Modified and 304s), /products/<handle>.js, /sitemap.xml with
+    its child sitemaps, and a 1x1 image for /cdn/ URLs. HEAD requests get the headers without the body.
+
+    Every request except images waits `latency` seconds plus up to `jitter` seconds, and fails with
+    429, 500 or 503 at `error_rate`.
+    """
+
+    def __init__(self, catalog, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(catalog.seed)
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '/')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        host = environ.get('HTTP_HOST') or f"{environ['SERVER_NAME']}:{environ['SERVER_PORT']}"
+        origin = f"{environ.get('wsgi.url_scheme', 'http')}://{host}"
+        head = environ.get('REQUEST_METHOD') == 'HEAD'
+
+        if path.startswith('/cdn/'):
+            return self.respond(start_response, 200, PIXEL_GIF, 'image/gif', {'Cache-Control': 'max-age=31536000'}, head=head)
+
+        with self.lock:
+            delay = self.latency + self.random.random() * self.jitter
+            failure = self.random.random() < self.error_rate
+            status = self.random.choice([429, 500, 503]) if failure else None
+        if delay:
+            time.sleep(delay)
+        if failure:
+            self.count(status)
+            headers = {'Retry-After': '1'} if status in (429, 503) else {}
+            return self.respond(start_response, status, b'Injected error', 'text/plain', headers, head=head)
+
+        try:
+            response = self.route(path, query, origin, environ)
+        except Exception as e:
+            logger.exception(f"Stand-in store failed on {path}: {str(e)}")
+            response = (500, b'Internal error', 'text/plain', {})
+
+        if response is None:
+            response = (404, b'Not found', 'text/plain', {})
+        self.count(response[0])
+        return self.respond(start_response, *response, head=head)
+
+    def count(self, status):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def respond(self, start_response, status, body, content_type, headers=None, head=False):
+        reasons = {200: 'OK', 304: 'Not Modified', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+        header_list = [('Content-Type', content_type), ('Content-Length', str(len(body)))]
+        header_list += list((headers or {}).items())
+        start_response(f"{status} {reasons.get(status, '')}", header_list)
+        return [] if head else [body]
+
+    def route(self, path, query, origin, environ):
+        parts = [part for part in path.split('/') if part]
+        page = int(query.get('page', ['1'])[0] or 1)
+
+        if not parts or parts == ['collections']:
+            return self.html(self.index_page())
+        if parts == ['sitemap.xml']:
+            return self.xml(self.sitemap_index(origin))
+        if len(parts) == 1 and parts[0].startswith('sitemap_'):
+            return self.child_sitemap(parts[0], query, origin)
+
+        if parts[0] == 'collections' and len(parts) >= 2:
+            index = self.catalog.collection_index(parts[1])
+            if index is None:
+                return None
+            if len(parts) == 2:
+                return self.html(self.collection_page(index, page))
+            if parts[2:] == ['products.json']:
+                limit = min(int(query.get('limit', ['30'])[0] or 30), PRODUCTS_JSON_MAX_LIMIT)
+                return self.products_json(index, page, limit, origin)
+            if len(parts) == 4 and parts[2] == 'products':
+                return self.product(parts[3], origin, environ)
+            return None
+
+        if parts[0] == 'products' and len(parts) == 2:
+            if parts[1].endswith('.js'):
+                index = self.catalog.product_index(parts[1][:-3])
+                if index is None:
+                    return None
+                return (200, json.dumps(_with_origin(self.catalog.product(index), origin)).encode('utf-8'), 'application/json', {})
+            return self.product(parts[1], origin, environ)
+        return None
+
+    def html(self, body):
+        return (200, body.encode('utf-8'), 'text/html; charset=utf-8', {})
+
+    def xml(self, body):
+        return (200, body.encode('utf-8'), 'application/xml', {})
+
+    def layout(self, title, main):
+        nav = ''.join(
+            f'<li><a href="/collections/{self.catalog.collection_handle(index)}">Collection {index}</a></li>'
+            for index in range(min(self.catalog.collection_count, 50))
+        )
+        return (
+            f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>'
+            f'<body><header><a href="/">Stand-in store</a><nav><ul>{nav}</ul></nav></header>'
+            f'<main id="MainContent">{main}</main><footer><a href="/pages/contact">Contact</a></footer></body></html>'
+        )
+
+    def index_page(self):
+        links = ''.join(
+            f'<li><a href="/collections/{self.catalog.collection_handle(index)}">Collection {index}</a></li>'
+            for index in range(self.catalog.collection_count)
+        )
+        return self.layout('Collections', f'<h1>Collections</h1><ul class="collection-list">{links}</ul>')
+
+    def collection_page(self, index, page):
+        handle = self.catalog.collection_handle(index)
+        products = self.catalog.collection_products(index)
+        start = (page - 1) * GRID_PAGE_SIZE
+        cards = ''.join(
+            f'<div class="thumbnail"><a href="/collections/{handle}/products/{self.catalog.product_handle(product)}">'
+            f'<div class="image__container"><img src="/cdn/shop/files/{self.catalog.product_handle(product)}-1_300x.jpg"></div>'
+            f'<span class="title">Product {product}</span></a></div>'
+            for product in products[start:start + GRID_PAGE_SIZE]
+        )
+        pagination = f'<a href="/collections/{handle}?page={page + 1}">Next</a>' if start + GRID_PAGE_SIZE < len(products) else ''
+        return self.layout(
+            f'Collection {index}',
+            f'<h1 class="title">Collection {index}</h1><div class="product-list collection-matrix">{cards}</div><div class="paginate">{pagination}</div>'
+        )
+
+    def products_json(self, index, page, limit, origin):
+        products = self.catalog.collection_products(index)
+        start = (page - 1) * limit
+        body = {'products': []}
+        for product in products[start:start + limit]:
+            data = _with_origin(self.catalog.product(product), origin)
+            body['products'].append({
+                'id': data['id'],
+                'title': data['title'],
+                'handle': data['handle'],
+                'body_html': data['description'],
+                'vendor': data['vendor'],
+                'updated_at': data['updated_at'],
+                'variants': [dict(variant, price=f"{variant['price'] / 100:.2f}") for variant in data['variants']],
+                'images': [{'src': src} for src in data['images']],
+                'options': [{'name': name} for name in data['options']],
+            })
+        return (200, json.dumps(body).encode('utf-8'), 'application/json', {})
+
+    def product(self, handle, origin, environ):
+        index = self.catalog.product_index(handle)
+        if index is None:
+            return None
+
+        version = self.catalog.product_version(index)
+        etag = f'W/"{index}-{version}-{self.catalog.seed}"'
+        last_modified = format_datetime(self.catalog.product_updated_at(index), usegmt=True)
+        headers = {'ETag': etag, 'Last-Modified': last_modified}
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            return (304, b'', 'text/html; charset=utf-8', headers)
+
+        data = _with_origin(self.catalog.product(index), origin)
+        gallery = ''.join(
+            f'<div class="image__container"><img src="{src}" data-zoom-src="{src}" data-index="{position}" alt="{html.escape(data["title"])}"></div>'
+            for position, src in enumerate(data['images'])
+        )
+        option_names = [name for name in data['options'] if name != 'Title']
+        selects = ''.join(
+            f'<div class="select-container"><label for="option-{position}">{html.escape(name)}</label>'
+            f'<select class="single-option-selector" id="option-{position}">'
+            + ''.join(
+                f'<option value="{html.escape(value)}">{html.escape(value)}</option>'
+                for value in dict.fromkeys(variant['options'][position] for variant in data['variants'])
+            )
+            + '</select></div>'
+            for position, name in enumerate(option_names)
+        )
+        main = (
+            f'<div class="product__images">{gallery}</div>'
+            f'<h1 class="product_name title">{html.escape(data["title"])}</h1>'
+            f'<p class="modal_price subtitle"><span class="current_price"><span class="money">${data["price"] / 100:.2f}</span></span></p>'
+            f'<div class="product_form" data-product="{html.escape(json.dumps(data))}"><form action="/cart/add">{selects}</form></div>'
+            f'<div class="description content bottom has-padding-top">{data["description"]}</div>'
+            f'{VARIANT_SCRIPT}'
+        )
+        status, body, content_type, _ = self.html(self.layout(data['title'], main))
+        return (status, body, content_type, headers)
+
+    def sitemap_index(self, origin):
+        entries = [f"{origin}/sitemap_collections_1.xml"]
+        for start in range(0, self.catalog.size, SITEMAP_PAGE_SIZE):
+            end = min(start + SITEMAP_PAGE_SIZE, self.catalog.size) - 1
+            entries.append(f"{origin}/sitemap_products_{start // SITEMAP_PAGE_SIZE + 1}.xml?from={start}&amp;to={end}")
+        body = ''.join(f'<sitemap><loc>{loc}</loc></sitemap>' for loc in entries)
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{body}</sitemapindex>'
+
+    def child_sitemap(self, name, query, origin):
+        if name == 'sitemap_collections_1.xml':
+            body = ''.join(
+                f'<url><loc>{origin}/collections/{self.catalog.collection_handle(index)}</loc>'
+                f'<lastmod>{CATALOG_EPOCH.isoformat()}</lastmod></url>'
+                for index in range(self.catalog.collection_count)
+            )
+        elif name.startswith('sitemap_products_'):
+            start = int(query.get('from', ['0'])[0])
+            end = min(int(query.get('to', [str(self.catalog.size - 1)])[0]), self.catalog.size - 1)
+            body = ''.join(
+                f'<url><loc>{origin}/products/{self.catalog.product_handle(index)}</loc>'
+                f'<lastmod>{self.catalog.product_updated_at(index).isoformat()}</lastmod></url>'
+                for index in range(start, end + 1)
+            )
+        else:
+            return None
+        return self.xml(f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{body}</urlset>')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_standin_server(store, host='127.0.0.1', port=8001, access_log=False):
+    """
+    Return a threaded wsgiref server for a StandinStore; call serve_forever() on it.
+    """
+    handler = WSGIRequestHandler if access_log else QuietRequestHandler
+    return make_server(host, port, store, server_class=ThreadingWSGIServer, handler_class=handler)
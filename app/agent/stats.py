@@ -0,0 +1,98 @@
+import logging
+from django.core.cache import cache
+from django.utils import timezone
+from .models import CrawlRun
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Keep run counters around long enough to compare a few nightly runs
+RUN_COUNTER_TTL = 7 * 24 * 60 * 60
+
+
+def _run_key(run_id, name):
+    return f"run:{run_id}:{name}"
+
+
+def incr_run_counter(run_id, name, amount=1):
+    """
+    Increment a named counter for a crawl run in the shared cache (Redis). No-op without a run id.
+    """
+    if not run_id:
+        return
+    key = _run_key(run_id, name)
+    cache.add(key, 0, RUN_COUNTER_TTL)
+    cache.incr(key, amount)
+
+
+def get_run_counters(run_id, names):
+    """
+    Return {name: value} for the given counters of a crawl run; missing counters are 0.
+    """
+    values = cache.get_many([_run_key(run_id, name) for name in names])
+    return {name: values.get(_run_key(run_id, name), 0) for name in names}
+
+
+def start_run(run_id, kind, total, counter_names=()):
+    """
+    Record the start of a crawl run so its progress can be polled, and create its CrawlRun row.
+
+    `counter_names` are the run counters reported by `get_run_progress`.
+    """
+    started_at = timezone.now()
+    cache.set(_run_key(run_id, 'state'), {
+        'run_id': run_id,
+        'kind': kind,
+        'status': 'running',
+        'total': total,
+        'counter_names': list(counter_names),
+        'started_at': started_at.isoformat(),
+        'finished_at': None,
+        'summary': None,
+    }, RUN_COUNTER_TTL)
+    CrawlRun.objects.update_or_create(
+        run_id=run_id,
+        defaults={'kind': kind, 'status': 'running', 'total': total, 'started_at': started_at}
+    )
+
+
+def finish_run(run_id, summary, status='finished'):
+    """
+    Mark a crawl run as finished and store its aggregated summary and per-stage metrics,
+    in the cache for polling and in its CrawlRun row for comparing runs.
+    """
+    from .metrics import get_run_metrics  # agent.metrics builds on the run counters in this module
+
+    finished_at = timezone.now()
+    state = cache.get(_run_key(run_id, 'state')) or {'run_id': run_id}
+    state.update({
+        'status': status,
+        'finished_at': finished_at.isoformat(),
+        'summary': summary,
+    })
+    cache.set(_run_key(run_id, 'state'), state, RUN_COUNTER_TTL)
+
+    CrawlRun.objects.update_or_create(
+        run_id=run_id,
+        defaults={
+            'kind': state.get('kind', ''),
+            'status': status,
+            'total': state.get('total'),
+            'started_at': state.get('started_at') or finished_at,
+            'finished_at': finished_at,
+            'summary': summary,
+            'metrics': get_run_metrics(run_id),
+        }
+    )
+
+
+def get_run_progress(run_id):
+    """
+    Return the stored state of a crawl run together with its counters, or None for an unknown run.
+    """
+    state = cache.get(_run_key(run_id, 'state'))
+    if state is None:
+        return None
+    progress = dict(state)
+    progress['counters'] = get_run_counters(run_id, progress.pop('counter_names', []))
+    return progress
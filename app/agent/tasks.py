@@ -1,313 +1,592 @@
-import requests
-from bs4 import BeautifulSoup
-import time
+import uuid
 import logging
+import random
 from decimal import Decimal
-from celery import shared_task
-from tqdm import tqdm
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from celery import chord, shared_task
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
-from .models import Product, OptionCategory, OptionValue, Variant, Image, Collection
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-
-base_url = "https://hairbeautymart.com.au"
-
-# Path to ChromeDriver
-driver_path = "/usr/local/bin/chromedriver"
+from django.conf import settings
+from django.core.management import call_command
+from .models import Collection
+from .archive import archive_page
+from .browser import get_driver_pool, page_transfer_bytes
+from .dedupe import clear_queued, mark_queued, mark_refreshed, recently_refreshed, url_lease
+from .fetch import fetch, fetch_many
+from .images import mirror_images
+from .metrics import count_queries, incr, stage, track_run
+from .page_cache import conditional_fetch, page_fingerprint, remember_page
+from .persistence import ingest_collection_links, save_product_data
+from .parsers import get_parser
+from .shopify import MissingPriceError, extract_product_from_json, get_collection_product_links, load_product_json, parse_collection_links
+from .sitemap import child_sitemaps, iter_changed_entries, parse_lastmod, record_sitemap_lastmod
+from .stats import finish_run, incr_run_counter, start_run
+from .throttle import CircuitOpenError, navigation_turn, resume_crawl_queues
+from .variant_matrix import enumerate_variants
+from .waits import variant_state, wait_for_more_items, wait_for_page_ready, wait_for_variant_change
+
+base_url = settings.SCRAPE_BASE_URL
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-@shared_task
-def get_or_update_product_info(product_url):
+
+class RenderInBrowser(Exception):
     """
-    Fetch or update the product information for the given product URL.
+    Raised by refresh_product in json mode for a page without product JSON. Only the browser queue's
+    workers render in Chrome, so the refresh is handed over to them with the page's fingerprint.
     """
-    logger.info(f"Fetching or updating product info for: {product_url}")
 
-    # Set up Selenium WebDriver options
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--disable-dev-shm-usage')  # Overcome limited resource problems
-    options.add_argument('--no-sandbox')  # Bypass OS security model
-    options.add_argument('--disable-gpu')  # Applicable to windows OS only
-    options.add_argument('--remote-debugging-port=9222')  # Required for Chrome to work in headless mode
-    options.add_argument('--disable-software-rasterizer')
-    options.add_argument('--disable-extensions')  # Disable extensions that could interfere
-    options.add_argument('--disable-application-cache')  # Avoid caching issues
-    options.add_argument('--start-maximized')  # Start with a maximized window
+    def __init__(self, fingerprint):
+        super().__init__("Page has no product JSON, it must be rendered in Chrome")
+        self.fingerprint = fingerprint
 
-    service = Service(driver_path)
-    driver = webdriver.Chrome(service=service, options=options)
 
-    try:
-        # Open the product page
-        driver.get(product_url)
-        time.sleep(3)  # Adjust based on page load time
+@shared_task(bind=True)
+def get_or_update_product_info(self, product_url, mode=None, force=False, run_id=None, sitemap_lastmod=None, fingerprint=None):
+    """
+    Fetch or update the product information for the given product URL.
 
-        # Parse the HTML using BeautifulSoup
-        response = requests.get(product_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
+    Only one worker processes a URL at a time, and a URL refreshed within PRODUCT_REFRESH_WINDOW
+    is skipped (unless `force`); both return 'skipped'. Queue refreshes with `enqueue_product_refresh`
+    so the queue never holds the same URL twice.
+
+    A refresh refused by the store's open circuit breaker is retried once the breaker may let
+    requests through again, up to PRODUCT_DEFER_MAX_RETRIES times; it then returns 'deferred'.
+
+    :param mode: 'json' parses the product JSON over plain HTTP and only falls back to Selenium
+                 when the page has none; 'selenium' always renders the page in Chrome.
+                 Defaults to settings.PRODUCT_EXTRACTION_MODE.
+    :param force: Process the page even if it is unchanged since the last run.
+    :param run_id: Optional crawl run id that page cache hit/miss counters and stage metrics are recorded under.
+    :param sitemap_lastmod: Sitemap <lastmod> (ISO 8601) this refresh was queued for; stored as the
+                            URL's watermark once the page has been processed.
+    :param fingerprint: Page cache validators and hash of the HTTP response, when a json-mode refresh
+                        of a page without product JSON hands the page over to be rendered.
+
+    A json-mode refresh that needs Chrome replaces itself with a selenium-mode task, which is routed
+    to the browser queue and keeps the task id, so callers waiting on the result get the final status.
+    """
+    mode = mode or settings.PRODUCT_EXTRACTION_MODE
+    logger.info(f"Fetching or updating product info for: {product_url} (mode={mode})")
 
-        # Extract the product title
-        title_tag = soup.find('div', class_='product_form')
-        title = title_tag.get('data-product', '').split('"title":"')[1].split('"')[0] if title_tag else 'Title not found'
-        logger.info(f"Product Title collected: {title}")
+    with track_run(run_id):
+        retrying = False
+        handed_over = False
+        try:
+            if not force and recently_refreshed(product_url):
+                logger.info(f"Skipping recently refreshed product: {product_url}")
+                incr('products_skipped')
+                return 'skipped'
+
+            with url_lease(product_url) as acquired:
+                if not acquired:
+                    incr('products_skipped')
+                    return 'skipped'
+                try:
+                    status = refresh_product(
+                        product_url, mode, force=force, run_id=run_id, sitemap_lastmod=sitemap_lastmod, fingerprint=fingerprint
+                    )
+                except RenderInBrowser as e:
+                    handed_over = True
+                    status = None
+                    fingerprint = e.fingerprint
+                except CircuitOpenError as e:
+                    incr('products_deferred')
+                    if self.request.retries >= settings.PRODUCT_DEFER_MAX_RETRIES:
+                        logger.error(f"Giving up on product {product_url} after {self.request.retries} deferrals: {str(e)}")
+                        return 'deferred'
+                    # Jittered, so the deferred refreshes do not all hit the half-open breaker at once
+                    countdown = e.retry_in + random.uniform(1, 10)
+                    logger.warning(f"Deferring product {product_url} for {countdown:.0f}s: {str(e)}")
+                    retrying = True
+                    raise self.retry(exc=e, countdown=countdown, max_retries=None)
+
+            if handed_over:
+                # Outside the lease, which the rendering task takes in turn
+                logger.info(f"No product JSON found for {product_url}, handing it over to the browser queue")
+                return self.replace(get_or_update_product_info.s(
+                    product_url, mode='selenium', force=True, run_id=run_id, sitemap_lastmod=sitemap_lastmod,
+                    fingerprint=fingerprint,
+                ))
+
+            if status in ('updated', 'unchanged'):
+                mark_refreshed(product_url)
+            return status
+        finally:
+            # A retried or handed over refresh is still queued
+            if not retrying and not handed_over:
+                clear_queued(product_url)
+
+
+def enqueue_product_refresh(product_url, force=False, **kwargs):
+    """
+    Queue get_or_update_product_info for a URL unless it is already queued or was refreshed recently.
 
-        # Extract the product description
-        description_tag = soup.find('div', class_='description content bottom has-padding-top')
-        description = description_tag.get_text(separator='\n', strip=True) if description_tag else 'Description not found'
-        logger.info(f"Product Description collected: {description}")
+    `force` queues a recently refreshed URL anyway (but still never twice). Returns the task's
+    AsyncResult, or None when nothing was queued.
+    """
+    if not force and recently_refreshed(product_url):
+        logger.info(f"Not queueing recently refreshed product: {product_url}")
+        return None
+    if not mark_queued(product_url):
+        logger.info(f"Not queueing product already in the queue: {product_url}")
+        return None
+    try:
+        return get_or_update_product_info.delay(product_url, force=force, **kwargs)
+    except Exception:
+        clear_queued(product_url)
+        raise
 
-        # Extract the main image URL
-        image_tag = soup.find('div', class_='image__container').find('img')
-        main_image_url = 'https:' + image_tag['data-zoom-src'] if image_tag and 'data-zoom-src' in image_tag.attrs else None
-        logger.info(f"Main Product Image URL collected: {main_image_url}")
 
-        # Extract the price from the modal price section
-        logger.info(f"Extracting price for {product_url}...")
+def refresh_product(product_url, mode, force=False, run_id=None, sitemap_lastmod=None, fingerprint=None):
+    """
+    Fetch, extract and save one product page. Returns 'updated', 'unchanged' or 'failed', and raises
+    CircuitOpenError when the store's circuit breaker is open. Nothing is saved when the page could
+    not be fetched or a price could not be read.
 
-        try:
-            price_element = soup.find('p', class_='modal_price subtitle').find('span', class_='current_price').find('span', class_='money')
-            price_str = price_element.text.strip()
-            logger.info(f"Raw price string collected: {price_str}")
+    In json mode a page without product JSON raises RenderInBrowser rather than starting Chrome
+    on an HTTP worker. `fingerprint` is then what the rendering task remembers the page by, so the
+    page cache keeps comparing against the HTTP body json mode fetches.
+    """
+    try:
+        # Each page is retrieved once: over HTTP in json mode, by Chrome in selenium mode.
+        # Selenium mode only sends a HEAD to revalidate, so an unchanged page still costs no render.
+        method = 'GET' if mode == 'json' else 'HEAD'
+        response = None
+        if settings.PAGE_CACHE_ENABLED and not force:
+            response, changed = conditional_fetch(product_url, run_id=run_id, method=method)
+            if not changed:
+                logger.info(f"Skipping unchanged product: {product_url}")
+                record_sitemap_lastmod(product_url, parse_lastmod(sitemap_lastmod))
+                incr('products_unchanged')
+                return 'unchanged'
+        elif mode == 'json':
+            response = fetch(product_url)
+
+        if response is not None and response.status_code not in (200, 304):
+            # Rendering a page the store refused (429/5xx after retries, 404) in Chrome would only add load
+            logger.error(f"Failed to fetch {product_url} with status code: {response.status_code}")
+            incr('products_failed')
+            return 'failed'
+
+        if mode == 'json':
+            document = response.content
+            product_data = extract_product_from_json(product_url, response)
+            if product_data is None:
+                raise RenderInBrowser(page_fingerprint(response))
+        else:
+            product_data, document = extract_product_with_selenium(product_url)
+
+        if settings.PAGE_ARCHIVE_ENABLED and document:
+            try:
+                with stage('archive'):
+                    archive_page(product_url, document)
+            except Exception as e:
+                logger.error(f"Could not archive {product_url}: {str(e)}")
+
+        with stage('db_write'), count_queries():
+            product = save_product_data(product_data)
+
+        if fingerprint:
+            remember_page(product_url, product=product, fingerprint=fingerprint)
+        elif document:
+            validators = response if response is not None and response.status_code == 200 else None
+            remember_page(product_url, validators, content=document, product=product)
+        record_sitemap_lastmod(product_url, parse_lastmod(sitemap_lastmod))
+        incr('products_updated')
+        return 'updated'
+
+    except (CircuitOpenError, RenderInBrowser):
+        raise
 
-            # Clean up the price string (remove currency symbols, commas, etc.)
-            clean_price_str = price_str.replace('$', '').replace(' AUD', '').strip()
-            price = Decimal(clean_price_str)  # Convert to Decimal
-            logger.info(f"Clean price converted: {price}")
+    except Exception as e:
+        logger.error(f"Error processing product {product_url}: {str(e)}")
+        incr('products_failed')
+        return 'failed'
 
-        except Exception as e:
-            logger.error(f"Could not find price for {product_url}. Error: {str(e)}")
-            price = Decimal('0.0')
-
-        # Now, update the product in the database
-        product_obj, created = Product.objects.update_or_create(
-            source_url=product_url,
-            defaults={
-                'title': title,
-                'description': description,
-                'price': price  # Always store the extracted price
-            }
-        )
-        if created:
-            logger.info(f"Product created: {product_obj.title} (ID: {product_obj.id})")
-        else:
-            logger.info(f"Product updated: {product_obj.title} (ID: {product_obj.id})")
-
-        # Create or update the Image for the main product
-        if main_image_url:
-            Image.objects.update_or_create(
-                product=product_obj,
-                url=main_image_url,
-                alt_text=title  # You can adjust alt_text if necessary
-            )
-            logger.info(f"Main image linked to product: {product_obj.title} (URL: {main_image_url})")
-        else:
-            logger.info(f"No valid main image URL found for product: {product_obj.title}")
+
+def extract_product_with_selenium(product_url):
+    """
+    Extract the product by rendering the page in Chrome and selecting every option to read its price and image.
+
+    The static nodes are parsed from the rendered document rather than a second download of the page.
+    Returns (product data, rendered document bytes).
+    """
+    with get_driver_pool().lease() as driver:
+        # Open the product page within the store's shared request rate. A navigation that fails, or
+        # loads a page without a price (an error page), counts against the store's circuit breaker.
+        with navigation_turn(product_url, failures=(WebDriverException, MissingPriceError)):
+            with stage('driver_get'):
+                driver.get(product_url)
+            wait_for_page_ready(driver)
+            incr('pages_rendered')
+            incr('render_bytes', page_transfer_bytes(driver))
+
+            # Parse the static product page nodes from the page Chrome loaded
+            document = driver.page_source.encode('utf-8')
+            with stage('parse'):
+                page = get_parser().parse(document)
+
+            # Extract the product title
+            product_json = load_product_json(page['product_json'])
+            title = product_json.get('title', 'Title not found') if product_json else 'Title not found'
+            logger.info(f"Product Title collected: {title}")
+
+            # Extract the product description
+            description = page['description'] or 'Description not found'
+            logger.info(f"Product Description collected: {description}")
+
+            # Extract the main image URL
+            main_image_url = 'https:' + page['main_image_src'] if page['main_image_src'] else None
+            logger.info(f"Main Product Image URL collected: {main_image_url}")
+
+            # Extract the price from the modal price section
+            logger.info(f"Extracting price for {product_url}...")
+
+            try:
+                price_str = page['price_text']
+                logger.info(f"Raw price string collected: {price_str}")
+
+                # Clean up the price string (remove currency symbols, commas, etc.)
+                clean_price_str = price_str.replace('$', '').replace(' AUD', '').strip()
+                price = Decimal(clean_price_str)  # Convert to Decimal
+                logger.info(f"Clean price converted: {price}")
+
+            except Exception as e:
+                raise MissingPriceError(f"Could not find price for {product_url}: {str(e)}") from e
 
         # Process product options (like Size or Color) and prices
         logger.info(f"Processing options for {product_url}...")
 
-        # Initialize lists to store options, prices, and variant images
-        all_options = {}
-        all_prices = {}
-        all_variant_images = {}
+        variants = None
+        if settings.SELENIUM_VARIANT_MODE == 'batch':
+            variants = enumerate_variants(driver, page['variant_images'])
+        if variants is None:
+            variants = select_each_option(driver, product_url, page)
+
+    return {
+        'source_url': product_url,
+        'title': title,
+        'description': description,
+        'price': price,
+        'main_image_url': main_image_url,
+        'images': [main_image_url] if main_image_url else [],
+        'variants': variants,
+    }, document
+
+
+def select_each_option(driver, product_url, page):
+    """
+    Read variant prices by selecting every option of each select in turn, one WebDriver round-trip at a time.
+
+    Each option becomes its own single-option variant. Used when SELENIUM_VARIANT_MODE is 'per_option',
+    and when the batch matrix has too many combinations or times out.
+    """
+    variants = []
 
-        select_containers = driver.find_elements(By.CLASS_NAME, 'select-container')
+    select_containers = driver.find_elements(By.CLASS_NAME, 'select-container')
 
-        # If select_containers exist, iterate through each one
-        if select_containers:
-            for container in select_containers:
+    # If select_containers exist, iterate through each one
+    for container in select_containers:
+        try:
+            # Find the option category label (e.g., Size, Color) and dropdown
+            label = container.find_element(By.TAG_NAME, 'label').text.strip()
+            select_element = container.find_element(By.CSS_SELECTOR, 'select.single-option-selector')
+            logger.info(f"Option category found: {label}")
+
+            # Create a Select object to interact with the dropdown
+            select = Select(select_element)
+
+            # Loop through each option in the dropdown
+            for index, option in enumerate(select.options):
+                option_text = option.text
+                logger.info(f"Selecting option: {option_text}")
+
+                # Select the option by visible text
+                already_selected = option.is_selected()
+                state = variant_state(driver)
+                with stage('option_select'):
+                    select.select_by_visible_text(option_text)
+                incr('option_clicks')
+
+                # Wait for the price and image to update; re-selecting the current option changes nothing
+                if not already_selected:
+                    wait_for_variant_change(driver, state)
+
+                # Find and clean up the price element
                 try:
-                    # Find the option category label (e.g., Size, Color) and dropdown
-                    label = container.find_element(By.TAG_NAME, 'label').text.strip()
-                    select_element = container.find_element(By.CSS_SELECTOR, 'select.single-option-selector')
-                    logger.info(f"Option category found: {label}")
-
-                    # Create lists to store the options, prices, and images for this label
-                    options_list = []
-                    prices_list = []
-                    images_list = []
-
-                    # Create a Select object to interact with the dropdown
-                    select = Select(select_element)
-
-                    # Loop through each option in the dropdown
-                    for option in select.options:
-                        logger.info(f"Selecting option: {option.text}")
-                        options_list.append(option.text)
-
-                        # Select the option by visible text
-                        select.select_by_visible_text(option.text)
-
-                        # Wait for the price and image to update
-                        time.sleep(2)  # Adjusted to 2 seconds
-
-                        # Find and clean up the price element
-                        try:
-                            price_element = driver.find_element(By.CSS_SELECTOR, 'p.modal_price.subtitle .current_price .money')
-                            price_str = price_element.text.strip()
-                            logger.info(f"Raw price string collected for option {option.text}: {price_str}")
-
-                            # Clean up the price string (remove currency symbols, commas, etc.)
-                            clean_price_str = price_str.replace('$', '').replace(' AUD', '').strip()
-                            price = Decimal(clean_price_str)  # Convert to Decimal
-                            logger.info(f"Clean price for option {option.text}: {price}")
-                            prices_list.append(price)
-
-                        except Exception as e:
-                            logger.error(f"Price element not found for option {option.text}. Error: {e}")
-                            prices_list.append(Decimal('0.0'))
-
-                        # Re-fetch the image URL for the selected variant (if different)
-                        try:
-                            # Retrieve the variant image by the 'data-index' value
-                            data_index = str(select.options.index(option))  # Convert option index to string for matching
-                            variant_image_tag = soup.find('img', {'data-index': data_index})  # Find img tag with matching data-index
-                            variant_image_url = 'https:' + variant_image_tag['data-zoom-src'] if variant_image_tag and 'data-zoom-src' in variant_image_tag.attrs else None
-                            
-                            logger.info(f"Variant Image URL for option {option.text} (data-index={data_index}): {variant_image_url}")
-                            images_list.append(variant_image_url)
-
-                        except Exception as e:
-                            logger.error(f"Could not find image for variant {option.text}. Error: {e}")
-                            images_list.append(variant_image_url)  # Use the current variant image if variant image not found
-
-                    # Store the options, prices, and images in the respective dictionaries
-                    all_options[label] = options_list
-                    all_prices[label] = prices_list
-                    all_variant_images[label] = images_list
+                    price_element = driver.find_element(By.CSS_SELECTOR, 'p.modal_price.subtitle .current_price .money')
+                    price_str = price_element.text.strip()
+                    logger.info(f"Raw price string collected for option {option_text}: {price_str}")
 
+                    # Clean up the price string (remove currency symbols, commas, etc.)
+                    clean_price_str = price_str.replace('$', '').replace(' AUD', '').strip()
+                    option_price = Decimal(clean_price_str)  # Convert to Decimal
+                    logger.info(f"Clean price for option {option_text}: {option_price}")
 
                 except Exception as e:
-                    logger.error(f"Error processing options for {product_url}: {str(e)}")
-
-        # Create variants based on the available options
-        for category, options_list in all_options.items():
-            for i, option_value in enumerate(options_list):
-                # Get or create OptionCategory and OptionValue
-                option_category, _ = OptionCategory.objects.get_or_create(name=category)
-                option_value_obj, _ = OptionValue.objects.get_or_create(category=option_category, value=option_value)
-                logger.info(f"Created or retrieved option: {option_value_obj.value} (Category: {option_category.name})")
-
-                # Create or update the Variant
-                price = all_prices[category][i]
-                variant_obj, created = Variant.objects.update_or_create(
-                    product=product_obj,
-                    price=price
-                )
-                variant_obj.options.add(option_value_obj)
+                    raise MissingPriceError(f"Price element not found for option {option_text}: {str(e)}") from e
+
+                # Retrieve the variant image by the 'data-index' value
+                variant_image_src = page['variant_images'].get(str(index))
+                variant_image_url = 'https:' + variant_image_src if variant_image_src else None
+                logger.info(f"Variant Image URL for option {option_text} (data-index={index}): {variant_image_url}")
+
+                variants.append({
+                    'id': None,
+                    'options': [(label, option_text)],
+                    'price': option_price,
+                    'image_url': variant_image_url,
+                })
+
+        except MissingPriceError:
+            # A product with a variant missing would have that variant deleted; save nothing instead
+            raise
+        except Exception as e:
+            logger.error(f"Error processing options for {product_url}: {str(e)}")
 
-                if created:
-                    logger.info(f"Variant created: {option_value_obj.value} (Price: {price})")
-                else:
-                    logger.info(f"Variant updated: {option_value_obj.value} (Price: {price})")
-
-                # Associate the variant with its image (if any)
-                variant_image_url = all_variant_images[category][i]
-                if variant_image_url:
-                    # Create or update the Image for the variant
-                    variant_image_obj, _ = Image.objects.update_or_create(
-                        product=product_obj,  # Associate with the product
-                        url=variant_image_url,  # URL of the variant image
-                        alt_text=f"{title} - {option_value}"  # Use the variant's option value as alt text
-                    )
+    return variants
+
+@shared_task
+def get_webdriver_pool_stats():
+    """
+    Return the WebDriver pool counters of the worker process that runs this task.
 
-                    # Add the image to the variant's images many-to-many relationship
-                    variant_obj.images.add(variant_image_obj)
-                    logger.info(f"Image {variant_image_url} linked to variant: {variant_obj} for option {option_value}")
-                    logger.info(f"Image details: ID={variant_image_obj.id}, URL={variant_image_obj.url}, Alt Text={variant_image_obj.alt_text}, Product={variant_image_obj.product.title}")
-                    logger.info(f"Image was {'created' if created else 'updated'}")
+    Every prefork child of a browser worker has its own pool, and only one of them picks this task up,
+    so the result covers that one process, not the whole worker or the cluster. The chrome_start and
+    lease_wait stages served at /metrics are published by every process.
+    """
+    return get_driver_pool().stats()
 
-        product_obj.allow_update = False
-        product_obj.save()
-        logger.info(f"Product processing completed: {product_url}")
+# Counters kept for a collection crawl run, see get_run_progress
+COLLECTION_RUN_COUNTERS = ['collections_done', 'collections_failed', 'products_found', 'products_created']
 
-    except Exception as e:
-        logger.error(f"Error processing product {product_url}: {str(e)}")
+# Counters kept for a product refresh run
+PRODUCT_RUN_COUNTERS = ['products_updated', 'products_unchanged', 'products_failed', 'products_skipped', 'products_deferred', 'page_cache_hit', 'page_cache_miss']
 
-    finally:
-        # Close the WebDriver
-        driver.quit()
 
 @shared_task
-def get_collection_links_task(collection_limit=None, product_limit=None):
+def get_collection_links_task(collection_limit=None, product_limit=None, discovery=None, run_id=None):
     """
-    Celery task to fetch and store collection links and their products.
-    This version adds detailed logging and progress tracking using tqdm.
+    Celery task to fetch collection links and fan out one process_collection_task per collection.
+
+    The subtasks run as a chord so collections are crawled in parallel across all workers;
+    summarize_collection_run aggregates their counts. Progress is stored under `run_id`
+    in Redis and can be polled at /agent/runs/<run_id>/.
 
     :param collection_limit: Optional limit for the number of collections to process.
     :param product_limit: Optional limit for the number of products to process per collection.
+    :param discovery: 'json' pages through the collection over plain HTTP, 'selenium' scrolls it in Chrome.
+                      Defaults to settings.COLLECTION_DISCOVERY_MODE.
+    :param run_id: Optional crawl run id; one is generated if not given.
     """
-    logger.info("Starting collection and product parsing task...")
+    discovery = discovery or settings.COLLECTION_DISCOVERY_MODE
+    run_id = run_id or uuid.uuid4().hex
+    logger.info(f"Starting collection and product parsing task (discovery={discovery}, run {run_id})...")
 
-    # Fetch collection links from the main page and the collections page
-    collection_links = get_collection_links(base_url)
-    collection_links.update(get_collection_links(f"{base_url}/collections"))
+    # Fetch collection links from the main page and the collections page concurrently
+    index_urls = [base_url, f"{base_url}/collections"]
+    collection_links = set()
+    for url, response in zip(index_urls, fetch_many(index_urls)):
+        collection_links.update(get_collection_links(url, response))
+
+    collection_links = sorted(collection_links)
 
     # Apply the collection limit if provided
     if collection_limit:
-        collection_links = list(collection_links)[:collection_limit]
+        collection_links = collection_links[:collection_limit]
 
     logger.info(f"Found {len(collection_links)} collections to process.")
+    start_run(run_id, 'collections', len(collection_links), COLLECTION_RUN_COUNTERS)
 
-    # Process each collection link
-    for collection_link in tqdm(collection_links, desc="Processing collections"):
-        logger.info(f"Processing collection: {collection_link}")
-        
-        # Get product links for each collection using Selenium
-        product_links = get_product_links(collection_link)
+    if not collection_links:
+        finish_run(run_id, summarize_collection_results([]))
+        return run_id
 
-        # Apply the product limit if provided
-        if product_limit:
-            product_links = list(product_links)[:product_limit]
-        
-        # Save collection to the database
-        collection_obj, _ = Collection.objects.update_or_create(
-            source_url=collection_link,
-            defaults={'title': collection_link.split('/')[-1].replace('-', ' ').title()}
-        )
-        
-        logger.info(f"Found {len(product_links)} products in collection: {collection_link}")
-        
-        # Store products in the collection
-        for product_link in tqdm(product_links, desc=f"Processing products in {collection_link}"):
-            logger.info(f"Processing product: {product_link}")
-            
-            product_obj, created = Product.objects.update_or_create(
-                source_url=product_link,
-                defaults={
-                    'title': product_link.split('/')[-1].replace('-', ' ').title(),
-                    'description': 'Auto-generated description'
-                }
-            )
-            collection_obj.products.add(product_obj)
-            if created:
-                logger.info(f"Created new product: {product_obj.title}")
-            else:
-                logger.info(f"Updated existing product: {product_obj.title}")
-
-    logger.info("Completed collection and product parsing task.")
-
-
-def get_collection_links(url):
-    logger.info(f"Fetching URL: {url}")
-    response = requests.get(url)
-    time.sleep(2)  # Wait for content to load
+    chord(
+        process_collection_task.s(collection_link, product_limit=product_limit, discovery=discovery, run_id=run_id)
+        for collection_link in collection_links
+    )(summarize_collection_run.s(run_id))
+
+    return run_id
+
+
+@shared_task
+def process_collection_task(collection_link, product_limit=None, discovery=None, run_id=None):
+    """
+    Celery task to discover the products of one collection and store them with their collection membership.
+
+    Errors are caught and reported in the result so one failing collection does not fail the chord.
+    """
+    discovery = discovery or settings.COLLECTION_DISCOVERY_MODE
+    logger.info(f"Processing collection: {collection_link}")
+    result = {'collection': collection_link, 'products': 0, 'created': 0, 'error': None}
+
+    with track_run(run_id):
+        try:
+            # Get product links for the collection
+            product_links = discover_product_links(collection_link, discovery)
+
+            # Apply the product limit if provided
+            if product_limit:
+                product_links = list(product_links)[:product_limit]
+
+            logger.info(f"Found {len(product_links)} products in collection: {collection_link}")
+
+            # Store the collection, its products and their membership in one transaction
+            with stage('db_write'), count_queries():
+                counts = ingest_collection_links(collection_link, product_links)
+            result['products'] = counts['products']
+            result['created'] = counts['created']
+
+        except Exception as e:
+            logger.error(f"Error processing collection {collection_link}: {str(e)}")
+            result['error'] = str(e)
+
+    incr_run_counter(run_id, 'collections_failed' if result['error'] else 'collections_done')
+    incr_run_counter(run_id, 'products_found', result['products'])
+    incr_run_counter(run_id, 'products_created', result['created'])
+    return result
+
+
+def summarize_collection_results(results):
+    failed = [result['collection'] for result in results if result['error']]
+    return {
+        'collections': len(results),
+        'collections_failed': len(failed),
+        'failed_collections': failed,
+        'products': sum(result['products'] for result in results),
+        'products_created': sum(result['created'] for result in results),
+    }
+
+
+@shared_task
+def summarize_collection_run(results, run_id):
+    """
+    Chord callback: aggregate the per-collection results of a crawl run.
+    """
+    summary = summarize_collection_results(results)
+    finish_run(run_id, summary)
+    logger.info(f"Completed collection and product parsing run {run_id}: {summary}")
+    return summary
+
+
+@shared_task
+def resume_crawl_queues_task():
+    """
+    Celery task (io queue) to resume the crawl queues paused when a circuit breaker opened.
+    """
+    return resume_crawl_queues()
+
+
+@shared_task
+def mirror_images_task(limit=None, product_ids=None, retry_failed=False):
+    """
+    Celery task (http queue) to download product images that have no local copy yet, with their thumbnails.
+    """
+    summary = mirror_images(limit=limit, product_ids=product_ids, retry_failed=retry_failed)
+    logger.info(f"Image mirror finished: {summary}")
+    return summary
+
+
+@shared_task
+def sync_to_wix_task(mirrored_images=False):
+    """
+    Celery task (io queue) to sync every Product to its WixProduct rows, as `manage.py sync_to_wix` does.
+    """
+    call_command('sync_to_wix', mirrored_images=mirrored_images)
+
+
+@shared_task
+def export_wix_products_task(input_path=None):
+    """
+    Celery task (io queue) to export all Wix products to CSV, as `manage.py export_wix_products` does.
+    """
+    options = {'input_path': input_path} if input_path else {}
+    call_command('export_wix_products', **options)
+
+
+@shared_task
+def export_collection_wix_products_task():
+    """
+    Celery task (io queue) to export one Wix products CSV per collection, as `manage.py export_collection_wix_products` does.
+    """
+    call_command('export_collection_wix_products')
+
+
+SITEMAP_RUN_COUNTERS = ['sitemap_queued'] + PRODUCT_RUN_COUNTERS
+
+
+@shared_task
+def discover_sitemap_changes_task(product_limit=None, run_id=None):
+    """
+    Celery task to stream the store's sitemaps and queue only new or changed products.
+
+    Entries are compared against the per-URL lastmod watermark; a product's watermark only
+    advances once get_or_update_product_info has processed it, so failed pages are retried.
+    New collections from the collections sitemap are registered as well.
+
+    The discovery is recorded as a 'sitemap' crawl run. Its CrawlRun row is finished once the
+    products are queued; the refreshes it queued keep adding to the run's progress counters.
+
+    :param product_limit: Optional limit for the number of products to queue.
+    :param run_id: Optional crawl run id; one is generated if not given.
+    """
+    run_id = run_id or uuid.uuid4().hex
+    logger.info(f"Starting sitemap discovery (run {run_id})...")
+    # The number of changed entries is only known once the sitemaps have been streamed
+    start_run(run_id, 'sitemap', None, SITEMAP_RUN_COUNTERS)
+
+    status = 'failed'
+    summary = {'run_id': run_id, 'queued': 0, 'collections_registered': 0}
+    try:
+        with track_run(run_id):
+            for collection_url, lastmod in iter_changed_entries(child_sitemaps(base_url, 'collections')):
+                _, created = Collection.objects.get_or_create(
+                    source_url=collection_url,
+                    defaults={'title': collection_url.split('/')[-1].replace('-', ' ').title()}
+                )
+                if created:
+                    summary['collections_registered'] += 1
+                    logger.info(f"Registered new collection: {collection_url}")
+                record_sitemap_lastmod(collection_url, lastmod)
+
+            for product_url, lastmod in iter_changed_entries(child_sitemaps(base_url, 'products')):
+                if product_limit and summary['queued'] >= product_limit:
+                    break
+                task = enqueue_product_refresh(
+                    product_url,
+                    run_id=run_id,
+                    sitemap_lastmod=lastmod.isoformat() if lastmod else None
+                )
+                if task is not None:
+                    summary['queued'] += 1
+        status = 'finished'
+    finally:
+        incr_run_counter(run_id, 'sitemap_queued', summary['queued'])
+        finish_run(run_id, summary, status=status)
+
+    logger.info(f"Sitemap discovery queued {summary['queued']} new or changed products and registered {summary['collections_registered']} new collections (run {run_id})")
+    return summary
+
+
+def get_collection_links(url, response=None):
+    """
+    Return the collection links found on a page. `response` may be a pre-fetched response (or fetch error) for `url`.
+    """
+    if response is None:
+        logger.info(f"Fetching URL: {url}")
+        response = fetch(url)
+
+    if isinstance(response, Exception):
+        logger.error(f"Failed to fetch {url}: {str(response)}")
+        return set()
 
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        # Find all links that match the pattern "/collections/***"
-        links = {a['href'] for a in soup.find_all('a', href=True) if '/collections/' in a['href']}
-        
-        # Ensure all links have the full base URL
-        full_links = {link if link.startswith("http") else base_url + link for link in links}
-        
+        # Find all links that match the pattern "/collections/***", with the full base URL
+        full_links = parse_collection_links(response.content, base_url)
+
         logger.info(f"Found {len(full_links)} collection links on {url}")
         return full_links
     else:
@@ -315,60 +594,60 @@ def get_collection_links(url):
         return set()
 
 
+def discover_product_links(collection_url, discovery):
+    """
+    Return the product links of a collection using the given discovery mode.
+    """
+    if discovery == 'selenium':
+        return get_product_links(collection_url)
+    return get_collection_product_links(collection_url)
+
+
 def get_product_links(collection_url):
     """
     Fetch product links by scrolling the collection page using Selenium.
     """
     logger.info(f"Fetching products from {collection_url} using Selenium with scrolling.")
     
-    # Set up the WebDriver options (headless mode for running in the background)
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')  # Run in headless mode (without opening a window)
-    options.add_argument('--disable-dev-shm-usage')  # Avoid shared memory issues in limited environments
-    options.add_argument('--no-sandbox')
-    
-    # Set up ChromeDriver service
-    service = Service(driver_path)
-    
-    # Initialize the Chrome WebDriver
-    driver = webdriver.Chrome(service=service, options=options)
-    
     product_links = set()
     
     try:
-        # Load the collection page
-        driver.get(collection_url)
-        
-        # Scroll and gather product links
-        last_height = driver.execute_script("return document.body.scrollHeight")
+        with get_driver_pool().lease() as driver:
+            # Load the collection page, within the store's shared request rate
+            with navigation_turn(collection_url, failures=(WebDriverException,)):
+                with stage('driver_get'):
+                    driver.get(collection_url)
+                wait_for_page_ready(driver)
+
+            # Scroll and gather product links
+            last_height = driver.execute_script("return document.body.scrollHeight")
+            last_count = 0
         
-        while True:
-            # Scroll down to the bottom of the page
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            
-            # Wait for new products to load
-            time.sleep(10)
+            while True:
+                # Scroll down to the bottom of the page; each scroll makes the page request more products
+                with navigation_turn(collection_url, failures=(WebDriverException,)):
+                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+                    # Wait for new products to load
+                    wait_for_more_items(driver, "a[href*='/products/']", last_count, last_height)
             
-            # Find all product links
-            elements = driver.find_elements(By.CSS_SELECTOR, "a[href*='/products/']")
-            for element in elements:
-                link = element.get_attribute('href')
-                product_links.add(link)
+                # Find all product links
+                elements = driver.find_elements(By.CSS_SELECTOR, "a[href*='/products/']")
+                last_count = len(elements)
+                for element in elements:
+                    link = element.get_attribute('href')
+                    product_links.add(link)
             
-            # Calculate new scroll height and compare with the last height
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                break  # Exit loop if no more content is loaded
+                # Calculate new scroll height and compare with the last height
+                new_height = driver.execute_script("return document.body.scrollHeight")
+                if new_height == last_height:
+                    break  # Exit loop if no more content is loaded
             
-            last_height = new_height
+                last_height = new_height
         
-        logger.info(f"Found {len(product_links)} product links on {collection_url}")
+            logger.info(f"Found {len(product_links)} product links on {collection_url}")
         
     except Exception as e:
         logger.error(f"Error fetching product links from {collection_url}: {str(e)}")
     
-    finally:
-        # Close the WebDriver
-        driver.quit()
-    
     return product_links
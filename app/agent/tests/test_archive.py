@@ -0,0 +1,40 @@
+import os
+import tempfile
+from django.test import TestCase, override_settings
+from agent.archive import archive_page, read_archived_page
+from agent.models import ArchivedPage
+
+URL = 'https://store.example.com/products/colour-mask'
+PAGE = b'<html><body><h1>Colour Mask</h1></body></html>'
+
+
+class ArchivePageTests(TestCase):
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        self.addCleanup(media_root.cleanup)
+        self.archive_root = archive_root.name
+        self.media_root = media_root.name
+        settings = override_settings(
+            PAGE_ARCHIVE_ROOT=self.archive_root, MEDIA_ROOT=self.media_root, PAGE_ARCHIVE_COMPRESSION='gzip',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_blobs_are_written_outside_the_media_root(self):
+        page = archive_page(URL, PAGE)
+
+        self.assertFalse(os.path.isabs(page.path))
+        self.assertTrue(os.path.isfile(os.path.join(self.archive_root, page.path)))
+        self.assertEqual(os.listdir(self.media_root), [])
+        self.assertEqual(read_archived_page(page.path, page.compression), PAGE)
+
+    def test_unchanged_body_is_stored_once(self):
+        first = archive_page(URL, PAGE)
+        second = archive_page(URL, PAGE)
+
+        self.assertEqual(first.path, second.path)
+        self.assertEqual(ArchivedPage.objects.filter(url=URL).count(), 2)
+        blobs = [name for _, _, names in os.walk(self.archive_root) for name in names]
+        self.assertEqual(blobs, [os.path.basename(first.path)])
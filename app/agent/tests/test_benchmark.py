@@ -0,0 +1,54 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from agent.benchmark import check_expectations, compare_to_baseline, load_benchmark_pages, percentile
+from agent.parsers import PARSER_BACKENDS, SoupParser
+
+METRICS = {'pages': 5, 'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'pages_per_sec': 80.0, 'peak_kb': 500.0}
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_every_backend_matches_the_manifest(self):
+        pages = load_benchmark_pages()
+        self.assertEqual({page['kind'] for page in pages}, {'product', 'collection'})
+        for backend in PARSER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(check_expectations(backend, pages), [])
+
+    def test_wrong_field_values_fail_the_check(self):
+        class SloppyParser(SoupParser):
+            # Right node count, wrong values: prices shifted by one cent, description cut short
+            def parse(self, content):
+                parsed = super().parse(content)
+                if parsed['product_json']:
+                    parsed['product_json'] = parsed['product_json'].replace('95,', '96,')
+                if parsed['description']:
+                    parsed['description'] = parsed['description'][:100]
+                return parsed
+
+        pages = [page for page in load_benchmark_pages() if page['file'] in ('product_sizes.html', 'product_no_json.html')]
+        with mock.patch('agent.benchmark.get_parser', return_value=SloppyParser()):
+            errors = check_expectations('sloppy', pages)
+
+        self.assertEqual(len(errors), 2)
+        self.assertIn('variant_prices', errors[0])
+        self.assertIn('description', errors[1])
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_regressions_beyond_the_tolerance_are_reported(self):
+        results = {'lxml': dict(METRICS, p95_ms=25.0, pages_per_sec=60.0), 'soup': dict(METRICS, p50_ms=11.0)}
+        baseline = {'lxml': METRICS, 'soup': METRICS}
+
+        regressions = compare_to_baseline(results, baseline, tolerance=0.2)
+
+        self.assertEqual(regressions, [
+            'lxml p95_ms: 25.0 vs baseline 20.0',
+            'lxml pages_per_sec: 60.0 vs baseline 80.0',
+        ])
+
+    def test_backends_missing_from_the_baseline_are_skipped(self):
+        self.assertEqual(compare_to_baseline({'lxml': dict(METRICS, p50_ms=99.0)}, {'soup': METRICS}), [])
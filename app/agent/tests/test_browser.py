@@ -0,0 +1,174 @@
+import queue
+import re
+from unittest import mock
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+from selenium.common.exceptions import WebDriverException
+from agent.browser import BLOCKED_RESOURCE_PATTERNS, PooledDriver, WebDriverPool, blocked_url_patterns
+from webapp.celery import app as celery_app
+
+CDN = 'https://store.example.com/cdn/shop/t/12/assets'
+
+
+def is_blocked(url, patterns):
+    """
+    Match a URL against Network.setBlockedURLs patterns, where `*` is the only wildcard.
+    """
+    return any(re.fullmatch('.*'.join(map(re.escape, pattern.split('*'))), url) for pattern in patterns)
+
+
+class BlockedPatternTests(SimpleTestCase):
+    def test_static_resources_are_blocked(self):
+        for url in (
+            f"{CDN}/favicon.ico",
+            f"{CDN}/favicon.ico?v=1739",
+            f"{CDN}/mask.jpg?v=1&width=800",
+            f"{CDN}/theme.woff2",
+            f"{CDN}/styles.css?v=1739",
+        ):
+            with self.subTest(url=url):
+                self.assertTrue(is_blocked(url, BLOCKED_RESOURCE_PATTERNS))
+
+    def test_scripts_with_extension_like_names_are_not_blocked(self):
+        for url in (
+            f"{CDN}/theme.icons.js",
+            f"{CDN}/site.webmanifest",
+            f"{CDN}/jquery.cssvars.js?v=2",
+            f"{CDN}/pngfix.js",
+        ):
+            with self.subTest(url=url):
+                self.assertFalse(is_blocked(url, BLOCKED_RESOURCE_PATTERNS))
+
+    @override_settings(SCRAPE_BASE_URL='https://store.example.com', CHROME_ALLOWED_HOSTS=['www.googletagmanager.com'], CHROME_BLOCKED_URLS=[])
+    def test_allowed_hosts_are_not_blocked(self):
+        patterns = blocked_url_patterns()
+        self.assertFalse(is_blocked('https://www.googletagmanager.com/gtm.js?id=GTM-1', patterns))
+        self.assertTrue(is_blocked('https://connect.facebook.net/en_US/fbevents.js', patterns))
+
+
+class FakeDriver:
+    """
+    Stands in for a Chrome WebDriver; records what the pool does with it.
+    """
+
+    def __init__(self, pid):
+        self.service = mock.Mock()
+        self.service.process.pid = pid
+        self.calls = []
+        self.quit_called = False
+
+    def execute_script(self, script):
+        self.calls.append('clear_storage')
+
+    def delete_all_cookies(self):
+        self.calls.append('delete_all_cookies')
+
+    def get(self, url):
+        self.calls.append(url)
+
+    def quit(self):
+        self.quit_called = True
+
+
+@override_settings(WEBDRIVER_LEASE_TIMEOUT=1)
+@mock.patch('agent.browser.get_chrome_supervisor')
+@mock.patch('agent.browser.Service')
+class WebDriverPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.drivers = []
+        chrome = mock.patch('agent.browser.webdriver.Chrome', side_effect=self.start_driver)
+        chrome.start()
+        self.addCleanup(chrome.stop)
+
+    def start_driver(self, **kwargs):
+        driver = FakeDriver(pid=1000 + len(self.drivers))
+        self.drivers.append(driver)
+        return driver
+
+    def pool(self, **kwargs):
+        return WebDriverPool(**dict({'size': 1, 'max_uses': 50, 'max_rss_mb': 0, 'profile': 'full'}, **kwargs))
+
+    def test_returned_driver_is_reset_and_leased_again(self, *mocks):
+        pool = self.pool()
+
+        with pool.lease() as driver:
+            self.assertEqual(pool.stats()['in_use'], 1)
+        self.assertEqual(driver.calls, ['clear_storage', 'delete_all_cookies', 'about:blank'])
+
+        with pool.lease() as second:
+            self.assertIs(second, driver)
+
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['leases'], stats['resets'], stats['idle'], stats['in_use']), (1, 2, 2, 1, 0))
+
+    def test_driver_is_recycled_after_max_uses(self, Service, get_chrome_supervisor):
+        pool = self.pool(max_uses=2)
+
+        for _ in range(3):
+            with pool.lease():
+                pass
+
+        self.assertEqual(len(self.drivers), 2)
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertFalse(self.drivers[1].quit_called)
+        get_chrome_supervisor.return_value.release.assert_called_once_with(1000)
+        self.assertEqual(pool.stats()['recycled'], 1)
+
+    def test_driver_is_recycled_after_a_webdriver_error(self, *mocks):
+        pool = self.pool()
+
+        with self.assertRaises(WebDriverException):
+            with pool.lease():
+                raise WebDriverException('chrome not reachable')
+
+        self.assertTrue(self.drivers[0].quit_called)
+        self.assertEqual(self.drivers[0].calls, [])
+        with pool.lease() as driver:
+            self.assertIs(driver, self.drivers[1])
+
+    def test_other_errors_keep_the_driver(self, *mocks):
+        pool = self.pool()
+
+        with self.assertRaises(ValueError):
+            with pool.lease():
+                raise ValueError('bad product JSON')
+
+        self.assertFalse(self.drivers[0].quit_called)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_lease_waits_for_a_full_pool(self, *mocks):
+        pool = self.pool()
+
+        with pool.lease():
+            with self.assertRaises(queue.Empty):
+                with pool.lease(timeout=0.01):
+                    pass
+
+        self.assertEqual(len(self.drivers), 1)
+
+    def test_driver_is_recycled_above_the_memory_limit(self, Service, get_chrome_supervisor):
+        pool = self.pool(max_rss_mb=100)
+
+        with mock.patch.object(PooledDriver, 'rss_mb', return_value=150.0):
+            with pool.lease():
+                pass
+
+        self.assertTrue(self.drivers[0].quit_called)
+        get_chrome_supervisor.return_value.release.assert_called_once_with(1000)
+
+    def test_driver_is_recycled_after_max_age(self, *mocks):
+        pool = self.pool(max_age=60)
+
+        with mock.patch.object(PooledDriver, 'age', side_effect=[30.0, 90.0, 90.0]):
+            for _ in range(2):
+                with pool.lease():
+                    pass
+
+        self.assertEqual([driver.quit_called for driver in self.drivers], [True])
+        self.assertEqual(pool.stats()['recycled'], 1)
+
+
+class WorkerRecycleSettingsTests(SimpleTestCase):
+    def test_worker_processes_are_replaced_after_task_and_memory_limits(self):
+        self.assertEqual(celery_app.conf.worker_max_tasks_per_child, settings.CELERY_WORKER_MAX_TASKS_PER_CHILD)
+        self.assertEqual(celery_app.conf.worker_max_memory_per_child, settings.CELERY_WORKER_MAX_MEMORY_PER_CHILD)
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+import psutil
+from django.test import SimpleTestCase
+from agent.chrome_supervisor import ORPHAN_MIN_AGE, ChromeSupervisor
+
+WORKER_PID = 100
+
+
+class FakeProcess:
+    def __init__(self, table, pid, name, create_time):
+        self.table = table
+        self.pid = pid
+        self._name = name
+        self._create_time = create_time
+        self.child_pids = []
+
+    def name(self):
+        return self._name
+
+    def create_time(self):
+        return self._create_time
+
+    def status(self):
+        return psutil.STATUS_RUNNING
+
+    def children(self, recursive=False):
+        return [self.table[pid] for pid in self.child_pids if pid in self.table]
+
+
+class ChromeSupervisorTests(SimpleTestCase):
+    """
+    Runs the supervisor against a fake process table; nothing is ever signalled.
+    """
+
+    def setUp(self):
+        pid_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(pid_dir.cleanup)
+        self.pid_dir = pid_dir.name
+
+        self.table = {}
+        self.add(WORKER_PID, 'celery', create_time=1.0)
+        patcher = mock.patch('agent.chrome_supervisor.psutil.Process', side_effect=self.lookup)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        terminate = mock.patch('agent.chrome_supervisor.terminate', side_effect=len)
+        self.terminate = terminate.start()
+        self.addCleanup(terminate.stop)
+
+        self.supervisor = ChromeSupervisor(pid_dir=self.pid_dir)
+        self.supervisor.pid = WORKER_PID
+
+    def add(self, pid, name, create_time=None, parent=None):
+        # Old enough to count as an orphan unless a create time is given
+        process = FakeProcess(self.table, pid, name, create_time or time.time() - 2 * ORPHAN_MIN_AGE)
+        self.table[pid] = process
+        if parent is not None:
+            self.table[parent].child_pids.append(pid)
+        return process
+
+    def lookup(self, pid):
+        if pid not in self.table:
+            raise psutil.NoSuchProcess(pid)
+        return self.table[pid]
+
+    def reaped(self):
+        return sorted(process.pid for call in self.terminate.call_args_list for process in call.args[0])
+
+    def test_orphans_are_reaped_and_live_browsers_kept(self):
+        self.add(200, 'chromedriver', parent=WORKER_PID)
+        self.add(201, 'chrome', parent=200)
+        self.add(300, 'chromedriver', parent=WORKER_PID)
+        self.add(301, 'chrome', parent=300)
+        self.supervisor.track(200)
+        self.supervisor.track(300)
+        # chromedriver 300 dies; its Chrome is reparented away from the worker
+        del self.table[300]
+        self.table[WORKER_PID].child_pids.remove(300)
+        self.add(400, 'chrome', parent=WORKER_PID)  # A browser that was never tracked
+        self.add(401, 'chrome', create_time=time.time(), parent=WORKER_PID)  # Still starting
+        self.add(402, 'python', parent=WORKER_PID)
+
+        self.assertEqual(self.supervisor.reap(), 2)
+
+        self.assertEqual(self.reaped(), [301, 400])
+        self.assertEqual(self.supervisor.stats(), {'tracked': 2, 'reaped': 2, 'browsers': 1})
+        with open(os.path.join(self.pid_dir, f"{WORKER_PID}.json")) as f:
+            self.assertEqual(list(json.load(f)['browsers']), ['200'])
+
+    def test_released_browser_leftovers_are_killed(self):
+        self.add(200, 'chromedriver', parent=WORKER_PID)
+        self.add(201, 'chrome', parent=200)
+        self.supervisor.track(200)
+        # quit() stopped chromedriver but left a renderer behind
+        del self.table[200]
+
+        self.supervisor.release(200)
+
+        self.assertEqual(self.reaped(), [201])
+        self.assertEqual(self.supervisor.stats()['browsers'], 0)
+
+    def test_browsers_of_dead_workers_are_reaped(self):
+        self.add(601, 'chrome')
+        self.add(700, 'celery', create_time=7.0)
+        self.add(701, 'chrome')
+        records = {
+            500: {'create_time': 5.0, 'browsers': {'600': {'600': 6.0, '601': self.table[601].create_time()}}},
+            700: {'create_time': 7.0, 'browsers': {'701': {'701': self.table[701].create_time()}}},
+        }
+        for worker_pid, data in records.items():
+            with open(os.path.join(self.pid_dir, f"{worker_pid}.json"), 'w') as f:
+                json.dump(data, f)
+
+        self.assertEqual(self.supervisor.reap_dead_workers(), 1)
+
+        self.assertEqual(self.reaped(), [601])
+        self.assertEqual(sorted(os.listdir(self.pid_dir)), ['700.json'])
+
+    def test_reused_pids_are_not_signalled(self):
+        self.add(601, 'chrome', create_time=60.0)
+        with open(os.path.join(self.pid_dir, '500.json'), 'w') as f:
+            json.dump({'create_time': 5.0, 'browsers': {'600': {'601': 6.0}}}, f)
+
+        self.assertEqual(self.supervisor.reap_dead_workers(), 0)
+        self.terminate.assert_not_called()
@@ -0,0 +1,90 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from agent.dedupe import _key, clear_queued, mark_queued, mark_refreshed, recently_refreshed, url_lease
+from agent.tasks import enqueue_product_refresh, get_or_update_product_info
+
+URL = 'https://store.example.com/products/colour-mask'
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dedupe-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PRODUCT_REFRESH_WINDOW=3600)
+class DedupeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_url_is_queued_once(self):
+        self.assertTrue(mark_queued(URL))
+        self.assertFalse(mark_queued(URL))
+        clear_queued(URL)
+        self.assertTrue(mark_queued(URL))
+
+    def test_lease_is_exclusive_and_released(self):
+        with url_lease(URL) as first:
+            with url_lease(URL) as second:
+                self.assertTrue(first)
+                self.assertFalse(second)
+        with url_lease(URL) as again:
+            self.assertTrue(again)
+
+    def test_expired_lease_taken_over_is_not_released(self):
+        with url_lease(URL):
+            # The lease expired and another worker took it
+            cache.set(_key('lock', URL), 'other-worker')
+        self.assertEqual(cache.get(_key('lock', URL)), 'other-worker')
+
+    def test_refresh_window(self):
+        self.assertFalse(recently_refreshed(URL))
+        mark_refreshed(URL)
+        self.assertTrue(recently_refreshed(URL))
+
+    @override_settings(PRODUCT_REFRESH_WINDOW=0)
+    def test_refresh_window_can_be_disabled(self):
+        mark_refreshed(URL)
+        self.assertFalse(recently_refreshed(URL))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PRODUCT_REFRESH_WINDOW=3600)
+@mock.patch('agent.tasks.get_or_update_product_info.delay')
+class EnqueueProductRefreshTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_url_already_queued_is_not_queued_again(self, delay):
+        self.assertIsNotNone(enqueue_product_refresh(URL, run_id='run'))
+        self.assertIsNone(enqueue_product_refresh(URL, run_id='run'))
+        delay.assert_called_once_with(URL, force=False, run_id='run')
+
+    def test_recently_refreshed_url_is_queued_only_when_forced(self, delay):
+        mark_refreshed(URL)
+        self.assertIsNone(enqueue_product_refresh(URL))
+        self.assertIsNotNone(enqueue_product_refresh(URL, force=True))
+
+    def test_failed_publish_clears_the_queued_marker(self, delay):
+        delay.side_effect = ConnectionError('broker unavailable')
+        with self.assertRaises(ConnectionError):
+            enqueue_product_refresh(URL)
+        self.assertTrue(mark_queued(URL))
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PRODUCT_REFRESH_WINDOW=3600)
+@mock.patch('agent.tasks.refresh_product', return_value='updated')
+class RefreshTaskDedupeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_url_leased_by_another_worker_is_skipped(self, refresh_product):
+        mark_queued(URL)
+        with url_lease(URL):
+            result = get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'}).get()
+
+        self.assertEqual(result, 'skipped')
+        refresh_product.assert_not_called()
+        self.assertTrue(mark_queued(URL))
+
+    def test_refreshed_url_is_skipped_until_the_window_passes(self, refresh_product):
+        self.assertEqual(get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'}).get(), 'updated')
+        self.assertEqual(get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'}).get(), 'skipped')
+        self.assertEqual(get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json', 'force': True}).get(), 'updated')
+        self.assertEqual(refresh_product.call_count, 2)
@@ -0,0 +1,73 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from agent.dispatch import RefreshDispatcher
+
+
+class FakeResult:
+    """
+    AsyncResult stand-in that goes through a list of states, one per poll, and stays in the last one.
+    """
+
+    def __init__(self, task_id, states, result=None):
+        self.id = task_id
+        self._states = list(states)
+        self.result = result
+        self.forgotten = False
+
+    @property
+    def state(self):
+        return self._states.pop(0) if len(self._states) > 1 else self._states[0]
+
+    def successful(self):
+        return self._states[0] == 'SUCCESS'
+
+    def forget(self):
+        self.forgotten = True
+
+
+class RefreshDispatcherTests(SimpleTestCase):
+    def dispatch(self, results, **kwargs):
+        dispatcher = RefreshDispatcher(**{'max_in_flight': 2, 'rate': 0, 'task_timeout': 60, 'poll_interval': 0.001, **kwargs})
+        with mock.patch('agent.dispatch.enqueue_product_refresh', side_effect=results) as enqueue:
+            summary = dispatcher.run([f"https://store.example.com/products/{i}" for i in range(len(results))], total=len(results))
+        return dispatcher, summary, enqueue
+
+    def test_counts_statuses_and_not_queued(self):
+        results = [
+            FakeResult('a', ['PENDING', 'SUCCESS'], 'updated'),
+            None,  # Already queued or refreshed recently
+            FakeResult('b', ['STARTED', 'SUCCESS'], 'unchanged'),
+            FakeResult('c', ['FAILURE'], RuntimeError('boom')),
+        ]
+        dispatcher, summary, _ = self.dispatch(results)
+        self.assertEqual(summary, {'updated': 1, 'unchanged': 1, 'error': 1, 'not_queued': 1})
+        self.assertEqual(dispatcher.completed, 3)
+        self.assertTrue(results[0].forgotten)
+
+    def test_window_is_bounded(self):
+        results = [FakeResult(str(i), ['PENDING', 'PENDING', 'SUCCESS'], 'updated') for i in range(5)]
+        dispatcher = RefreshDispatcher(max_in_flight=2, rate=0, task_timeout=60, poll_interval=0.001)
+        peak = []
+        original = dispatcher._collect
+
+        def collect():
+            peak.append(len(dispatcher.in_flight))
+            return original()
+
+        dispatcher._collect = collect
+        with mock.patch('agent.dispatch.enqueue_product_refresh', side_effect=results):
+            summary = dispatcher.run([str(i) for i in range(5)])
+        self.assertEqual(summary, {'updated': 5, 'not_queued': 0})
+        self.assertEqual(max(peak), 2)
+
+    def test_unfinished_task_times_out(self):
+        results = [FakeResult('a', ['PENDING'])]
+        _, summary, _ = self.dispatch(results, task_timeout=0.01, poll_interval=0.02)
+        self.assertEqual(summary, {'timeout': 1, 'not_queued': 0})
+
+    def test_retrying_task_is_not_done_and_does_not_time_out(self):
+        # Deferred by an open circuit breaker for longer than the task timeout, then refreshed
+        results = [FakeResult('a', ['RETRY', 'RETRY', 'RETRY', 'SUCCESS'], 'updated')]
+        dispatcher, summary, _ = self.dispatch(results, task_timeout=0.01, poll_interval=0.02)
+        self.assertEqual(summary, {'updated': 1, 'not_queued': 0})
+        self.assertEqual(dispatcher.completed, 1)
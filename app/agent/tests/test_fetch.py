@@ -0,0 +1,87 @@
+import asyncio
+import time
+import httpx
+from django.test import SimpleTestCase
+from agent.fetch import AsyncFetcher
+
+URL = 'https://store.example.com/products/colour-mask'
+
+
+def fetch_all(fetcher, urls):
+    async def run():
+        try:
+            return [await fetcher.fetch(url) for url in urls]
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+
+class AsyncFetcherTests(SimpleTestCase):
+    def fetcher(self, handler, **kwargs):
+        # backoff_base=0 makes every jittered backoff zero seconds
+        return AsyncFetcher(transport=httpx.MockTransport(handler), **dict({'retries': 3, 'backoff_base': 0, 'rate_per_host': 1000, 'burst': 1000}, **kwargs))
+
+    def test_rate_limited_and_unavailable_responses_are_retried(self):
+        statuses = [429, 503, 200]
+
+        def handler(request):
+            return httpx.Response(statuses.pop(0), text='ok')
+
+        [response] = fetch_all(self.fetcher(handler), [URL])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(statuses, [])
+
+    def test_retries_give_up_after_the_maximum(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(503)
+
+        [response] = fetch_all(self.fetcher(handler, retries=2), [URL])
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(requests), 3)
+
+    def test_transport_errors_are_raised_after_the_maximum(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            raise httpx.ConnectError('connection refused', request=request)
+
+        with self.assertRaises(httpx.ConnectError):
+            fetch_all(self.fetcher(handler, retries=1), [URL])
+        self.assertEqual(len(requests), 2)
+
+    def test_client_errors_are_not_retried(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(404)
+
+        [response] = fetch_all(self.fetcher(handler), [URL])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(requests), 1)
+
+    def test_requests_to_one_host_are_spaced_by_the_bucket_rate(self):
+        sent = []
+
+        def handler(request):
+            sent.append((request.url.host, time.monotonic()))
+            return httpx.Response(200)
+
+        fetcher = self.fetcher(handler, rate_per_host=20, burst=1)
+        fetch_all(fetcher, [URL, 'https://cdn.example.com/mask.jpg', URL, URL])
+
+        store = [at for host, at in sent if host == 'store.example.com']
+        gaps = [later - earlier for earlier, later in zip(store, store[1:])]
+        self.assertEqual(len(gaps), 2)
+        for gap in gaps:
+            self.assertGreaterEqual(gap, 0.045)
+        # The other host has its own bucket and is not held back by the store's
+        cdn_at = next(at for host, at in sent if host == 'cdn.example.com')
+        self.assertLess(cdn_at - store[0], 0.045)
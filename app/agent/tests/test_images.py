@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+import httpx
+from django.test import TestCase, override_settings
+from PIL import Image as PILImage
+from agent.images import mirror_images, store_image
+from agent.models import Image, MirroredImage, Product
+from agent.throttle import CircuitOpenError
+
+CDN = 'https://cdn.example.com/files'
+
+
+def image_bytes(size=(400, 200), color='red', image_format='PNG'):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def response(content, status_code=200):
+    return httpx.Response(status_code, content=content, request=httpx.Request('GET', CDN))
+
+
+class ImageTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root, IMAGE_THUMBNAIL_SIZES=[100], IMAGE_MIRROR_BATCH=2)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class StoreImageTests(ImageTestCase):
+    def test_original_and_thumbnails_are_written(self):
+        mirrored, created = store_image(image_bytes())
+
+        self.assertTrue(created)
+        self.assertEqual((mirrored.format, mirrored.width, mirrored.height), ('PNG', 400, 200))
+        self.assertTrue(mirrored.path.endswith('.png'))
+        with PILImage.open(os.path.join(self.media_root, mirrored.thumbnails['100'])) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (100, 50)))
+
+    def test_same_bytes_are_stored_once(self):
+        content = image_bytes()
+        first, _ = store_image(content)
+
+        with mock.patch('agent.images.PILImage.open') as open_image:
+            second, created = store_image(content)
+
+        self.assertFalse(created)
+        self.assertEqual(first.pk, second.pk)
+        open_image.assert_not_called()
+
+    def test_unreadable_bytes_are_rejected(self):
+        with self.assertRaises(ValueError):
+            store_image(b'<html>Not found</html>')
+        self.assertFalse(MirroredImage.objects.exists())
+
+
+@mock.patch('agent.images.fetch_many')
+class MirrorImagesTests(ImageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mask = Product.objects.create(source_url='https://store.example.com/products/mask', title='Mask', price=Decimal('24.95'))
+        self.shampoo = Product.objects.create(source_url='https://store.example.com/products/shampoo', title='Shampoo', price=Decimal('19.95'))
+
+    def fetched(self, fetch_many):
+        return [url for call in fetch_many.call_args_list for url in call.args[0]]
+
+    def test_each_url_is_downloaded_once_for_every_product(self, fetch_many):
+        Image.objects.create(product=self.mask, url=f"{CDN}/a.png")
+        Image.objects.create(product=self.shampoo, url=f"{CDN}/a.png")
+        Image.objects.create(product=self.shampoo, url=f"{CDN}/b.png")
+        # Different URL, same bytes as a.png
+        fetch_many.side_effect = lambda urls: [response(image_bytes()) for _ in urls]
+
+        summary = mirror_images()
+
+        self.assertEqual(summary, {'mirrored': 1, 'deduplicated': 1, 'reused': 0, 'failed': 0, 'deferred': 0})
+        self.assertEqual(self.fetched(fetch_many), [f"{CDN}/a.png", f"{CDN}/b.png"])
+        self.assertEqual(MirroredImage.objects.count(), 1)
+        self.assertFalse(Image.objects.filter(mirror__isnull=True).exists())
+
+    def test_url_mirrored_for_another_product_is_reused(self, fetch_many):
+        mirrored, _ = store_image(image_bytes())
+        Image.objects.create(product=self.mask, url=f"{CDN}/a.png", mirror=mirrored)
+        image = Image.objects.create(product=self.shampoo, url=f"{CDN}/a.png")
+        fetch_many.return_value = []
+
+        summary = mirror_images()
+
+        self.assertEqual(summary['reused'], 1)
+        self.assertEqual(self.fetched(fetch_many), [])
+        image.refresh_from_db()
+        self.assertEqual(image.mirror_id, mirrored.pk)
+
+    def test_failures_are_recorded_and_skipped_later(self, fetch_many):
+        Image.objects.create(product=self.mask, url=f"{CDN}/gone.png")
+        Image.objects.create(product=self.mask, url=f"{CDN}/page.png")
+        fetch_many.side_effect = lambda urls: [response(b'', 404), response(b'<html></html>')]
+
+        summary = mirror_images()
+
+        self.assertEqual(summary['failed'], 2)
+        self.assertEqual(Image.objects.get(url=f"{CDN}/gone.png").mirror_error, 'HTTP 404')
+        self.assertEqual(mirror_images()['failed'], 0)
+        self.assertEqual(len(self.fetched(fetch_many)), 2)
+
+    def test_urls_refused_by_the_breaker_stay_pending(self, fetch_many):
+        Image.objects.create(product=self.mask, url=f"{CDN}/a.png")
+        fetch_many.return_value = [CircuitOpenError('https://cdn.example.com', 30)]
+
+        summary = mirror_images()
+
+        self.assertEqual(summary['deferred'], 1)
+        self.assertEqual(Image.objects.get(url=f"{CDN}/a.png").mirror_error, '')
+
+    def test_limit_is_applied_across_batches(self, fetch_many):
+        for name in 'abcde':
+            Image.objects.create(product=self.mask, url=f"{CDN}/{name}.png")
+        fetch_many.side_effect = lambda urls: [response(image_bytes()) for _ in urls]
+
+        mirror_images(limit=3)
+
+        self.assertEqual(self.fetched(fetch_many), [f"{CDN}/a.png", f"{CDN}/b.png", f"{CDN}/c.png"])
+        self.assertEqual([len(call.args[0]) for call in fetch_many.call_args_list], [2, 1])
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import httpx
+from django.test import TestCase
+from django.utils import timezone
+from agent.models import PageCache, Product
+from agent.page_cache import conditional_fetch, content_hash, remember_page
+
+URL = 'https://store.example.com/products/colour-mask'
+PAGE = b'<html><body><script nonce="abc">var t = 1;</script><h1>Colour Mask</h1></body></html>'
+
+
+def response(status_code=200, content=PAGE, headers=None):
+    return httpx.Response(status_code, content=content, headers=headers or {}, request=httpx.Request('GET', URL))
+
+
+class ContentHashTests(TestCase):
+    def test_volatile_parts_do_not_change_the_hash(self):
+        other = b'<html><body><script nonce="xyz">var t = 2;</script><h1>Colour \n  Mask</h1></body></html>'
+        self.assertEqual(content_hash(PAGE), content_hash(other))
+
+    def test_content_changes_the_hash(self):
+        self.assertNotEqual(content_hash(PAGE), content_hash(PAGE.replace(b'Colour', b'Color')))
+
+
+@mock.patch('agent.page_cache.fetch')
+class ConditionalFetchTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(source_url=URL, title='Colour Mask', price=Decimal('24.95'))
+
+    def remember(self):
+        remember_page(URL, response(headers={'ETag': '"v1"'}), product=self.product)
+
+    def test_unknown_page_is_changed(self, fetch):
+        fetch.return_value = response()
+        _, changed = conditional_fetch(URL)
+        self.assertTrue(changed)
+        self.assertEqual(fetch.call_args.kwargs['headers'], {})
+
+    def test_not_modified_is_unchanged(self, fetch):
+        self.remember()
+        fetch.return_value = response(304, content=b'')
+        _, changed = conditional_fetch(URL)
+        self.assertFalse(changed)
+        self.assertEqual(fetch.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+    def test_same_content_hash_is_unchanged(self, fetch):
+        self.remember()
+        fetch.return_value = response(content=PAGE.replace(b'abc', b'def'))
+        _, changed = conditional_fetch(URL)
+        self.assertFalse(changed)
+
+    def test_product_written_elsewhere_invalidates_the_entry(self, fetch):
+        self.remember()
+        # e.g. a collection ingest or an admin edit
+        Product.objects.filter(pk=self.product.pk).update(title='Colour Mask 25', updated_at=timezone.now() + timedelta(seconds=1))
+        fetch.return_value = response(304, content=b'')
+
+        _, changed = conditional_fetch(URL)
+
+        self.assertTrue(changed)
+        self.assertEqual(fetch.call_args.kwargs['headers'], {})
+
+    def test_entry_without_product_stamp_is_changed(self, fetch):
+        remember_page(URL, response(headers={'ETag': '"v1"'}))
+        fetch.return_value = response()
+        _, changed = conditional_fetch(URL)
+        self.assertTrue(changed)
+
+    def test_remember_page_stamps_the_product(self, fetch):
+        self.remember()
+        entry = PageCache.objects.get(url=URL)
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual(entry.product_updated_at, self.product.updated_at)
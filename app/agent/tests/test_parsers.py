@@ -0,0 +1,88 @@
+import io
+import json
+import tempfile
+from html import escape
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from agent.archive import archive_page
+from agent.parsers import PARSER_BACKENDS, ProductPageParser, get_parser
+
+PAGE = b'''<html><body>
+<div class="product_form product_form--select" data-product='{"id": 1, "title": "Colour Mask"}'></div>
+<div class="image__container"><img src="thumb.jpg" data-zoom-src="//cdn.example.com/mask.jpg"></div>
+<div class="description content bottom has-padding-top"><p>Rich mask</p><ul><li>200ml</li><li> 1L </li></ul></div>
+<div class="description content">Not the description</div>
+<p class="modal_price subtitle"><span class="current_price"><span class="money"> $24.95 </span></span></p>
+<img data-index="0" data-zoom-src="//cdn.example.com/200ml.jpg">
+<img data-index="0" data-zoom-src="//cdn.example.com/other.jpg">
+<img data-index="1">
+</body></html>'''
+
+EXPECTED = {
+    'product_json': '{"id": 1, "title": "Colour Mask"}',
+    'description': 'Rich mask\n200ml\n1L',
+    'main_image_src': '//cdn.example.com/mask.jpg',
+    'price_text': '$24.95',
+    'variant_images': {'0': '//cdn.example.com/200ml.jpg', '1': None},
+}
+
+
+class ParserTests(SimpleTestCase):
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            ProductPageParser()
+
+    def test_backends_read_the_same_nodes(self):
+        for backend in PARSER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(get_parser(backend).parse(PAGE), EXPECTED)
+
+    def test_missing_nodes_are_none(self):
+        for backend in PARSER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(get_parser(backend).parse(b'<html><body><p>Sold out</p></body></html>'), {
+                    'product_json': None,
+                    'description': None,
+                    'main_image_src': None,
+                    'price_text': None,
+                    'variant_images': {},
+                })
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_parser('html5lib')
+
+
+def product_page(product_json):
+    return f"<html><body><div class='product_form' data-product='{escape(json.dumps(product_json))}'></div></body></html>".encode()
+
+
+class ParserParityCommandTests(TestCase):
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        settings = override_settings(PAGE_ARCHIVE_ROOT=archive_root.name, PAGE_ARCHIVE_COMPRESSION='gzip')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_backends_agree(self):
+        archive_page('https://store.example.com/products/a', product_page({'title': 'A', 'price': 2495, 'variants': []}))
+
+        stdout = io.StringIO()
+        call_command('check_parser_parity', stdout=stdout)
+
+        self.assertIn('All backends agree on 1 pages', stdout.getvalue())
+
+    def test_page_without_a_price_fails_only_that_page(self):
+        archive_page('https://store.example.com/products/a', product_page({'title': 'A', 'price': 2495, 'variants': []}))
+        archive_page('https://store.example.com/products/b', product_page({'title': 'B', 'price': None, 'variants': []}))
+        archive_page('https://store.example.com/products/c', product_page({'title': 'C', 'price': 995, 'variants': []}))
+
+        stdout = io.StringIO()
+        with self.assertLogs('agent.management.commands.check_parser_parity', 'ERROR') as logs:
+            with self.assertRaisesMessage(CommandError, '1 mismatches over 3 pages'):
+                call_command('check_parser_parity', stdout=stdout)
+
+        self.assertIn('ms/page', stdout.getvalue())
+        self.assertTrue(all('/products/b' in line and 'MissingPriceError' in line for line in logs.output))
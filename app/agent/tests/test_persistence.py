@@ -0,0 +1,137 @@
+from decimal import Decimal
+from django.test import TestCase
+from agent.models import Collection, Image, Product, Variant
+from agent.persistence import ingest_collection_links, save_product_data
+
+STORE = 'https://store.example.com'
+URL = f"{STORE}/products/colour-mask"
+
+
+def product_data(*variants):
+    return {
+        'source_url': URL,
+        'title': 'Colour Mask',
+        'description': 'Mask',
+        'price': Decimal('24.95'),
+        'main_image_url': None,
+        'variants': list(variants),
+    }
+
+
+class SaveProductDataTests(TestCase):
+    def test_gallery_images_are_stored(self):
+        data = dict(
+            product_data(variant('200ml', image_url=f"{STORE}/cdn/200ml.jpg")),
+            main_image_url=f"{STORE}/cdn/front.jpg",
+            images=[f"{STORE}/cdn/front.jpg", f"{STORE}/cdn/back.jpg", f"{STORE}/cdn/200ml.jpg"],
+        )
+
+        product = save_product_data(data)
+        save_product_data(data)
+
+        self.assertEqual(
+            sorted(Image.objects.filter(product=product).values_list('url', flat=True)),
+            [f"{STORE}/cdn/200ml.jpg", f"{STORE}/cdn/back.jpg", f"{STORE}/cdn/front.jpg"],
+        )
+        self.assertEqual(Image.objects.get(url=f"{STORE}/cdn/back.jpg").alt_text, 'Colour Mask')
+        self.assertEqual(Image.objects.get(url=f"{STORE}/cdn/200ml.jpg").alt_text, 'Colour Mask - 200ml')
+
+
+def variant(size, price='24.95', external_id=None, image_url=None):
+    data = {'options': [('Size', size)], 'price': Decimal(price), 'image_url': image_url}
+    if external_id is not None:
+        data['id'] = external_id
+    return data
+
+
+class IngestCollectionLinksTests(TestCase):
+    def test_new_products_get_placeholder_fields(self):
+        result = ingest_collection_links(f"{STORE}/collections/hair-care", [
+            f"{STORE}/products/colour-mask",
+            f"{STORE}/products/colour-mask",
+            f"{STORE}/products/shampoo",
+        ])
+
+        self.assertEqual(result, {'products': 2, 'created': 2})
+        product = Product.objects.get(source_url=f"{STORE}/products/colour-mask")
+        self.assertEqual(product.title, 'Colour Mask')
+        self.assertEqual(product.description, 'Auto-generated description')
+        self.assertEqual(list(product.collections.values_list('title', flat=True)), ['Hair Care'])
+
+    def test_existing_products_keep_their_scraped_fields(self):
+        url = f"{STORE}/products/de-lorenzo-colour-care-mask-25"
+        product = Product.objects.create(source_url=url, title='De Lorenzo Colour Care Mask', description='Real description', price=Decimal('24.95'))
+        updated_at = product.updated_at
+
+        result = ingest_collection_links(f"{STORE}/collections/masks", [url, f"{STORE}/products/new-one"])
+
+        self.assertEqual(result, {'products': 2, 'created': 1})
+        product.refresh_from_db()
+        self.assertEqual(product.title, 'De Lorenzo Colour Care Mask')
+        self.assertEqual(product.description, 'Real description')
+        self.assertEqual(product.updated_at, updated_at)
+        self.assertTrue(product.collections.filter(source_url=f"{STORE}/collections/masks").exists())
+
+    def test_membership_is_not_duplicated(self):
+        urls = [f"{STORE}/products/a", f"{STORE}/products/b"]
+        ingest_collection_links(f"{STORE}/collections/all", urls)
+        ingest_collection_links(f"{STORE}/collections/all", urls)
+
+        self.assertEqual(Collection.objects.count(), 1)
+        self.assertEqual(Product.collections.through.objects.count(), 2)
+
+
+class ReconcileVariantsTests(TestCase):
+    def variants(self):
+        return {
+            variant.id: (variant.external_id, variant.price, sorted(variant.options.values_list('value', flat=True)))
+            for variant in Variant.objects.filter(product__source_url=URL)
+        }
+
+    def test_variants_are_matched_by_external_id_first(self):
+        save_product_data(product_data(variant('200ml', external_id=1), variant('1L', external_id=2)))
+        ids = set(self.variants())
+
+        # Upstream renamed the options; the ids still identify the rows
+        save_product_data(product_data(variant('250ml', '26.95', external_id=1), variant('1L', external_id=2)))
+
+        variants = self.variants()
+        self.assertEqual(set(variants), ids)
+        self.assertIn((1, Decimal('26.95'), ['250ml']), variants.values())
+
+    def test_variants_without_external_id_are_matched_by_signature(self):
+        save_product_data(product_data(variant('200ml'), variant('1L')))
+        ids = set(self.variants())
+
+        save_product_data(product_data(variant('1L', '49.95', external_id=7), variant('200ml')))
+
+        variants = self.variants()
+        self.assertEqual(set(variants), ids)
+        self.assertIn((7, Decimal('49.95'), ['1L']), variants.values())
+
+    def test_variants_no_longer_listed_are_deleted(self):
+        save_product_data(product_data(variant('200ml', external_id=1), variant('1L', external_id=2)))
+
+        save_product_data(product_data(variant('200ml', external_id=1)))
+
+        self.assertEqual(list(self.variants().values()), [(1, Decimal('24.95'), ['200ml'])])
+
+    def test_duplicate_signatures_get_their_own_rows(self):
+        save_product_data(product_data(
+            variant('200ml', '24.95', image_url=f"{STORE}/a.jpg"),
+            variant('200ml', '19.95', image_url=f"{STORE}/b.jpg"),
+        ))
+
+        rows = Variant.objects.filter(product__source_url=URL).order_by('price')
+        self.assertEqual([row.price for row in rows], [Decimal('19.95'), Decimal('24.95')])
+        self.assertEqual([list(row.images.values_list('url', flat=True)) for row in rows], [[f"{STORE}/b.jpg"], [f"{STORE}/a.jpg"]])
+
+        # A second refresh keeps both rows
+        ids = set(self.variants())
+        save_product_data(product_data(variant('200ml', '24.95'), variant('200ml', '19.95')))
+        self.assertEqual(set(self.variants()), ids)
+
+    def test_repeated_external_id_does_not_break_the_constraint(self):
+        save_product_data(product_data(variant('200ml', external_id=1), variant('1L', external_id=1)))
+
+        self.assertEqual(sorted(self.variants().values(), key=str), [(1, Decimal('24.95'), ['200ml']), (None, Decimal('24.95'), ['1L'])])
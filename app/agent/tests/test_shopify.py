@@ -0,0 +1,133 @@
+from decimal import Decimal
+from unittest import mock
+import httpx
+from django.test import SimpleTestCase
+from agent.shopify import PRODUCTS_JSON_PAGE_LIMIT, MissingPriceError, build_product_data, get_collection_product_links, parse_price
+
+URL = 'https://store.example.com/products/colour-mask'
+
+
+def product_json(**fields):
+    data = {
+        'id': 1,
+        'title': 'Colour Mask',
+        'description': '<p>Rich mask</p><p>For coloured hair</p>',
+        'price': 2495,
+        'featured_image': '//cdn.shopify.com/s/files/mask.jpg',
+        'images': ['//cdn.shopify.com/s/files/mask.jpg', {'src': '//cdn.shopify.com/s/files/back.jpg'}],
+        'options': [{'name': 'Size'}],
+        'variants': [
+            {'id': 11, 'options': ['200ml'], 'price': 2495, 'featured_image': None},
+            {'id': 12, 'options': ['1L'], 'price': 4995, 'featured_image': {'src': '//cdn.shopify.com/s/files/1l.jpg'}},
+        ],
+    }
+    data.update(fields)
+    return data
+
+
+class ParsePriceTests(SimpleTestCase):
+    def test_integers_are_cents(self):
+        self.assertEqual(parse_price(2495), Decimal('24.95'))
+        self.assertEqual(parse_price(0), Decimal('0.00'))
+
+    def test_strings_without_a_point_are_cents(self):
+        self.assertEqual(parse_price('2495'), Decimal('24.95'))
+
+    def test_strings_with_a_point_are_decimal(self):
+        self.assertEqual(parse_price('24.95'), Decimal('24.95'))
+        self.assertEqual(parse_price('24.9'), Decimal('24.90'))
+
+    def test_missing_price_is_none(self):
+        self.assertIsNone(parse_price(None))
+
+
+class BuildProductDataTests(SimpleTestCase):
+    def test_product_json_is_converted(self):
+        data = build_product_data(URL, product_json())
+
+        self.assertEqual(data['title'], 'Colour Mask')
+        self.assertEqual(data['description'], 'Rich mask\nFor coloured hair')
+        self.assertEqual(data['price'], Decimal('24.95'))
+        self.assertEqual(data['main_image_url'], 'https://cdn.shopify.com/s/files/mask.jpg')
+        self.assertEqual(data['images'], ['https://cdn.shopify.com/s/files/mask.jpg', 'https://cdn.shopify.com/s/files/back.jpg'])
+        self.assertEqual(data['variants'], [
+            {'id': 11, 'options': [('Size', '200ml')], 'price': Decimal('24.95'), 'image_url': None},
+            {'id': 12, 'options': [('Size', '1L')], 'price': Decimal('49.95'), 'image_url': 'https://cdn.shopify.com/s/files/1l.jpg'},
+        ])
+
+    def test_products_json_decimal_prices(self):
+        # products.json: decimal strings and option1..3 instead of an options list
+        data = build_product_data(URL, product_json(
+            price=None,
+            options=['Size'],
+            variants=[{'id': 11, 'option1': '200ml', 'price': '24.95'}],
+        ))
+        self.assertEqual(data['price'], Decimal('24.95'))
+        self.assertEqual(data['variants'][0]['price'], Decimal('24.95'))
+
+    def test_default_title_variant_is_dropped(self):
+        data = build_product_data(URL, product_json(
+            options=[{'name': 'Title'}],
+            variants=[{'id': 11, 'options': ['Default Title'], 'price': 2495}],
+        ))
+        self.assertEqual(data['variants'], [])
+
+    def test_missing_product_price_raises(self):
+        with self.assertRaises(MissingPriceError):
+            build_product_data(URL, product_json(price=None, variants=[]))
+
+    def test_missing_variant_price_raises(self):
+        with self.assertRaises(MissingPriceError):
+            build_product_data(URL, product_json(variants=[{'id': 11, 'options': ['200ml'], 'price': None}]))
+
+
+COLLECTION_URL = 'https://store.example.com/collections/masks'
+
+
+def grid_page(*handles):
+    links = ''.join(f'<a href="/collections/masks/products/{handle}?variant=1">{handle}</a>' for handle in handles)
+    return httpx.Response(200, html=f'<html><body>{links}</body></html>')
+
+
+@mock.patch('agent.shopify.fetch')
+class CollectionProductLinksTests(SimpleTestCase):
+    def test_products_json_stops_on_an_empty_page(self, fetch):
+        # A full first page, so only the empty second page can end the pagination
+        fetch.side_effect = [
+            httpx.Response(200, json={'products': [{'handle': f'product-{i}'} for i in range(PRODUCTS_JSON_PAGE_LIMIT)]}),
+            httpx.Response(200, json={'products': []}),
+        ]
+
+        links = get_collection_product_links(COLLECTION_URL)
+
+        self.assertEqual(len(links), PRODUCTS_JSON_PAGE_LIMIT)
+        self.assertEqual([call.kwargs['params']['page'] for call in fetch.call_args_list], [1, 2])
+
+    def test_products_json_links_are_deduplicated(self, fetch):
+        fetch.side_effect = [httpx.Response(200, json={'products': [{'handle': 'mask'}, {'handle': 'shampoo'}, {'handle': 'mask'}]})]
+
+        links = get_collection_product_links(COLLECTION_URL)
+
+        self.assertEqual(links, ['https://store.example.com/products/mask', 'https://store.example.com/products/shampoo'])
+
+    def test_missing_products_json_falls_back_to_the_grid(self, fetch):
+        fetch.side_effect = [
+            httpx.Response(404),
+            grid_page('mask', 'shampoo', 'mask'),
+            grid_page('shampoo', 'conditioner'),
+            grid_page('conditioner'),
+        ]
+
+        links = get_collection_product_links(COLLECTION_URL)
+
+        self.assertEqual(links, [
+            'https://store.example.com/products/mask',
+            'https://store.example.com/products/shampoo',
+            'https://store.example.com/products/conditioner',
+        ])
+        self.assertEqual([call.args[0] for call in fetch.call_args_list][1:], [COLLECTION_URL] * 3)
+
+    def test_invalid_products_json_falls_back_to_the_grid(self, fetch):
+        fetch.side_effect = [httpx.Response(200, html='<html>Password protected</html>'), grid_page('mask'), grid_page()]
+
+        self.assertEqual(get_collection_product_links(COLLECTION_URL), ['https://store.example.com/products/mask'])
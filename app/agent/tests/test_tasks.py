@@ -0,0 +1,145 @@
+from decimal import Decimal
+from unittest import mock
+import httpx
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from agent.dedupe import _key, mark_queued
+from agent.models import CrawlRun, PageCache, Product
+from agent.page_cache import content_hash
+from agent.stats import get_run_progress
+from agent.tasks import discover_sitemap_changes_task, get_or_update_product_info
+from agent.throttle import CircuitOpenError
+from webapp.celery import BROWSER_QUEUE, HTTP_QUEUE, route_task
+
+URL = 'https://store.example.com/products/colour-mask'
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tasks-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PRODUCT_DEFER_MAX_RETRIES=2)
+class DeferredRefreshTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('agent.tasks.refresh_product')
+    def test_refresh_refused_by_the_breaker_is_retried(self, refresh_product):
+        still_queued = []
+
+        def refuse(*args, **kwargs):
+            still_queued.append(cache.get(_key('queued', URL)) is not None)
+            raise CircuitOpenError('https://store.example.com', 0)
+
+        refresh_product.side_effect = refuse
+        mark_queued(URL)
+
+        get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'})
+
+        # The first attempt and two retries, each still holding the queued marker
+        self.assertEqual(refresh_product.call_count, 3)
+        self.assertEqual(still_queued, [True, True, True])
+        # Given up on after PRODUCT_DEFER_MAX_RETRIES: no longer queued, not marked refreshed
+        self.assertIsNone(cache.get(_key('queued', URL)))
+        self.assertIsNone(cache.get(_key('fresh', URL)))
+
+    @mock.patch('agent.tasks.refresh_product', return_value='updated')
+    def test_refreshed_product_is_marked_and_unqueued(self, refresh_product):
+        mark_queued(URL)
+        result = get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'})
+        self.assertEqual(result.get(), 'updated')
+        self.assertIsNone(cache.get(_key('queued', URL)))
+        self.assertIsNotNone(cache.get(_key('fresh', URL)))
+
+        # Refreshed within PRODUCT_REFRESH_WINDOW
+        self.assertEqual(get_or_update_product_info.apply(args=(URL,)).get(), 'skipped')
+        self.assertEqual(refresh_product.call_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, PAGE_ARCHIVE_ENABLED=False)
+class BrowserHandoverTests(TestCase):
+    HTTP_BODY = b'<html><body><h1>Colour Mask</h1><p>No product JSON here</p></body></html>'
+    RENDERED = b'<html><body><h1>Colour Mask</h1><p class="current_price">$24.95</p></body></html>'
+
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch('agent.tasks.extract_product_with_selenium')
+    @mock.patch('agent.tasks.extract_product_from_json', return_value=None)
+    @mock.patch('agent.tasks.conditional_fetch')
+    def test_page_without_product_json_is_rendered_by_a_browser_task(self, conditional_fetch, extract_product_from_json, extract_product_with_selenium):
+        response = httpx.Response(200, content=self.HTTP_BODY, headers={'ETag': '"v1"'}, request=httpx.Request('GET', URL))
+        conditional_fetch.return_value = (response, True)
+        extract_product_with_selenium.return_value = ({
+            'source_url': URL, 'title': 'Colour Mask', 'description': 'Mask', 'price': Decimal('24.95'),
+            'main_image_url': None, 'images': [], 'variants': [],
+        }, self.RENDERED)
+        mark_queued(URL)
+
+        with mock.patch('agent.tasks.get_or_update_product_info.replace', wraps=get_or_update_product_info.replace) as replace:
+            result = get_or_update_product_info.apply(args=(URL,), kwargs={'mode': 'json'})
+
+        self.assertEqual(result.get(), 'updated')
+        replacement = replace.call_args.args[0]
+        self.assertEqual(replacement.kwargs['mode'], 'selenium')
+        self.assertEqual(route_task(replacement.task, replacement.args, replacement.kwargs, {}), {'queue': BROWSER_QUEUE})
+        extract_product_with_selenium.assert_called_once_with(URL)
+
+        # The page cache keeps the HTTP body's validators and hash, which the next json-mode run compares
+        entry = PageCache.objects.get(url=URL)
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual(entry.content_hash, content_hash(self.HTTP_BODY))
+        self.assertEqual(entry.product_updated_at, Product.objects.get(source_url=URL).updated_at)
+        self.assertIsNone(cache.get(_key('queued', URL)))
+
+
+class RouteTaskTests(SimpleTestCase):
+    def test_product_refresh_is_routed_by_mode(self):
+        name = 'agent.tasks.get_or_update_product_info'
+        self.assertEqual(route_task(name, (URL,), {'mode': 'json'}, {}), {'queue': HTTP_QUEUE})
+        self.assertEqual(route_task(name, (URL,), {'mode': 'selenium'}, {}), {'queue': BROWSER_QUEUE})
+
+    def test_unknown_tasks_use_the_default_queue(self):
+        self.assertIsNone(route_task('agent.tasks.sync_to_wix_task', (), {}, {}))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+@mock.patch('agent.tasks.enqueue_product_refresh')
+@mock.patch('agent.tasks.child_sitemaps', return_value=[])
+@mock.patch('agent.tasks.iter_changed_entries')
+class SitemapDiscoveryRunTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_discovery_is_recorded_as_a_crawl_run(self, iter_changed_entries, child_sitemaps, enqueue_product_refresh):
+        iter_changed_entries.side_effect = [
+            iter([('https://store.example.com/collections/masks', None)]),
+            iter([(URL, None), ('https://store.example.com/products/shampoo', None)]),
+        ]
+
+        summary = discover_sitemap_changes_task(run_id='sitemap-run')
+
+        self.assertEqual(summary, {'run_id': 'sitemap-run', 'queued': 2, 'collections_registered': 1})
+        run = CrawlRun.objects.get(run_id='sitemap-run')
+        self.assertEqual((run.kind, run.status, run.summary), ('sitemap', 'finished', summary))
+        self.assertIsNotNone(run.finished_at)
+        progress = get_run_progress('sitemap-run')
+        self.assertEqual(progress['status'], 'finished')
+        self.assertEqual(progress['counters']['sitemap_queued'], 2)
+        self.assertIn('products_updated', progress['counters'])
+
+    def test_failed_discovery_finishes_the_run_as_failed(self, iter_changed_entries, child_sitemaps, enqueue_product_refresh):
+        iter_changed_entries.side_effect = RuntimeError('Failed to fetch sitemap.xml with status code: 503')
+
+        with self.assertRaises(RuntimeError):
+            discover_sitemap_changes_task(run_id='sitemap-run')
+
+        self.assertEqual(CrawlRun.objects.get(run_id='sitemap-run').status, 'failed')
+
+    @mock.patch('agent.management.commands.discover_from_sitemap.discover_sitemap_changes_task.delay')
+    def test_command_passes_a_run_id_and_logs_the_poll_url(self, delay, *mocks):
+        with self.assertLogs('agent.management.commands.discover_from_sitemap', 'INFO') as logs:
+            call_command('discover_from_sitemap', product_limit=5)
+
+        run_id = delay.call_args.kwargs['run_id']
+        delay.assert_called_once_with(product_limit=5, run_id=run_id)
+        self.assertIn(f'Poll progress at /agent/runs/{run_id}/', logs.output[-1])
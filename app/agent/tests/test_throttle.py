@@ -0,0 +1,158 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from selenium.common.exceptions import WebDriverException
+from agent.tasks import get_product_links
+from agent.throttle import CircuitOpenError, OriginController, navigation_turn
+
+URL = 'https://store.example.com/products/colour-mask'
+ORIGIN = 'https://store.example.com'
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, THROTTLE_PAUSE_QUEUES=[])
+class OriginControllerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.controller = OriginController(
+            start_rate=100, min_rate=1, max_rate=200, increase=10, decrease=0.5, decrease_interval=60,
+            latency_target=2, window=60, min_failures=2, failure_ratio=0.5, cooldown=60,
+        )
+
+    def trip(self):
+        for _ in range(2):
+            self.controller.record(URL, 503)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'open')
+
+    def cool_down(self):
+        cache.delete(self.controller._key(ORIGIN, 'open'))
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'half_open')
+
+    def test_healthy_fast_responses_raise_the_rate(self):
+        self.controller.record(URL, 200, latency=0.1)
+        self.assertAlmostEqual(self.controller.rate(ORIGIN), 100.1)
+
+    def test_slow_responses_keep_the_rate(self):
+        self.controller.record(URL, 200, latency=5)
+        self.assertEqual(self.controller.rate(ORIGIN), 100)
+
+    def test_failures_back_off_once_per_interval(self):
+        controller = OriginController(start_rate=100, min_rate=1, decrease=0.5, decrease_interval=60, min_failures=100)
+        controller.record(URL, 429)
+        controller.record(URL, None)
+        self.assertEqual(controller.rate(ORIGIN), 50)
+
+    def test_acquire_is_limited_to_the_rate(self):
+        controller = OriginController(start_rate=2, min_failures=100)
+        with mock.patch('agent.throttle.time.time', return_value=1000.25):
+            waits = [controller.acquire(URL)[0] for _ in range(3)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 0.75)
+
+    def test_breaker_opens_and_rejects_requests(self):
+        self.trip()
+        with self.assertRaises(CircuitOpenError):
+            self.controller.acquire(URL)
+
+    def test_breaker_needs_the_failure_ratio(self):
+        for _ in range(3):
+            self.controller.record(URL, 200)
+        self.controller.record(URL, 503)
+        self.controller.record(URL, 503)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'closed')
+
+    def test_outcomes_while_open_are_ignored(self):
+        self.trip()
+        # Requests in flight when the breaker opened finish late
+        self.controller.record(URL, 200, latency=0.1)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'open')
+
+    def test_only_the_probe_resolves_half_open(self):
+        self.trip()
+        self.cool_down()
+
+        wait, probe = self.controller.acquire(URL)
+        self.assertEqual(wait, 0)
+        self.assertIsNotNone(probe)
+        with self.assertRaises(CircuitOpenError):
+            self.controller.acquire(URL)
+
+        # Late outcomes of other requests neither close nor re-open the breaker
+        self.controller.record(URL, 200)
+        self.controller.record(URL, 503)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'half_open')
+
+        self.controller.record(URL, 200, probe=probe)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'closed')
+        self.assertEqual(self.controller.acquire(URL), (0, None))
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        self.cool_down()
+        _, probe = self.controller.acquire(URL)
+        self.controller.record(URL, None, probe=probe)
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'open')
+
+    def test_released_probe_lets_another_request_probe(self):
+        self.trip()
+        self.cool_down()
+        _, probe = self.controller.acquire(URL)
+        self.controller.release_probe(URL, probe)
+        _, second = self.controller.acquire(URL)
+        self.assertIsNotNone(second)
+        self.assertNotEqual(probe, second)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, THROTTLE_PAUSE_QUEUES=[], THROTTLE_ENABLED=True, BREAKER_MIN_FAILURES=2)
+class NavigationTurnTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.controller = OriginController()
+        patcher = mock.patch('agent.throttle.get_origin_controller', return_value=self.controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def half_open(self):
+        for _ in range(2):
+            self.controller.record(URL, None)
+        cache.delete(self.controller._key(ORIGIN, 'open'))
+
+    def test_successful_navigation_closes_a_half_open_breaker(self):
+        self.half_open()
+        with navigation_turn(URL, failures=(WebDriverException,)):
+            pass
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'closed')
+
+    def test_failed_navigation_reopens_a_half_open_breaker(self):
+        self.half_open()
+        with self.assertRaises(WebDriverException):
+            with navigation_turn(URL, failures=(WebDriverException,)):
+                raise WebDriverException('net::ERR_CONNECTION_RESET')
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'open')
+
+    def test_other_errors_give_the_probe_back(self):
+        self.half_open()
+        with self.assertRaises(KeyError):
+            with navigation_turn(URL, failures=(WebDriverException,)):
+                raise KeyError('price_text')
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'half_open')
+        self.assertIsNotNone(self.controller.acquire(URL)[1])
+
+    def test_failed_navigations_count_towards_opening(self):
+        for _ in range(2):
+            with self.assertRaises(WebDriverException):
+                with navigation_turn(URL, failures=(WebDriverException,)):
+                    raise WebDriverException('timeout')
+        self.assertEqual(self.controller.state(ORIGIN)['state'], 'open')
+
+    @mock.patch('agent.tasks.get_driver_pool')
+    def test_collection_scrolling_waits_for_the_breaker(self, get_driver_pool):
+        driver = get_driver_pool.return_value.lease.return_value.__enter__.return_value
+        for _ in range(2):
+            self.controller.record(URL, None)
+
+        links = get_product_links(f"{ORIGIN}/collections/all")
+
+        self.assertEqual(links, set())
+        driver.get.assert_not_called()
@@ -0,0 +1,76 @@
+from decimal import Decimal
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from selenium.common.exceptions import TimeoutException
+from agent.tasks import extract_product_with_selenium
+from agent.variant_matrix import enumerate_variants, variant_script_timeout
+
+URL = 'https://store.example.com/products/igora-royal'
+
+PAGE = '''<html><body>
+<p class="modal_price subtitle"><span class="current_price"><span class="money">$14.95</span></span></p>
+<img data-index="0" data-zoom-src="//cdn.example.com/1-0.jpg">
+</body></html>'''
+
+
+def dom_variant(shade, price_text, variant_id=None, index=0):
+    return {
+        'options': [['Shade', shade]], 'variant_id': variant_id, 'price_cents': None,
+        'price_text': price_text, 'image_src': None, 'image_index': index,
+    }
+
+
+@override_settings(SELENIUM_OPTION_TIMEOUT=2, SELENIUM_VARIANT_SCRIPT_TIMEOUT=60, SELENIUM_VARIANT_MAX_COMBINATIONS=100)
+class EnumerateVariantsTests(SimpleTestCase):
+    def setUp(self):
+        self.driver = mock.Mock()
+
+    def test_script_timeout_fits_the_combination_cap(self):
+        self.assertEqual(variant_script_timeout(), 210)
+        with self.settings(SELENIUM_VARIANT_MAX_COMBINATIONS=10):
+            self.assertEqual(variant_script_timeout(), 60)
+
+    def test_matrix_is_read_in_one_call(self):
+        self.driver.execute_async_script.return_value = {'source': 'dom', 'changes': 2, 'variants': [
+            dom_variant('1-0', '$14.95', index=0),
+            dom_variant('1-1', '$15.95', index=1),
+        ]}
+
+        variants = enumerate_variants(self.driver, {'0': '//cdn.example.com/1-0.jpg'})
+
+        self.driver.set_script_timeout.assert_called_once_with(210)
+        self.assertEqual(self.driver.execute_async_script.call_args.args[1:], (2000, 'p.modal_price.subtitle .current_price .money', 100))
+        self.assertEqual(variants, [
+            {'id': None, 'options': [('Shade', '1-0')], 'price': Decimal('14.95'), 'image_url': 'https://cdn.example.com/1-0.jpg'},
+            {'id': None, 'options': [('Shade', '1-1')], 'price': Decimal('15.95'), 'image_url': None},
+        ])
+
+    def test_too_many_combinations_fall_back(self):
+        self.driver.execute_async_script.return_value = {'source': 'too_many', 'combinations': 400, 'changes': 0, 'variants': []}
+        self.assertIsNone(enumerate_variants(self.driver, {}))
+
+    def test_timed_out_script_is_cancelled_and_falls_back(self):
+        self.driver.execute_async_script.side_effect = TimeoutException('script timeout')
+
+        self.assertIsNone(enumerate_variants(self.driver, {}))
+
+        self.driver.execute_script.assert_called_once_with('window.__agentVariantMatrixCancel = true;')
+
+
+@override_settings(SELENIUM_VARIANT_MODE='batch', THROTTLE_ENABLED=False)
+@mock.patch('agent.tasks.page_transfer_bytes', return_value=0)
+@mock.patch('agent.tasks.wait_for_page_ready')
+@mock.patch('agent.tasks.get_driver_pool')
+class SeleniumVariantFallbackTests(SimpleTestCase):
+    @mock.patch('agent.tasks.select_each_option')
+    @mock.patch('agent.tasks.enumerate_variants', return_value=None)
+    def test_unreadable_matrix_falls_back_to_each_option(self, enumerate_variants, select_each_option, get_driver_pool, *mocks):
+        driver = get_driver_pool.return_value.lease.return_value.__enter__.return_value
+        driver.page_source = PAGE
+        select_each_option.return_value = [{'id': None, 'options': [('Shade', '1-0')], 'price': Decimal('14.95'), 'image_url': None}]
+
+        product_data, _ = extract_product_with_selenium(URL)
+
+        self.assertEqual(product_data['price'], Decimal('14.95'))
+        self.assertEqual(product_data['variants'], select_each_option.return_value)
+        select_each_option.assert_called_once()
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from unittest import mock
+from django.contrib.admin.sites import AdminSite
+from django.test import SimpleTestCase, TestCase, override_settings
+from agent.admin import CrawlRunAdmin, VariantInline
+from agent.models import CrawlRun, Image, MirroredImage, Product, Variant
+
+
+@mock.patch('agent.views.get_worker_metrics', return_value={})
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN='')
+    def test_refused_without_a_configured_token(self, get_worker_metrics):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 403)
+        get_worker_metrics.assert_not_called()
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_wrong_or_missing_token_is_unauthorized(self, get_worker_metrics):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+        get_worker_metrics.assert_not_called()
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_bearer_token_is_served(self, get_worker_metrics):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class CrawlRunAdminTests(SimpleTestCase):
+    def test_stage_table_escapes_names(self):
+        run = CrawlRun(metrics={'stages': {'fetch': 1.234}, 'counters': {'<b>pages</b>': 3}})
+
+        table = CrawlRunAdmin(CrawlRun, AdminSite()).get_stage_table(run)
+
+        self.assertEqual(
+            table,
+            '<table><tr><td>fetch</td><td>1.23s</td></tr><tr><td>&lt;b&gt;pages&lt;/b&gt;</td><td>3</td></tr></table>',
+        )
+
+
+class VariantInlineTests(TestCase):
+    def test_variant_images_are_joined_safely(self):
+        product = Product.objects.create(source_url='https://store.example.com/products/mask', title='Mask', price=Decimal('24.95'))
+        variant = Variant.objects.create(product=product, price=Decimal('24.95'))
+        mirror = MirroredImage.objects.create(content_hash='ab' * 32, path='image_mirror/ab.jpg', thumbnails={'100': 'image_mirror/ab_100.webp'})
+        variant.images.add(
+            Image.objects.create(product=product, url='https://cdn.example.com/a.jpg', mirror=mirror),
+            Image.objects.create(product=product, url='https://cdn.example.com/b.jpg?x=1&y="2"'),
+        )
+
+        html = VariantInline(Variant, AdminSite()).get_variant_images(variant)
+
+        self.assertEqual(html, (
+            '<a href="/media/image_mirror/ab.jpg" target="_blank"><img src="/media/image_mirror/ab_100.webp" '
+            'style="width: 50px; height: auto;" loading="lazy"></a> '
+            '<a href="https://cdn.example.com/b.jpg?x=1&amp;y=&quot;2&quot;" target="_blank">Not mirrored</a>'
+        ))
+
+    def test_variant_without_images(self):
+        product = Product.objects.create(source_url='https://store.example.com/products/mask', title='Mask', price=Decimal('24.95'))
+        variant = Variant.objects.create(product=product, price=Decimal('24.95'))
+        self.assertEqual(VariantInline(Variant, AdminSite()).get_variant_images(variant), 'No images')
@@ -0,0 +1,67 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from agent.waits import RESOURCE_COUNT_SCRIPT, wait_for_page_ready
+
+
+class FakePage:
+    """
+    A driver whose page becomes ready, and whose resource count grows, as scripted.
+
+    `ready` and `resources` are the values of successive polls; the last one repeats.
+    """
+
+    current_url = 'https://store.example.com/products/colour-mask'
+
+    def __init__(self, ready, resources):
+        self.ready = list(ready)
+        self.resources = list(resources)
+        self.polls = {'ready': 0, 'resources': 0}
+
+    def _next(self, name, values):
+        self.polls[name] += 1
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    def execute_script(self, script, *args):
+        if script == RESOURCE_COUNT_SCRIPT:
+            return self._next('resources', self.resources)
+        return self._next('ready', self.ready)
+
+
+@override_settings(SELENIUM_PAGE_TIMEOUT=1, SELENIUM_NETWORK_IDLE=0.05)
+@mock.patch('agent.waits.record_stage')
+@mock.patch('agent.waits.incr')
+class WaitForPageReadyTests(SimpleTestCase):
+    def test_light_profile_waits_for_the_form_and_the_network(self, incr, record_stage):
+        # Eager page load: driver.get() returns while the theme scripts are still arriving
+        page = FakePage(ready=[False, False, True], resources=[3, 5, 8, 8])
+
+        self.assertTrue(wait_for_page_ready(page))
+
+        self.assertEqual(page.polls, {'ready': 3, 'resources': 4})
+        self.assertEqual([call.args[0] for call in record_stage.call_args_list], ['wait_page_ready', 'wait_network_idle'])
+        incr.assert_not_called()
+
+    def test_full_profile_page_is_ready_at_once(self, incr, record_stage):
+        # Normal page load: every subresource is in by the time driver.get() returns
+        page = FakePage(ready=[True], resources=[40])
+
+        self.assertTrue(wait_for_page_ready(page))
+
+        self.assertEqual(page.polls, {'ready': 1, 'resources': 2})
+        incr.assert_not_called()
+
+    def test_page_without_a_product_form_times_out(self, incr, record_stage):
+        page = FakePage(ready=[False], resources=[3])
+
+        self.assertFalse(wait_for_page_ready(page, timeout=0.3))
+
+        self.assertEqual(page.polls['resources'], 0)
+        incr.assert_called_once_with('wait_timeouts')
+        self.assertGreaterEqual(record_stage.call_args.args[1], 0.3)
+
+    def test_busy_network_times_out(self, incr, record_stage):
+        page = FakePage(ready=[True], resources=list(range(100)))
+
+        self.assertFalse(wait_for_page_ready(page, timeout=0.3))
+
+        incr.assert_called_once_with('wait_timeouts')
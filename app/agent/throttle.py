@@ -0,0 +1,301 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import incr
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PAUSED_CONSUMERS_KEY = 'throttle:paused_consumers'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to an origin whose circuit breaker is open.
+    """
+
+    def __init__(self, origin, retry_in):
+        super().__init__(f"Circuit breaker open for {origin}, retrying in {retry_in:.0f}s")
+        self.origin = origin
+        self.retry_in = retry_in
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class OriginController:
+    """
+    Shared (Redis cache) circuit breaker and AIMD request rate for each origin, across all workers.
+
+    The rate starts at `start_rate` requests per second for the whole cluster, grows additively (about
+    `increase` per second at full speed) while responses are healthy and faster than `latency_target`,
+    and is multiplied by `decrease` on a 429, 5xx or transport error (at most once per `decrease_interval`).
+
+    The breaker opens when at least `min_failures` requests, and `failure_ratio` of all requests, failed
+    within a `window`-second window. Requests are then refused for `cooldown` seconds, after which a
+    single probe request is let through: its success closes the breaker, its failure re-opens it.
+    """
+
+    def __init__(self, start_rate=None, min_rate=None, max_rate=None, increase=None, decrease=None,
+                 decrease_interval=None, latency_target=None, window=None, min_failures=None,
+                 failure_ratio=None, cooldown=None, probe_timeout=None):
+        self.start_rate = start_rate or settings.HTTP_RATE_PER_HOST
+        self.min_rate = min_rate or settings.THROTTLE_MIN_RATE
+        self.max_rate = max_rate or settings.THROTTLE_MAX_RATE
+        self.increase = increase or settings.THROTTLE_INCREASE
+        self.decrease = decrease or settings.THROTTLE_DECREASE
+        self.decrease_interval = decrease_interval or settings.THROTTLE_DECREASE_INTERVAL
+        self.latency_target = latency_target or settings.THROTTLE_LATENCY_TARGET
+        self.window = window or settings.BREAKER_WINDOW
+        self.min_failures = min_failures or settings.BREAKER_MIN_FAILURES
+        self.failure_ratio = failure_ratio or settings.BREAKER_FAILURE_RATIO
+        self.cooldown = cooldown or settings.BREAKER_COOLDOWN
+        self.probe_timeout = probe_timeout or settings.HTTP_TIMEOUT + 5
+
+    def _key(self, origin, name):
+        return f"throttle:{origin}:{name}"
+
+    def rate(self, origin):
+        """
+        Current cluster-wide request rate for an origin, in requests per second.
+        """
+        rate = cache.get(self._key(origin, 'rate'))
+        return rate if rate is not None else self.start_rate
+
+    def _set_rate(self, origin, rate):
+        cache.set(self._key(origin, 'rate'), rate, None)
+
+    def acquire(self, url):
+        """
+        Ask to send a request to the URL's origin now.
+
+        Returns (wait, probe). `wait` is 0 when the request may go, or the seconds to wait before
+        asking again when this origin's rate is used up. `probe` is a token when the request is the
+        half-open probe, to be passed back to `record` (or `release_probe`), otherwise None.
+        Raises CircuitOpenError while the breaker is open.
+        """
+        origin = origin_of(url)
+        state = cache.get_many([self._key(origin, 'open'), self._key(origin, 'tripped')])
+        if self._key(origin, 'open') in state:
+            incr('breaker_rejected')
+            raise CircuitOpenError(origin, max(state[self._key(origin, 'open')] - time.time(), 0))
+        if self._key(origin, 'tripped') in state:
+            # Half-open: one probe request at a time
+            probe = uuid.uuid4().hex
+            if not cache.add(self._key(origin, 'probe'), probe, self.probe_timeout):
+                incr('breaker_rejected')
+                raise CircuitOpenError(origin, self.probe_timeout)
+            logger.info(f"Circuit breaker half-open for {origin}, sending a probe request")
+            return 0, probe
+
+        # Fixed windows of at least a second, so fractional rates still admit a request per window
+        rate = self.rate(origin)
+        length = max(1.0, 1.0 / rate)
+        allowance = max(1, int(rate * length))
+        now = time.time()
+        window = int(now / length)
+        key = self._key(origin, f"slot:{window}")
+        cache.add(key, 0, int(length) + 5)
+        if cache.incr(key) <= allowance:
+            return 0, None
+        return (window + 1) * length - now, None
+
+    def record(self, url, status_code=None, latency=None, probe=None):
+        """
+        Record the outcome of a request: an HTTP status, or None for a transport error or timeout.
+
+        `probe` is the token `acquire` returned for the request. Outcomes arriving while the breaker
+        is open come from requests sent before it opened and are ignored; while it is half-open,
+        only the probe's outcome counts.
+        """
+        origin = origin_of(url)
+        failed = status_code is None or status_code == 429 or status_code >= 500
+
+        state = cache.get_many([self._key(origin, name) for name in ('open', 'tripped', 'probe')])
+        if self._key(origin, 'open') in state:
+            return
+        if self._key(origin, 'tripped') in state:
+            if probe is None or state.get(self._key(origin, 'probe')) != probe:
+                return
+            cache.delete(self._key(origin, 'probe'))
+            if failed:
+                self._open(origin, 'probe request failed')
+            else:
+                cache.delete(self._key(origin, 'tripped'))
+                logger.info(f"Circuit breaker closed for {origin}")
+                resume_crawl_queues_later(0)
+            return
+
+        window = int(time.time() / self.window)
+        total = self._count(origin, f"total:{window}")
+        if failed:
+            failures = self._count(origin, f"failures:{window}")
+            self._back_off(origin)
+            if failures >= self.min_failures and failures / total >= self.failure_ratio:
+                self._open(origin, f"{failures}/{total} requests failed in {self.window}s")
+        elif latency is not None and latency <= self.latency_target:
+            rate = self.rate(origin)
+            if rate < self.max_rate:
+                # One `increase` per second's worth of successful requests
+                self._set_rate(origin, min(self.max_rate, rate + self.increase / rate))
+
+    def release_probe(self, url, probe):
+        """
+        Give up a half-open probe without an outcome (the request was never sent), so another request can probe.
+        """
+        if probe is None:
+            return
+        key = self._key(origin_of(url), 'probe')
+        if cache.get(key) == probe:
+            cache.delete(key)
+
+    def _count(self, origin, name):
+        key = self._key(origin, name)
+        cache.add(key, 0, self.window * 2)
+        return cache.incr(key)
+
+    def _back_off(self, origin):
+        # Concurrent failures of one burst should only halve the rate once
+        if not cache.add(self._key(origin, 'backoff'), 1, self.decrease_interval):
+            return
+        rate = self.rate(origin)
+        new_rate = max(self.min_rate, rate * self.decrease)
+        self._set_rate(origin, new_rate)
+        incr('rate_backoffs')
+        logger.warning(f"Backing off {origin}: {rate:.2f} -> {new_rate:.2f} requests/s")
+
+    def _open(self, origin, reason):
+        cache.set(self._key(origin, 'open'), time.time() + self.cooldown, self.cooldown)
+        cache.set(self._key(origin, 'tripped'), 1, None)
+        incr('breaker_opened')
+        logger.error(f"Circuit breaker opened for {origin} for {self.cooldown}s: {reason}")
+        pause_crawl_queues(self.cooldown)
+
+    def state(self, origin):
+        """
+        Return {'state': 'closed' | 'open' | 'half_open', 'rate': requests per second} for an origin.
+        """
+        state = cache.get_many([self._key(origin, 'open'), self._key(origin, 'tripped')])
+        if self._key(origin, 'open') in state:
+            name = 'open'
+        elif self._key(origin, 'tripped') in state:
+            name = 'half_open'
+        else:
+            name = 'closed'
+        return {'state': name, 'rate': self.rate(origin)}
+
+
+def pause_crawl_queues(cooldown):
+    """
+    Stop every worker consuming THROTTLE_PAUSE_QUEUES, and schedule them to resume after `cooldown` seconds.
+
+    The resume runs as a task on the io queue, which is never paused. The half-open probe then
+    comes from the first resumed task.
+    """
+    queues = set(settings.THROTTLE_PAUSE_QUEUES)
+    if not queues:
+        return
+    from celery import current_app
+
+    if not cache.add(PAUSED_CONSUMERS_KEY, {}, cooldown * 10):
+        return  # Already paused
+    try:
+        active = current_app.control.inspect(timeout=2).active_queues() or {}
+        paused = {}
+        for worker, worker_queues in active.items():
+            for queue in queues & {queue['name'] for queue in worker_queues}:
+                current_app.control.cancel_consumer(queue, destination=[worker])
+                paused.setdefault(worker, []).append(queue)
+        cache.set(PAUSED_CONSUMERS_KEY, paused, cooldown * 10)
+        logger.warning(f"Paused {sorted(queues)} on {len(paused)} workers for {cooldown}s")
+        resume_crawl_queues_later(cooldown)
+    except Exception as e:
+        cache.delete(PAUSED_CONSUMERS_KEY)
+        logger.error(f"Could not pause the crawl queues: {str(e)}")
+
+
+def resume_crawl_queues_later(countdown):
+    if cache.get(PAUSED_CONSUMERS_KEY) is None:
+        return
+    from celery import current_app
+
+    current_app.send_task('agent.tasks.resume_crawl_queues_task', countdown=countdown, queue='io')
+
+
+def resume_crawl_queues():
+    """
+    Restart consuming the queues paused by `pause_crawl_queues`, on the workers they were paused on.
+    """
+    from celery import current_app
+
+    paused = cache.get(PAUSED_CONSUMERS_KEY)
+    if paused is None:
+        return {}
+    for worker, queues in paused.items():
+        for queue in queues:
+            current_app.control.add_consumer(queue, destination=[worker])
+    cache.delete(PAUSED_CONSUMERS_KEY)
+    logger.info(f"Resumed the crawl queues on {len(paused)} workers")
+    return paused
+
+
+def wait_for_turn(url):
+    """
+    Block until the origin's shared rate allows a request that does not go through agent.fetch
+    (a Chrome navigation). Returns the probe token from `OriginController.acquire`, or None.
+    Raises CircuitOpenError while the origin's breaker is open.
+    """
+    controller = get_origin_controller()
+    if controller is None:
+        return None
+    while True:
+        wait, probe = controller.acquire(url)
+        if not wait:
+            return probe
+        time.sleep(wait)
+
+
+@contextmanager
+def navigation_turn(url, failures=(Exception,)):
+    """
+    Wait for the origin's turn (as `wait_for_turn`) before a Chrome navigation, and record its outcome.
+
+    Leaving the block normally records a successful request; an exception in `failures` records a
+    failed one. Any other exception records nothing but gives back a half-open probe, so the breaker
+    is never left waiting for an outcome that will not come.
+    """
+    probe = wait_for_turn(url)
+    controller = get_origin_controller()
+    if controller is None:
+        yield
+        return
+    try:
+        yield
+    except failures:
+        controller.record(url, None, probe=probe)
+        raise
+    except BaseException:
+        controller.release_probe(url, probe)
+        raise
+    controller.record(url, 200, probe=probe)
+
+
+_controller = None
+
+
+def get_origin_controller():
+    """
+    Return this process's OriginController (its state lives in the cache), or None when THROTTLE_ENABLED is off.
+    """
+    global _controller
+    if not settings.THROTTLE_ENABLED:
+        return None
+    if _controller is None:
+        _controller = OriginController()
+    return _controller
@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import WixProductListView
+from .views import WixProductListView, CrawlRunProgressView
 
 urlpatterns = [
     path('wix-products/', WixProductListView.as_view(), name='wix_product_list'),  # This must match exactly
+    path('runs/<str:run_id>/', CrawlRunProgressView.as_view(), name='crawl_run_progress'),
 ]
\ No newline at end of file
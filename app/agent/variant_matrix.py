@@ -0,0 +1,227 @@
+import logging
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from selenium.common.exceptions import TimeoutException
+from .metrics import incr, stage
+from .shopify import MissingPriceError, absolute_url, parse_price
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds on top of the per-combination waits for the rest of the script
+SCRIPT_TIMEOUT_MARGIN = 10
+
+# Runs in the page with execute_async_script and returns every option combination in one round-trip.
+#
+# The option selects are read from .select-container (label + select.single-option-selector). When the
+# theme's variant JSON (div.product_form[data-product]) is present, each combination is resolved against it
+# without touching the DOM. Otherwise every combination is applied to the selects with a change event and
+# the price node is read once it updates (or after `optionTimeout` ms when the combination shares the
+# previous price). The original selection is restored before returning. Without variant JSON, more than
+# `maxCombinations` combinations are not attempted ({source: 'too_many'}), and setting
+# window.__agentVariantMatrixCancel stops a run that outlived its script timeout.
+VARIANT_MATRIX_SCRIPT = r"""
+var done = arguments[arguments.length - 1];
+var optionTimeout = arguments[0];
+var priceSelector = arguments[1];
+var maxCombinations = arguments[2];
+window.__agentVariantMatrixCancel = false;
+
+var containers = Array.prototype.slice.call(document.querySelectorAll('.select-container'));
+var options = containers.map(function (container) {
+  var label = container.querySelector('label');
+  var select = container.querySelector('select.single-option-selector');
+  return select ? {label: label ? label.textContent.trim() : '', select: select} : null;
+}).filter(Boolean);
+
+if (!options.length) { done({source: 'none', variants: [], changes: 0}); return; }
+
+var product = null;
+try {
+  var form = document.querySelector('.product_form[data-product]');
+  product = form ? JSON.parse(form.getAttribute('data-product')) : null;
+} catch (e) { product = null; }
+
+var count = options.reduce(function (total, option) { return total * option.select.options.length; }, 1);
+if (!(product && product.variants) && count > maxCombinations) {
+  done({source: 'too_many', combinations: count, variants: [], changes: 0});
+  return;
+}
+
+var combinations = [[]];
+options.forEach(function (option) {
+  var next = [];
+  combinations.forEach(function (combination) {
+    Array.prototype.forEach.call(option.select.options, function (element, index) {
+      next.push(combination.concat([{value: element.value, text: element.text.trim(), index: index}]));
+    });
+  });
+  combinations = next;
+});
+
+function pairs(combination) {
+  return combination.map(function (choice, i) { return [options[i].label, choice.text]; });
+}
+
+if (product && product.variants) {
+  var byOptions = {};
+  product.variants.forEach(function (variant) {
+    byOptions[(variant.options || [variant.option1, variant.option2, variant.option3].filter(Boolean)).join('\u001f')] = variant;
+  });
+  var variants = [];
+  combinations.forEach(function (combination) {
+    var variant = byOptions[combination.map(function (choice) { return choice.value; }).join('\u001f')];
+    if (!variant) return;  // Combination not sold
+    var image = variant.featured_image;
+    variants.push({
+      options: pairs(combination),
+      variant_id: variant.id,
+      price_cents: variant.price,
+      price_text: null,
+      image_src: image ? (image.src || image) : null,
+      image_index: combination[0].index
+    });
+  });
+  done({source: 'json', variants: variants, changes: 0});
+  return;
+}
+
+function state() {
+  var price = document.querySelector(priceSelector);
+  var id = document.querySelector('.product_form [name="id"]');
+  return (price ? price.textContent.trim() : '') + '\u001f' + (id ? id.value : '');
+}
+
+var original = options.map(function (option) { return option.select.value; });
+var variants = [];
+var changes = 0;
+
+function apply(values) {
+  var changed = false;
+  options.forEach(function (option, i) {
+    if (option.select.value !== values[i]) {
+      option.select.value = values[i];
+      option.select.dispatchEvent(new Event('change', {bubbles: true}));
+      changed = true;
+      changes += 1;
+    }
+  });
+  return changed;
+}
+
+function settle(before, started, callback) {
+  if (state() !== before || Date.now() - started >= optionTimeout) { callback(); return; }
+  setTimeout(function () { settle(before, started, callback); }, 25);
+}
+
+function step(i) {
+  if (window.__agentVariantMatrixCancel) { apply(original); return; }
+  if (i >= combinations.length) {
+    apply(original);
+    done({source: 'dom', variants: variants, changes: changes});
+    return;
+  }
+  var combination = combinations[i];
+  var before = state();
+  var changed = apply(combination.map(function (choice) { return choice.value; }));
+  var read = function () {
+    var price = document.querySelector(priceSelector);
+    var id = document.querySelector('.product_form [name="id"]');
+    variants.push({
+      options: pairs(combination),
+      variant_id: id && /^\d+$/.test(id.value) ? Number(id.value) : null,
+      price_cents: null,
+      price_text: price ? price.textContent.trim() : null,
+      image_src: null,
+      image_index: combination[0].index
+    });
+    step(i + 1);
+  };
+  if (changed) { settle(before, Date.now(), read); } else { read(); }
+}
+
+step(0);
+"""
+
+
+def parse_price_text(text):
+    """
+    Convert a displayed price such as "$12.95" or "$1,299.00 AUD" to a Decimal, or None.
+    """
+    if not text:
+        return None
+    try:
+        return Decimal(text.replace('$', '').replace(',', '').replace('AUD', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def variant_script_timeout():
+    """
+    Script timeout for the matrix: SELENIUM_VARIANT_SCRIPT_TIMEOUT, raised so that SELENIUM_VARIANT_MAX_COMBINATIONS
+    combinations that each wait the full SELENIUM_OPTION_TIMEOUT (same price, no variant id input) still fit.
+    """
+    return max(
+        settings.SELENIUM_VARIANT_SCRIPT_TIMEOUT,
+        settings.SELENIUM_VARIANT_MAX_COMBINATIONS * settings.SELENIUM_OPTION_TIMEOUT + SCRIPT_TIMEOUT_MARGIN,
+    )
+
+
+def enumerate_variants(driver, variant_images, timeout=None):
+    """
+    Read the price and image of every option combination with a single execute_async_script call.
+
+    `variant_images` is the parser's {data-index: image src} map, used for the image of a combination when
+    the variant JSON has none (by the index of the first option, as the option-by-option loop did).
+    Returns the variants in the product data format, or None when the matrix has more than
+    SELENIUM_VARIANT_MAX_COMBINATIONS combinations or the script timed out; the caller then falls back
+    to selecting each option over WebDriver.
+    """
+    driver.set_script_timeout(timeout if timeout is not None else variant_script_timeout())
+    with stage('option_select'):
+        try:
+            result = driver.execute_async_script(
+                VARIANT_MATRIX_SCRIPT, int(settings.SELENIUM_OPTION_TIMEOUT * 1000),
+                'p.modal_price.subtitle .current_price .money', settings.SELENIUM_VARIANT_MAX_COMBINATIONS,
+            )
+        except TimeoutException as e:
+            # The script keeps running in the page until told to stop
+            driver.execute_script('window.__agentVariantMatrixCancel = true;')
+            logger.warning(f"Variant matrix script timed out, falling back to selecting each option: {e.msg}")
+            incr('variant_matrix_fallbacks')
+            return None
+    incr('option_clicks', result['changes'])
+    if result['source'] == 'too_many':
+        logger.warning(
+            f"{result['combinations']} option combinations exceed SELENIUM_VARIANT_MAX_COMBINATIONS "
+            f"({settings.SELENIUM_VARIANT_MAX_COMBINATIONS}), falling back to selecting each option"
+        )
+        incr('variant_matrix_fallbacks')
+        return None
+    logger.info(f"Enumerated {len(result['variants'])} variants from the {result['source']} in one script call ({result['changes']} select changes)")
+
+    variants = []
+    seen_ids = set()
+    for variant in result['variants']:
+        # A combination that is not sold leaves the form on the previous variant
+        if variant['variant_id'] is not None:
+            if variant['variant_id'] in seen_ids:
+                logger.info(f"Skipping combination {variant['options']}: no variant of its own")
+                continue
+            seen_ids.add(variant['variant_id'])
+
+        if variant['price_cents'] is not None:
+            price = parse_price(variant['price_cents'])
+        else:
+            price = parse_price_text(variant['price_text'])
+        if price is None:
+            raise MissingPriceError(f"No price for variant {variant['options']}")
+
+        image_src = variant['image_src'] or variant_images.get(str(variant['image_index']))
+        variants.append({
+            'id': variant['variant_id'],
+            'options': [tuple(pair) for pair in variant['options']],
+            'price': price,
+            'image_url': absolute_url(image_src),
+        })
+    return variants
@@ -1,8 +1,15 @@
+import hmac
 import logging
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.generic import TemplateView
 from .forms import CollectionSelectForm
 from .models import WixProduct, Collection
+from .metrics import get_worker_metrics, render_prometheus
+from .stats import get_run_progress
 import csv
 
 # Set up logging
@@ -136,3 +143,32 @@ class WixProductListView(TemplateView):
                     ])
 
         return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class CrawlRunProgressView(View):
+    """
+    Return the progress of a crawl run as JSON so the admin can poll it.
+    """
+
+    def get(self, request, run_id, *args, **kwargs):
+        progress = get_run_progress(run_id)
+        if progress is None:
+            return JsonResponse({'error': f"Unknown run: {run_id}"}, status=404)
+        return JsonResponse(progress)
+
+
+class MetricsView(View):
+    """
+    Crawl stage timings and counters of every Celery worker in the Prometheus text format.
+
+    The scraper must send METRICS_TOKEN as a bearer token; without a configured token the endpoint is closed.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not settings.METRICS_TOKEN:
+            logger.warning("Refused /metrics request: METRICS_TOKEN is not set")
+            return HttpResponse('Forbidden', status=403, content_type='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        return HttpResponse(render_prometheus(get_worker_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
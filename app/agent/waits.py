@@ -0,0 +1,127 @@
+import logging
+import time
+from django.conf import settings
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from .metrics import incr, record_stage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Price node and variant id of the product form; the theme updates both when an option is selected
+PRICE_SELECTOR = 'p.modal_price.subtitle .current_price .money'
+VARIANT_STATE_SCRIPT = """
+var price = document.querySelector(arguments[0]);
+var id = document.querySelector('.product_form [name="id"]');
+var match = window.location.search.match(/[?&]variant=(\\d+)/);
+return [price ? price.textContent.trim() : null, id ? id.value : null, match ? match[1] : null];
+"""
+
+# Resource Timing entries seen so far; network idle means this stopped growing for a while
+RESOURCE_COUNT_SCRIPT = "return performance.getEntriesByType('resource').length;"
+
+
+def wait_until(driver, condition, timeout, step, poll=0.1):
+    """
+    Wait until `condition(driver)` is truthy, for at most `timeout` seconds.
+
+    The time actually waited is recorded as the `wait_<step>` stage; a timeout is counted in
+    `wait_timeouts` and logged but not raised, so a slow page degrades to the old fixed wait.
+    Returns the condition's value, or False on timeout.
+    """
+    started = time.perf_counter()
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        incr('wait_timeouts')
+        logger.info(f"Wait for {step} timed out after {timeout}s on {driver.current_url}")
+        return False
+    finally:
+        record_stage(f"wait_{step}", time.perf_counter() - started)
+
+
+class network_idle:
+    """
+    Condition: no new Resource Timing entries for `idle` seconds.
+    """
+
+    def __init__(self, idle=0.5):
+        self.idle = idle
+        self.count = None
+        self.since = None
+
+    def __call__(self, driver):
+        try:
+            count = driver.execute_script(RESOURCE_COUNT_SCRIPT)
+        except WebDriverException:
+            return False
+        now = time.monotonic()
+        if count != self.count:
+            self.count = count
+            self.since = now
+            return False
+        return now - self.since >= self.idle
+
+
+def page_ready(driver):
+    """
+    Condition: the document is parsed and the product form (or the collection grid) is in the DOM.
+    """
+    return driver.execute_script(
+        "return document.readyState !== 'loading'"
+        " && !!document.querySelector('.product_form, .select-container, a[href*=\"/products/\"]');"
+    )
+
+
+def wait_for_page_ready(driver, timeout=None):
+    """
+    Wait for a freshly loaded page to be usable: parsed, with the product form present, and the network settled.
+    """
+    timeout = timeout if timeout is not None else settings.SELENIUM_PAGE_TIMEOUT
+    started = time.monotonic()
+    if not wait_until(driver, page_ready, timeout, 'page_ready'):
+        return False
+    # The variant-switching script may still be loading; give the network a moment to go quiet
+    remaining = max(2 * settings.SELENIUM_NETWORK_IDLE, timeout - (time.monotonic() - started))
+    return wait_until(driver, network_idle(settings.SELENIUM_NETWORK_IDLE), remaining, 'network_idle')
+
+
+def variant_state(driver):
+    """
+    Return (price text, variant id, ?variant= URL parameter) as currently shown by the product form.
+    """
+    try:
+        return tuple(driver.execute_script(VARIANT_STATE_SCRIPT, PRICE_SELECTOR))
+    except WebDriverException:
+        return (None, None, None)
+
+
+def wait_for_variant_change(driver, previous_state, timeout=None):
+    """
+    After selecting an option, wait until the price text or the selected variant id differs from `previous_state`.
+
+    Options that map to the same variant and price never change the page, so those wait out
+    the (short) per-option timeout.
+    """
+    timeout = timeout if timeout is not None else settings.SELENIUM_OPTION_TIMEOUT
+    return wait_until(driver, lambda d: variant_state(d) != previous_state, timeout, 'option')
+
+
+def wait_for_more_items(driver, css_selector, previous_count, previous_height, timeout=None):
+    """
+    After a scroll, wait until more elements match `css_selector` or the page grows.
+
+    Gives up early once the network has been idle without growth, which is how the last page is detected.
+    """
+    timeout = timeout if timeout is not None else settings.SELENIUM_SCROLL_TIMEOUT
+    idle = network_idle(settings.SELENIUM_NETWORK_IDLE)
+
+    def grew_or_settled(d):
+        count, height = d.execute_script(
+            "return [document.querySelectorAll(arguments[0]).length, document.body.scrollHeight];", css_selector
+        )
+        if count > previous_count or height > previous_height:
+            return 'grew'
+        return 'settled' if idle(d) else False
+
+    return wait_until(driver, grew_or_settled, timeout, 'scroll')
@@ -15,6 +15,43 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Queues, each consumed by its own worker service (see docker-compose.yml):
+# - browser: tasks that drive Chrome; few prefork processes, one message prefetched at a time
+# - http: plain HTTP crawling; many threads, as the tasks mostly wait on the network
+# - io: database-heavy aggregation, exports and the Wix sync
+BROWSER_QUEUE = 'browser'
+HTTP_QUEUE = 'http'
+IO_QUEUE = 'io'
+
+HTTP_TASKS = {
+    'agent.tasks.get_collection_links_task',
+    'agent.tasks.discover_sitemap_changes_task',
+    'agent.tasks.mirror_images_task',
+}
+BROWSER_TASKS = {
+    'agent.tasks.get_webdriver_pool_stats',
+}
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Route a task to its queue. Product and collection tasks go to the browser queue only when they
+    will render in Chrome (their mode, or the configured default); unknown tasks use the default (io) queue.
+    """
+    from django.conf import settings
+
+    if name == 'agent.tasks.get_or_update_product_info':
+        mode = kwargs.get('mode') or settings.PRODUCT_EXTRACTION_MODE
+        return {'queue': BROWSER_QUEUE if mode == 'selenium' else HTTP_QUEUE}
+    if name == 'agent.tasks.process_collection_task':
+        discovery = kwargs.get('discovery') or settings.COLLECTION_DISCOVERY_MODE
+        return {'queue': BROWSER_QUEUE if discovery == 'selenium' else HTTP_QUEUE}
+    if name in HTTP_TASKS:
+        return {'queue': HTTP_QUEUE}
+    if name in BROWSER_TASKS:
+        return {'queue': BROWSER_QUEUE}
+    return None
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -110,6 +110,119 @@ CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+# Browser, HTTP and IO work each have a queue and a worker service; see webapp.celery.route_task
+CELERY_TASK_ROUTES = ('webapp.celery.route_task',)
+CELERY_TASK_DEFAULT_QUEUE = 'io'
+# Set per worker service: browser and io workers take one message at a time and ack after the task,
+# so a task lost with a killed worker (OOM, max memory) is redelivered; http workers prefetch more
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '4'))
+CELERY_TASK_ACKS_LATE = os.getenv('CELERY_TASK_ACKS_LATE', '0') == '1'
+CELERY_TASK_REJECT_ON_WORKER_LOST = CELERY_TASK_ACKS_LATE
+# Replace worker processes regularly so leaks cannot build up; the memory limit (KiB) counts the
+# worker process only, Chrome's own memory is capped per browser by WEBDRIVER_MAX_RSS_MB
+CELERY_WORKER_MAX_TASKS_PER_CHILD = int(os.getenv('CELERY_WORKER_MAX_TASKS_PER_CHILD', '500'))
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(os.getenv('CELERY_WORKER_MAX_MEMORY_PER_CHILD', str(512 * 1024)))
+
+# Selenium / Chrome WebDriver pool (one pool per Celery worker process)
+CHROME_DRIVER_PATH = os.getenv('CHROME_DRIVER_PATH', '/usr/local/bin/chromedriver')
+WEBDRIVER_POOL_SIZE = int(os.getenv('WEBDRIVER_POOL_SIZE', '1'))  # Browsers per worker process
+WEBDRIVER_POOL_WARM = os.getenv('WEBDRIVER_POOL_WARM', '1') == '1'  # Start browsers at worker_process_init
+WEBDRIVER_MAX_USES = int(os.getenv('WEBDRIVER_MAX_USES', '50'))  # Recycle a browser after this many leases
+WEBDRIVER_MAX_RSS_MB = int(os.getenv('WEBDRIVER_MAX_RSS_MB', '1024'))  # Recycle a browser above this memory use
+WEBDRIVER_MAX_AGE = int(os.getenv('WEBDRIVER_MAX_AGE', '1800'))  # Recycle a browser after this many seconds (0: never)
+CHROME_PID_DIR = os.getenv('CHROME_PID_DIR', '/tmp/agent-chrome')  # Per-worker records of the Chrome PIDs each process started
+WEBDRIVER_LEASE_TIMEOUT = int(os.getenv('WEBDRIVER_LEASE_TIMEOUT', '300'))  # Seconds to wait for a free browser
+
+# Condition-based waits in the Selenium paths (agent.waits); each is a per-step upper bound in seconds
+SELENIUM_PAGE_TIMEOUT = float(os.getenv('SELENIUM_PAGE_TIMEOUT', '10'))  # Page parsed and product form present
+SELENIUM_OPTION_TIMEOUT = float(os.getenv('SELENIUM_OPTION_TIMEOUT', '2'))  # Price/variant updated after selecting an option
+SELENIUM_SCROLL_TIMEOUT = float(os.getenv('SELENIUM_SCROLL_TIMEOUT', '10'))  # More collection items after a scroll
+SELENIUM_NETWORK_IDLE = float(os.getenv('SELENIUM_NETWORK_IDLE', '0.5'))  # Seconds without new requests counted as idle
+
+# Variant prices in Chrome: 'batch' reads every option combination with one injected script
+# (agent.variant_matrix); 'per_option' selects each option of each select over WebDriver
+SELENIUM_VARIANT_MODE = os.getenv('SELENIUM_VARIANT_MODE', 'batch')
+SELENIUM_VARIANT_SCRIPT_TIMEOUT = float(os.getenv('SELENIUM_VARIANT_SCRIPT_TIMEOUT', '60'))  # Seconds for the whole matrix
+# Largest matrix applied option by option in the page; larger ones (without variant JSON) use 'per_option'.
+# The script timeout is raised to fit this many combinations each waiting SELENIUM_OPTION_TIMEOUT
+SELENIUM_VARIANT_MAX_COMBINATIONS = int(os.getenv('SELENIUM_VARIANT_MAX_COMBINATIONS', '100'))
+
+# Chrome render profile: 'light' blocks images, media, fonts, CSS and third-party tags and returns from
+# driver.get() at DOMContentLoaded; 'full' loads the storefront like a normal browser
+CHROME_RENDER_PROFILE = os.getenv('CHROME_RENDER_PROFILE', 'light')
+CHROME_ALLOWED_HOSTS = [host for host in os.getenv('CHROME_ALLOWED_HOSTS', 'cdn.shopify.com').split(',') if host]  # Never blocked besides the store itself
+CHROME_BLOCKED_URLS = [pattern for pattern in os.getenv('CHROME_BLOCKED_URLS', '').split(',') if pattern]  # Extra Network.setBlockedURLs patterns
+
+# Shared HTTP fetch engine (agent.fetch): one pooled keep-alive client per worker process
+HTTP_CONCURRENCY = int(os.getenv('HTTP_CONCURRENCY', '20'))  # Requests in flight per worker process
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '20'))  # Pooled keep-alive connections
+HTTP_RATE_PER_HOST = float(os.getenv('HTTP_RATE_PER_HOST', '5'))  # Token-bucket refill, requests per second per host
+HTTP_BURST = int(os.getenv('HTTP_BURST', '10'))  # Token-bucket size per host
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))  # Seconds
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))  # Retries on 429/5xx and connection errors
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))  # Seconds, doubled per retry with full jitter
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '30'))  # Seconds
+HTTP_USER_AGENT = os.getenv('HTTP_USER_AGENT', 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36')
+
+# Cluster-wide politeness per origin (agent.throttle): an AIMD request rate shared through Redis, and a
+# circuit breaker that stops requests and pauses the crawl queues while the store is failing
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_MIN_RATE = float(os.getenv('THROTTLE_MIN_RATE', '0.5'))  # Requests per second the rate never drops below
+THROTTLE_MAX_RATE = float(os.getenv('THROTTLE_MAX_RATE', '20'))  # Requests per second the rate never grows above
+THROTTLE_INCREASE = float(os.getenv('THROTTLE_INCREASE', '0.5'))  # Requests per second added per second of healthy responses
+THROTTLE_DECREASE = float(os.getenv('THROTTLE_DECREASE', '0.5'))  # Rate multiplier on a 429, 5xx or timeout
+THROTTLE_DECREASE_INTERVAL = int(os.getenv('THROTTLE_DECREASE_INTERVAL', '5'))  # Seconds between two decreases
+THROTTLE_LATENCY_TARGET = float(os.getenv('THROTTLE_LATENCY_TARGET', '2'))  # Seconds; slower responses stop the rate growing
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '30'))  # Seconds over which failures are counted
+BREAKER_MIN_FAILURES = int(os.getenv('BREAKER_MIN_FAILURES', '10'))  # Failures in a window before the breaker can open
+BREAKER_FAILURE_RATIO = float(os.getenv('BREAKER_FAILURE_RATIO', '0.5'))  # Share of failed requests in a window that opens it
+BREAKER_COOLDOWN = int(os.getenv('BREAKER_COOLDOWN', '120'))  # Seconds the breaker stays open before a probe request
+THROTTLE_PAUSE_QUEUES = [queue for queue in os.getenv('THROTTLE_PAUSE_QUEUES', 'http,browser').split(',') if queue]  # Queues paused while open
+PRODUCT_DEFER_MAX_RETRIES = int(os.getenv('PRODUCT_DEFER_MAX_RETRIES', '30'))  # Times a refresh refused by an open breaker is retried
+
+# Store being crawled; point it at `manage.py run_standin_store` for local end-to-end load tests
+SCRAPE_BASE_URL = os.getenv('SCRAPE_BASE_URL', 'https://hairbeautymart.com.au').rstrip('/')
+
+# Product extraction: 'json' reads the embedded Shopify product JSON over HTTP and only
+# falls back to Selenium when it is missing; 'selenium' always renders the page in Chrome
+PRODUCT_EXTRACTION_MODE = os.getenv('PRODUCT_EXTRACTION_MODE', 'json')
+
+# Product page parser backend: 'lxml' (fastest), 'soup_strainer' (BeautifulSoup restricted to the
+# nodes we read) or 'soup' (full BeautifulSoup tree). Compare them with `manage.py check_parser_parity`
+HTML_PARSER_BACKEND = os.getenv('HTML_PARSER_BACKEND', 'lxml')
+
+# Skip products whose page is unchanged since the last run (ETag/Last-Modified + content hash)
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', '1') == '1'
+
+# Per-URL deduplication of product refreshes across workers (markers live in the Redis cache)
+PRODUCT_LOCK_TTL = int(os.getenv('PRODUCT_LOCK_TTL', '600'))  # Seconds a worker's lease on a URL lasts at most
+PRODUCT_REFRESH_WINDOW = int(os.getenv('PRODUCT_REFRESH_WINDOW', '900'))  # Seconds a refreshed URL is skipped (0: never)
+PRODUCT_QUEUED_TTL = int(os.getenv('PRODUCT_QUEUED_TTL', str(6 * 60 * 60)))  # Seconds a queued marker outlives a lost task
+
+# Bulk product refresh dispatcher (update_all_products, update_all_product2, dispatch_product_refresh)
+DISPATCH_MAX_IN_FLIGHT = int(os.getenv('DISPATCH_MAX_IN_FLIGHT', '20'))  # Refresh tasks queued or running at once
+DISPATCH_RATE = float(os.getenv('DISPATCH_RATE', '5'))  # Politeness budget: tasks enqueued per second (0: unlimited)
+DISPATCH_TASK_TIMEOUT = int(os.getenv('DISPATCH_TASK_TIMEOUT', '300'))  # Seconds before a task is no longer waited for
+DISPATCH_POLL_INTERVAL = float(os.getenv('DISPATCH_POLL_INTERVAL', '0.5'))  # Seconds between result backend polls
+
+# Raw HTML archive of every fetched product page, content-addressed, for offline re-parsing.
+# Kept outside MEDIA_ROOT: nginx serves the media volume publicly
+PAGE_ARCHIVE_ENABLED = os.getenv('PAGE_ARCHIVE_ENABLED', '1') == '1'
+PAGE_ARCHIVE_ROOT = os.getenv('PAGE_ARCHIVE_ROOT', '/page_archive/')
+PAGE_ARCHIVE_COMPRESSION = os.getenv('PAGE_ARCHIVE_COMPRESSION', 'gzip')  # 'zstd' needs the optional zstandard package
+
+# Local mirror of product images and their thumbnails, content-addressed under MEDIA_ROOT and served by nginx
+IMAGE_MIRROR_DIR = os.getenv('IMAGE_MIRROR_DIR', 'image_mirror')
+IMAGE_MIRROR_BATCH = int(os.getenv('IMAGE_MIRROR_BATCH', '50'))  # Images downloaded concurrently
+IMAGE_THUMBNAIL_SIZES = [int(size) for size in os.getenv('IMAGE_THUMBNAIL_SIZES', '100,200').split(',') if size]  # Longest side in pixels
+IMAGE_MIRROR_BASE_URL = os.getenv('IMAGE_MIRROR_BASE_URL', '')  # Public origin serving MEDIA_URL, for mirrored URLs in Wix exports
+
+# Collection discovery: 'json' pages through /collections/<handle>/products.json (or the
+# paginated grid) over HTTP; 'selenium' scrolls the collection page in Chrome
+COLLECTION_DISCOVERY_MODE = os.getenv('COLLECTION_DISCOVERY_MODE', 'json')
+
+# Bearer token the Prometheus scraper must send to /metrics (empty: the endpoint refuses every request)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
 
 # Redis for caching
 CACHES = {